@@ -0,0 +1 @@
+"""Shared building blocks for the image classification scripts in ``py/``."""
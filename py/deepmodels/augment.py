@@ -0,0 +1,80 @@
+"""Batched augmentation applied to the collated ``features`` tensor.
+
+``BatchAugment`` replaces the per-sample ``Resize`` / ``RandomRotation`` /
+``ToTensor`` / ``Normalize`` PIL pipelines.  The resize is one bilinear
+``F.interpolate`` of the whole batch, with edge pixels clamped as PIL's
+``Resize`` does; the rotation is one ``grid_sample`` over an affine grid
+built for the whole batch, filling with zeros as ``RandomRotation`` does.
+The uint8 -> [0, 1] scaling and the normalization are folded into one
+multiply-add on the result.
+
+It is an ``nn.Module``: move it to ``DEVICE`` together with the model and
+switch it with ``.train()`` / ``.eval()``.  Random rotation only happens in
+training mode.  With ``channels_last`` set (``layout.to_channels_last``)
+the batch comes out in the channels_last memory format.
+"""
+
+import math
+
+import torch
+from torch import nn
+import torch.nn.functional as F
+
+
+class BatchAugment(nn.Module):
+    """Rotate by a random angle in ``[-degrees, degrees]``, resize to ``size`` and normalize.
+
+    Angles are drawn from a generator seeded with ``seed + step`` when a
+    seed is given, so the augmentation of batch ``step`` is the same in
+    every run and on every device.
+    """
+    channels_last = False
+
+    def __init__(self, size=None, degrees=0, mean=None, std=None, seed=None):
+        super(BatchAugment, self).__init__()
+        self.size = (size, size) if isinstance(size, int) else size
+        self.degrees = degrees
+        self.seed = seed
+        mean = torch.tensor(mean if mean is not None else (0.,), dtype=torch.float32)
+        std = torch.tensor(std if std is not None else (1.,), dtype=torch.float32)
+        self.register_buffer('mean', mean.view(1, -1, 1, 1), persistent=False)
+        self.register_buffer('std', std.view(1, -1, 1, 1), persistent=False)
+
+    def _angles(self, n, step):
+        if self.seed is not None and step is not None:
+            generator = torch.Generator().manual_seed(self.seed + step)
+        else:
+            generator = None
+        angles = torch.rand(n, generator=generator) * 2 * self.degrees - self.degrees
+        return angles * (math.pi / 180)
+
+    def _grid(self, x, step):
+        n, c, h, w = x.shape
+        angles = self._angles(n, step)
+        cos, sin = angles.cos(), angles.sin()
+        theta = torch.zeros(n, 2, 3)
+        # rotation in pixel space, expressed in normalized coordinates
+        theta[:, 0, 0] = cos
+        theta[:, 0, 1] = -sin * h / w
+        theta[:, 1, 0] = sin * w / h
+        theta[:, 1, 1] = cos
+        theta = theta.to(device=x.device, dtype=x.dtype)
+        return F.affine_grid(theta, [n, c, h, w], align_corners=False)
+
+    def forward(self, x, step=None):
+        scale = 1. / 255 if x.dtype == torch.uint8 else 1.
+        memory_format = torch.channels_last if self.channels_last else torch.preserve_format
+        x = x.to(torch.float32, memory_format=memory_format)
+        out_size = self.size or tuple(x.shape[-2:])
+        resize = tuple(out_size) != tuple(x.shape[-2:])
+        rotate = self.training and self.degrees
+        if resize:
+            # resized first, as in Resize -> RandomRotation; the border is clamped, not blended with zeros
+            x = F.interpolate(x, size=tuple(out_size), mode='bilinear', align_corners=False)
+        if rotate:
+            # zero padding matches RandomRotation(fill=0); it commutes with the scaling below
+            x = F.grid_sample(x, self._grid(x, step), mode='bilinear', padding_mode='zeros', align_corners=False)
+        if self.channels_last and (resize or rotate):
+            x = x.contiguous(memory_format=torch.channels_last)
+        # (x * scale - mean) / std as one multiply-add, in the memory format of x
+        return torch.addcmul(-self.mean / self.std, x, scale / self.std)
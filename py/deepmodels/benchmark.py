@@ -0,0 +1,176 @@
+"""Training / inference throughput benchmark of the six script configurations.
+
+Every ``(model, dataset)`` pair of ``presets.PRESETS`` is measured on
+synthetic uint8 batches of the dataset's native shape, pushed through the
+preset's ``BatchAugment``, model, optimizer and batch size exactly as
+``train`` would, so nothing is downloaded.  Each pair runs in a fresh
+process (``timing.run_isolated``) so its peak RSS is its own.
+
+Metrics per pair: ``train_images_per_sec`` (forward, backward, optimizer
+step), ``eval_images_per_sec`` (eval forward without autograd),
+``latency_p50_ms`` / ``latency_p99_ms`` for a single image and
+``peak_rss_mb``.  ``run_benchmarks`` appends a run to a JSON history
+file, ``compare_runs`` checks one run against another and flags every
+metric that got worse by more than a threshold.
+"""
+
+import datetime
+import json
+import os
+import platform
+import subprocess
+
+import torch
+
+from .presets import PRESETS, get_preset
+from .timing import median, peak_rss_mb, percentile, time_fn
+
+HISTORY_FILE = 'benchmark_history.json'
+
+# True when a larger value is better
+METRICS = {
+    'train_images_per_sec': True,
+    'eval_images_per_sec': True,
+    'latency_p50_ms': False,
+    'latency_p99_ms': False,
+    'peak_rss_mb': False,
+}
+
+
+def benchmark_pair(model_name, dataset, train_steps=10, eval_iters=10, latency_iters=100, device='cpu'):
+    """Measure one preset pair on synthetic data; meant to run in its own process."""
+    from .cli import make_optimizer
+    from .data import DATASETS, make_augment
+    from .engine import criterion, init_weights, logits_of
+    from .models import build_model
+
+    torch.manual_seed(0)
+    device = torch.device(device)
+    info = DATASETS[dataset]
+    preset = get_preset(model_name, dataset)
+    size = preset['image_size'] or info['image_size']
+    batch_size = preset['batch_size']
+    num_classes = len(info['classes'])
+
+    model = build_model(model_name, num_classes=num_classes, in_channels=info['in_channels'],
+                        image_size=size, **preset['model_kwargs'])
+    model.apply(init_weights)
+    model = model.to(device)
+    augment = make_augment(preset['image_size'], preset['degrees'], preset['mean'], preset['std'], seed=0).to(device)
+    optimizer = make_optimizer(preset['optimizer'], model.parameters(), preset['lr'])
+    native = info['image_size']
+    images = torch.randint(0, 256, (batch_size, info['in_channels'], native, native), dtype=torch.uint8)
+    targets = torch.randint(num_classes, (batch_size,))
+
+    model.train()
+    augment.train()
+
+    def train_step():
+        features = augment(images.to(device), step=0)
+        loss = criterion(model(features), targets.to(device))
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+    train_seconds = median(time_fn(train_step, device, warmup=2, iters=train_steps))
+
+    model.eval()
+    augment.eval()
+
+    def eval_step(batch):
+        def forward():
+            with torch.no_grad():
+                logits_of(model(augment(batch.to(device))))
+        return forward
+    eval_seconds = median(time_fn(eval_step(images), device, warmup=2, iters=eval_iters))
+    latencies = time_fn(eval_step(images[:1]), device, warmup=5, iters=latency_iters)
+
+    return {
+        'model': model_name,
+        'dataset': dataset,
+        'batch_size': batch_size,
+        'image_size': size,
+        'train_images_per_sec': batch_size / train_seconds,
+        'eval_images_per_sec': batch_size / eval_seconds,
+        'latency_p50_ms': percentile(latencies, 50) * 1000,
+        'latency_p99_ms': percentile(latencies, 99) * 1000,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path=HISTORY_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def run_benchmarks(pairs=None, history_file=HISTORY_FILE, label=None, device='cpu', **kwargs):
+    """Benchmark ``pairs`` (default: every preset), print them and append the run to ``history_file``."""
+    from .timing import run_isolated
+
+    pairs = pairs or sorted(PRESETS)
+    results = []
+    for model_name, dataset in pairs:
+        print(f'benchmarking {model_name} / {dataset} ...', flush=True)
+        results.append(run_isolated(benchmark_pair, model_name, dataset, device=str(device), **kwargs))
+    run = {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'label': label,
+        'commit': _git_commit(),
+        'torch': torch.__version__,
+        'host': platform.node(),
+        'cpu_count': os.cpu_count(),
+        'device': str(device),
+        'results': results,
+    }
+    print_run(run)
+    history = load_history(history_file)
+    history.append(run)
+    tmp = f'{history_file}.tmp-{os.getpid()}'
+    with open(tmp, 'w') as f:
+        json.dump(history, f, indent=1)
+    os.replace(tmp, history_file)
+    return run
+
+
+def print_run(run):
+    print(f'run {run["timestamp"]} commit {run["commit"]} ({run["label"] or "no label"}) on {run["device"]}')
+    print(f'{"model":>18} | {"dataset":>7} | {"train img/s":>11} | {"eval img/s":>10} '
+          f'| {"p50 ms":>7} | {"p99 ms":>7} | peak RSS MB')
+    for r in run['results']:
+        print(f'{r["model"]:>18} | {r["dataset"]:>7} | {r["train_images_per_sec"]:11.1f} '
+              f'| {r["eval_images_per_sec"]:10.1f} | {r["latency_p50_ms"]:7.2f} | {r["latency_p99_ms"]:7.2f} '
+              f'| {r["peak_rss_mb"]:.0f}')
+
+
+def compare_runs(baseline, current, threshold=0.05):
+    """Print the relative change of every metric and return the regressions beyond ``threshold``."""
+    base = {(r['model'], r['dataset']): r for r in baseline['results']}
+    regressions = []
+    print(f'{baseline["timestamp"]} ({baseline["commit"]}) -> {current["timestamp"]} ({current["commit"]}), '
+          f'threshold {threshold:.0%}')
+    for r in current['results']:
+        key = (r['model'], r['dataset'])
+        if key not in base:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            before, after = base[key][metric], r[metric]
+            change = (after - before) / before if before else 0.
+            worse = -change if higher_is_better else change
+            flag = ''
+            if worse > threshold:
+                flag = '  REGRESSION'
+                regressions.append({'model': key[0], 'dataset': key[1], 'metric': metric,
+                                    'before': before, 'after': after, 'change': change})
+            print(f'{key[0]:>18} | {key[1]:>7} | {metric:>20} | {before:10.2f} -> {after:10.2f} '
+                  f'({change:+.1%}){flag}')
+    return regressions
@@ -0,0 +1,161 @@
+"""Pre-resized, memory-mapped image cache.
+
+``transforms.Resize`` and ``transforms.ToTensor`` are deterministic, so there
+is no reason to run them on every image in every epoch.  ``build_cache`` runs
+them once and stores the result as an ``(N, C, H, W)`` uint8 ``.npy`` file;
+``CachedTensorDataset`` maps that file back into memory and hands out tensors
+that share storage with the mapping.  Only the random augmentations still
+run per sample, through the ``transform`` argument.
+
+A 224x224 cache is large (about 7.5 GB for the CIFAR10 training set), it is
+built once under ``<root>/cache`` and reused by every later run.
+
+``split_dataset`` replaces ``random_split`` for the train / validation
+split: the permutation is drawn from its own generator seeded with
+``seed``, not from the global RNG, and stored under ``<root>/cache/splits``
+keyed by dataset name, lengths and seed.  Every later run, every
+``torch.distributed`` rank and every sweep trial loads the same indices
+from there.
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset, Subset
+from torchvision import transforms
+
+
+def cache_dir(root, name, train, size=None):
+    split = 'train' if train else 'test'
+    return os.path.join(root, 'cache', f'{name}-{split}-{size or "native"}')
+
+
+def build_cache(dataset, path, size=None):
+    """Resize every PIL image of ``dataset`` once and write it to ``path``.
+
+    ``dataset`` must yield ``(PIL.Image, label)`` pairs, i.e. a torchvision
+    dataset constructed without a transform.  The cache is written to a
+    temporary directory first and renamed into place, so a crashed or
+    concurrent build never leaves a half-written cache behind.
+    """
+    resize = transforms.Resize(size) if size is not None else None
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    os.makedirs(tmp_path, exist_ok=True)
+
+    images, labels = None, np.empty(len(dataset), dtype=np.int64)
+    for index in range(len(dataset)):
+        img, label = dataset[index]
+        if resize is not None:
+            img = resize(img)
+        arr = np.asarray(img, dtype=np.uint8)
+        if arr.ndim == 2:
+            arr = arr[:, :, None]
+        arr = arr.transpose(2, 0, 1)
+        if images is None:
+            images = np.lib.format.open_memmap(os.path.join(tmp_path, 'images.npy'),
+                                               mode='w+', dtype=np.uint8,
+                                               shape=(len(dataset),) + arr.shape)
+        images[index] = arr
+        labels[index] = label
+    images.flush()
+    del images
+    np.save(os.path.join(tmp_path, 'labels.npy'), labels)
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump({'size': size, 'length': len(dataset)}, f)
+
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        # another process finished the same cache first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return path
+
+
+class CachedTensorDataset(Dataset):
+    """Serves images from a cache written by ``build_cache``.
+
+    By default an item is the float image in ``[0, 1]``, exactly what
+    ``ToTensor`` would have produced, passed through ``transform``.  With
+    ``raw=True`` the uint8 tensor is returned as is; it is a view into the
+    memory map, so no copy happens until the batch is collated.
+    """
+
+    def __init__(self, path, transform=None, raw=False):
+        super(CachedTensorDataset, self).__init__()
+        self.path = path
+        self.transform = transform
+        self.raw = raw
+        self._open()
+
+    def _open(self):
+        # copy-on-write mapping: writable for torch.from_numpy, never written back
+        self.images = np.load(os.path.join(self.path, 'images.npy'), mmap_mode='c')
+        self.targets = torch.from_numpy(np.load(os.path.join(self.path, 'labels.npy')))
+
+    def __getstate__(self):
+        # DataLoader workers started with spawn re-open the mapping instead of
+        # receiving a pickled copy of the whole array
+        state = self.__dict__.copy()
+        del state['images'], state['targets']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, index):
+        img = torch.from_numpy(self.images[index])
+        if not self.raw:
+            img = img.float().div_(255)
+        if self.transform is not None:
+            img = self.transform(img)
+        return img, int(self.targets[index])
+
+
+def cached_dataset(dataset_cls, root, train, size=None, transform=None, raw=False, download=False):
+    """Return a ``CachedTensorDataset`` for a torchvision dataset, building the cache if needed.
+
+    ``cached_dataset(datasets.MNIST, 'data', train=True, size=224)`` replaces
+    ``datasets.MNIST('data', train=True, transform=Compose([Resize(224), ToTensor()]))``.
+    """
+    path = cache_dir(root, dataset_cls.__name__.lower(), train, size)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        build_cache(dataset_cls(root=root, train=train, download=download), path, size)
+    return CachedTensorDataset(path, transform=transform, raw=raw)
+
+
+def split_path(root, name, lengths, seed):
+    return os.path.join(root, 'cache', 'splits', f'{name}-{"-".join(map(str, lengths))}-seed{seed}.npy')
+
+
+def split_indices(root, name, lengths, seed=0):
+    """The index arrays of a ``lengths`` split of dataset ``name``, computed once and stored on disk."""
+    path = split_path(root, name, lengths, seed)
+    if not os.path.exists(path):
+        generator = torch.Generator()
+        generator.manual_seed(seed)
+        order = torch.randperm(sum(lengths), generator=generator).numpy()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.tmp-{os.getpid()}.npy'
+        np.save(tmp, order)
+        # a concurrent run writes the same permutation, whichever rename wins is fine
+        os.replace(tmp, path)
+    order = np.load(path)
+    if len(order) != sum(lengths):
+        raise ValueError(f'{path} holds {len(order)} indices, expected {sum(lengths)}')
+    bounds = np.cumsum([0] + list(lengths))
+    return [order[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def split_dataset(dataset, lengths, name, root='data', seed=0):
+    """``random_split(dataset, lengths)`` with the persisted indices of ``split_indices``."""
+    if sum(lengths) != len(dataset):
+        raise ValueError(f'split lengths {lengths} do not add up to the {len(dataset)} samples of {name}')
+    return [Subset(dataset, indices.tolist()) for indices in split_indices(root, name, lengths, seed)]
@@ -0,0 +1,167 @@
+"""Periodic training checkpoints written in the background.
+
+A checkpoint holds everything ``train`` needs to carry on as if it had not
+stopped: model, optimizer and grad scaler state, the epoch and batch it was
+taken at, the running loss / accuracy of that epoch, the metrics history,
+the sampler seed, the LR scheduler and early stopping state and the
+Python / NumPy / torch RNG states of every process.  Together with
+``ResumableSampler`` a run resumed from a mid-epoch checkpoint visits the
+remaining batches of that epoch in the original order.
+
+``CheckpointManager.save`` copies the state to CPU on the calling thread,
+which is quick, and leaves ``torch.save`` to a single writer thread.  Each
+file is written under a temporary name, fsynced and renamed into place, so
+a crash never leaves a truncated checkpoint behind; only the newest
+``keep`` files are kept.  ``best.pt``, the checkpoint of the best
+validation result, is never pruned.
+"""
+
+import glob
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+from .distributed import get_rank
+
+
+def cpu_snapshot(obj):
+    """Copy every tensor in a nested state so later training steps cannot change it."""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {key: cpu_snapshot(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(cpu_snapshot(value) for value in obj)
+    return obj
+
+
+def rng_state():
+    state = {'python': random.getstate(), 'numpy': np.random.get_state(), 'torch': torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def process_rng_state(state, rank=None):
+    """The RNG state ``state`` holds for process ``rank`` (default: this one)."""
+    states = state['rng']
+    if isinstance(states, dict):
+        # written before the states of all ranks were kept
+        return states
+    rank = get_rank() if rank is None else rank
+    return states[rank] if rank < len(states) else states[0]
+
+
+def training_state(model, optimizer, scaler, sampler, epoch, batch, running, history,
+                   scheduler=None, early_stopping=None, rng=None):
+    """Everything needed to resume at ``batch`` of ``epoch`` (both zero-based).
+
+    ``rng`` is the list of every process's ``rng_state()`` indexed by rank,
+    see ``distributed.all_gather_value``; by default only this process's.
+    """
+    return {
+        'model': model.state_dict(),
+        'optimizer': optimizer.state_dict(),
+        'scaler': scaler.state_dict(),
+        'sampler': sampler.state_dict() if hasattr(sampler, 'state_dict') else None,
+        'epoch': epoch,
+        'batch': batch,
+        'running': running,
+        'history': history,
+        'scheduler': scheduler.state_dict() if scheduler is not None else None,
+        'early_stopping': early_stopping.state_dict() if early_stopping is not None else None,
+        'rng': rng if rng is not None else [rng_state()],
+    }
+
+
+def restore_training_state(state, model, optimizer, scaler, sampler=None, scheduler=None, early_stopping=None,
+                           restore_rng=True):
+    """Load ``state`` into the training objects and return ``(epoch, batch, running, history)``.
+
+    ``restore_rng=False`` leaves the RNG states to the caller
+    (``set_rng_state(process_rng_state(state))``), who has to restore them
+    at the point of the run where they were saved.
+    """
+    model.load_state_dict(state['model'])
+    optimizer.load_state_dict(state['optimizer'])
+    scaler.load_state_dict(state['scaler'])
+    if state['sampler'] is not None and hasattr(sampler, 'load_state_dict'):
+        sampler.load_state_dict(state['sampler'])
+    if state.get('scheduler') is not None and scheduler is not None:
+        scheduler.load_state_dict(state['scheduler'])
+    if state.get('early_stopping') is not None and early_stopping is not None:
+        early_stopping.load_state_dict(state['early_stopping'])
+    if restore_rng:
+        set_rng_state(process_rng_state(state))
+    return state['epoch'], state['batch'], state['running'], state['history']
+
+
+class CheckpointManager:
+    """Writes checkpoints to ``directory`` from a background thread, keeping the last ``keep``."""
+
+    def __init__(self, directory, keep=3):
+        if keep < 1:
+            raise ValueError(f'keep must be at least 1, got {keep}')
+        self.directory = directory
+        self.keep = keep
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='checkpoint-writer')
+        self._pending = None
+        os.makedirs(directory, exist_ok=True)
+
+    def checkpoints(self):
+        return sorted(glob.glob(os.path.join(self.directory, 'checkpoint-e*-b*.pt')))
+
+    def latest(self):
+        checkpoints = self.checkpoints()
+        return checkpoints[-1] if checkpoints else None
+
+    def load(self, path=None, map_location='cpu'):
+        path = path or self.latest()
+        if path is None:
+            return None
+        # the state holds RNG states and metrics, not only tensors
+        return torch.load(path, map_location=map_location, weights_only=False)
+
+    def save(self, state, name=None):
+        """Snapshot ``state`` (from ``training_state``) and queue it for writing; returns the target path.
+
+        ``name`` saves to ``<name>.pt`` instead of the numbered files, outside the retention.
+        """
+        name = name or f'checkpoint-e{state["epoch"]:04d}-b{state["batch"]:06d}'
+        path = os.path.join(self.directory, f'{name}.pt')
+        snapshot = cpu_snapshot(state)
+        # at most one snapshot waits in memory; this only blocks if the disk is slower than the interval
+        self.wait()
+        self._pending = self._writer.submit(self._write, snapshot, path)
+        return path
+
+    def _write(self, snapshot, path):
+        tmp = f'{path}.tmp-{os.getpid()}'
+        with open(tmp, 'wb') as f:
+            torch.save(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        for old in self.checkpoints()[:-self.keep]:
+            os.remove(old)
+
+    def wait(self):
+        """Block until the last queued checkpoint is on disk, re-raising any write error."""
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+
+    def close(self):
+        self.wait()
+        self._writer.shutdown()
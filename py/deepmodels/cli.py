@@ -0,0 +1,522 @@
+"""Command line entry point: ``python -m deepmodels train --model resnet18 --dataset cifar10``.
+
+Run it from the ``py/`` directory.  Any hyperparameter that is not given
+on the command line comes from ``presets.py``.
+"""
+
+import argparse
+import os
+import shlex
+import sys
+import time
+from functools import partial
+
+import torch
+
+from .benchmark import HISTORY_FILE, compare_runs, load_history, run_benchmarks
+from .checkpoint import CheckpointManager
+from .compiled import COMPILE_MODES, compile_model
+from .data import DATASETS, load_datasets, make_augment, make_loaders, make_shard_loaders
+from .distributed import cleanup, get_rank, init_distributed, is_main_process, rank_zero_first, wrap_model
+from .engine import init_weights, logits_of, train
+from .fuse import optimize_for_inference
+from .layout import channels_last_report, to_channels_last
+from .models import HEADS, MODELS, build_model, takes_argument
+from .precision import PRECISIONS, check_precision, precision_report
+from .presets import get_preset
+from .profiling import profile_model
+from .quantize import quantize, quantize_report
+from .recompute import GRANULARITIES, enable_activation_checkpointing, memory_report
+from .schedule import SCHEDULERS, EarlyStopping, make_scheduler
+from .serve import DynamicBatcher, serve
+from .shards import shard_info, write_shards
+from .sweep import grid, run_sweep, save_json
+from .timing import median, time_fn
+
+
+def make_optimizer(name, parameters, lr):
+    if name == 'sgd':
+        return torch.optim.SGD(parameters, lr=lr, momentum=0.9)
+    return torch.optim.Adam(parameters, lr=lr)
+
+
+def resolve(args):
+    """Fill the unset hyperparameters of ``args`` from the preset of its model / dataset pair."""
+    preset = get_preset(args.model, args.dataset)
+    for key, value in preset.items():
+        if getattr(args, key, None) is None:
+            setattr(args, key, value)
+    if getattr(args, 'head', None):
+        if not takes_argument(args.model, 'head'):
+            sys.exit(f'--head is not supported by {args.model}, only by the VGG and GoogLeNet models')
+        args.model_kwargs = dict(args.model_kwargs, head=args.head)
+    return args
+
+
+def train_command(args):
+    args = resolve(args)
+    if args.shards and not args.val_shards:
+        sys.exit('--val-shards is required with --shards')
+    info = shard_info(args.shards) if args.shards else DATASETS[args.dataset]
+    device = init_distributed(args.dist_backend, args.threads_per_process)
+    if device is None or args.device:
+        device = torch.device(args.device or ('cuda:0' if torch.cuda.is_available() else 'cpu'))
+    try:
+        check_precision(device, args.precision)
+    except ValueError as exc:
+        sys.exit(str(exc))
+    # the same seed on every process: identical initial weights
+    torch.manual_seed(args.seed)
+
+    if args.shards:
+        train_loader, val_loader, test_loader = make_shard_loaders(
+            args.shards, args.val_shards, args.test_shards, args.batch_size, seed=args.seed,
+            shuffle_buffer=args.shuffle_buffer, num_workers=args.loader_workers or 0)
+    else:
+        # rank 0 downloads, caches, splits and tunes the loaders; the other processes then read its files
+        with rank_zero_first():
+            train_set, val_set, test_ds = load_datasets(args.dataset, root=args.data_root, seed=args.seed,
+                                                        size=args.image_size)
+            train_loader, val_loader, test_loader = make_loaders(train_set, val_set, test_ds, args.batch_size,
+                                                                 seed=args.seed, num_workers=args.loader_workers)
+    augment = make_augment(args.image_size, args.degrees, args.mean, args.std, seed=args.seed)
+
+    model = build_model(args.model, num_classes=len(info['classes']), in_channels=info['in_channels'],
+                        image_size=args.image_size or info['image_size'], **args.model_kwargs)
+    model.apply(init_weights)
+    if hasattr(model, 'aux_logits') and not any(args.aux_weights):
+        model.aux_logits = False
+    enable_activation_checkpointing(model, args.activation_checkpointing)
+    if args.channels_last:
+        to_channels_last(model)
+        to_channels_last(augment)
+    optimizer = make_optimizer(args.optimizer, model.parameters(), args.lr)
+    scheduler = make_scheduler(args.scheduler, optimizer, args.lr, args.epochs, len(train_loader))
+    early_stopping = EarlyStopping(args.early_stopping, args.min_delta) if args.early_stopping else None
+    model = model.to(device)
+    augment = augment.to(device)
+    # a GoogLeNet aux head with weight 0 gets no gradient, DDP has to be told
+    ddp_model = wrap_model(model, device, bucket_cap_mb=args.bucket_cap_mb,
+                           find_unused_parameters=hasattr(model, 'aux_logits') and not all(args.aux_weights))
+    ddp_model = compile_model(ddp_model, args.compile)
+    torch.manual_seed(args.seed + get_rank())
+    checkpoints = CheckpointManager(args.checkpoint_dir, keep=args.keep_checkpoints) if args.checkpoint_dir else None
+    resume = checkpoints.load() if checkpoints is not None and args.resume else None
+
+    history = train(model=ddp_model,
+                    num_epochs=args.epochs,
+                    train_loader=train_loader,
+                    valid_loader=val_loader,
+                    test_loader=test_loader,
+                    optimizer=optimizer,
+                    device=device,
+                    augment=augment,
+                    eval_train=args.eval_train,
+                    precision=args.precision,
+                    aux_weights=args.aux_weights,
+                    checkpoints=checkpoints,
+                    checkpoint_every=args.checkpoint_every,
+                    resume=resume,
+                    scheduler=scheduler,
+                    early_stopping=early_stopping,
+                    validate_every=args.validate_every,
+                    validate_every_steps=args.validate_every_steps,
+                    restore_best=args.restore_best,
+                    on_validate=partial(save_json, args.history_file) if args.history_file else None)
+    if checkpoints is not None:
+        checkpoints.close()
+    if is_main_process():
+        if args.precision != 'fp32':
+            precision_report(model, val_loader, device, augment, precisions=('fp32', args.precision))
+        if args.save:
+            torch.save(model.state_dict(), args.save)
+            print(f'Saved weights to {args.save}')
+    cleanup()
+    return history
+
+
+def load_trained(args):
+    """Build the model of ``args`` and load ``args.weights`` into it, return ``(model, augment, device)``.
+
+    ``args.weights`` is a state_dict saved by ``train --save`` or a checkpoint from ``--checkpoint-dir``.
+    """
+    args = resolve(args)
+    info = DATASETS[args.dataset]
+    device = torch.device(args.device or ('cuda:0' if torch.cuda.is_available() else 'cpu'))
+    model = build_model(args.model, num_classes=len(info['classes']), in_channels=info['in_channels'],
+                        image_size=args.image_size or info['image_size'], **args.model_kwargs)
+    if args.weights:
+        state = torch.load(args.weights, map_location='cpu', weights_only=False)
+        model.load_state_dict(state['model'] if 'optimizer' in state else state)
+    augment = make_augment(args.image_size, args.degrees, args.mean, args.std)
+    if getattr(args, 'channels_last', False):
+        to_channels_last(model)
+        to_channels_last(augment)
+    return model.to(device).eval(), augment.to(device).eval(), device
+
+
+def example_batch(args, batch_size):
+    info = DATASETS[args.dataset]
+    size = args.image_size or info['image_size']
+    return torch.rand(batch_size, info['in_channels'], size, size)
+
+
+def optimize_command(args):
+    model, _, device = load_trained(args)
+    features = example_batch(args, args.batch_size).to(device)
+    if args.channels_last:
+        features = features.contiguous(memory_format=torch.channels_last)
+    optimized = optimize_for_inference(model, example_input=features)
+    if args.channels_last:
+        # folding BatchNorm creates new, NCHW conv weights
+        to_channels_last(optimized)
+
+    def timed(m):
+        def forward():
+            with torch.no_grad():
+                logits_of(m(features))
+        return median(time_fn(forward, device, iters=args.iters))
+    before, after = timed(model), timed(optimized)
+    print(f'eager:     {before * 1000:8.2f} ms/batch')
+    print(f'optimized: {after * 1000:8.2f} ms/batch ({before / after:.2f}x)')
+    if args.output:
+        torch.save(optimized, args.output)
+        print(f'Saved optimized model to {args.output}')
+    return optimized
+
+
+def quantize_command(args):
+    args = resolve(args)
+    args.device = 'cpu'
+    model, augment, _ = load_trained(args)
+    train_set, val_set, test_ds = load_datasets(args.dataset, root=args.data_root, seed=args.seed,
+                                                size=args.image_size)
+    _, val_loader, test_loader = make_loaders(train_set, val_set, test_ds, args.batch_size)
+
+    quantized = quantize(model, val_loader, augment, num_batches=args.calibration_batches)
+    quantize_report({'fp32': model, 'int8': quantized}, test_loader, augment)
+    if args.output:
+        example = augment(example_batch(args, 1))
+        torch.jit.save(torch.jit.trace(quantized, example), args.output)
+        print(f'Saved int8 TorchScript model to {args.output}')
+    return quantized
+
+
+def memory_report_command(args):
+    args = resolve(args)
+    info = DATASETS[args.dataset]
+    device = args.device or ('cuda:0' if torch.cuda.is_available() else 'cpu')
+    return memory_report(args.model, args.batch_size, args.image_size or info['image_size'],
+                         info['in_channels'], len(info['classes']), device=device, steps=args.steps,
+                         model_kwargs=args.model_kwargs)
+
+
+def serve_command(args):
+    model, augment, device = load_trained(args)
+    info = DATASETS[args.dataset]
+    if args.compile != 'eager':
+        with torch.no_grad():
+            example = augment(example_batch(args, args.max_batch_size).to(device))
+        model = compile_model(model, args.compile, example)
+    batcher = DynamicBatcher(model, augment, device, info['classes'],
+                             max_batch_size=args.max_batch_size, max_latency_ms=args.max_latency_ms)
+    serve(batcher, info['in_channels'], info['image_size'], host=args.host, port=args.port,
+          socket_path=args.unix_socket, verbose=args.verbose)
+
+
+def report_models(names, dataset, image_size=None):
+    """``{name: (model, (C, H, W))}`` of freshly built models at their preset (else native) resolution."""
+    info = DATASETS[dataset]
+    models = {}
+    for name in names:
+        preset = get_preset(name, dataset)
+        size = image_size or preset['image_size'] or info['image_size']
+        model = build_model(name, num_classes=len(info['classes']), in_channels=info['in_channels'],
+                            image_size=size, **preset['model_kwargs'])
+        models[name] = (model, (info['in_channels'], size, size))
+    return models
+
+
+def channels_last_command(args):
+    device = args.device or ('cuda:0' if torch.cuda.is_available() else 'cpu')
+    models = report_models(args.models, args.dataset, args.image_size)
+    return channels_last_report(models, args.batch_size, len(DATASETS[args.dataset]['classes']),
+                                device=device, iters=args.iters)
+
+
+def profile_command(args):
+    device = args.device or ('cuda:0' if torch.cuda.is_available() else 'cpu')
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    reports = []
+    for name, (model, shape) in report_models(args.models, args.dataset, args.image_size).items():
+        prefix = os.path.join(args.output_dir, f'{name}-{args.dataset}') if args.output_dir else None
+        reports.append(profile_model(model, torch.rand(args.batch_size, *shape), device, args.warmup, args.iters,
+                                     json_path=prefix and f'{prefix}.json',
+                                     trace_path=prefix and f'{prefix}.trace.json', label=name))
+        print()
+    return reports
+
+
+def benchmark_command(args):
+    pairs = [tuple(pair.split(':')) for pair in args.pairs] if args.pairs else None
+    device = args.device or ('cuda:0' if torch.cuda.is_available() else 'cpu')
+    return run_benchmarks(pairs, args.history, label=args.label, device=device, train_steps=args.train_steps,
+                          eval_iters=args.eval_iters, latency_iters=args.latency_iters)
+
+
+def benchmark_compare_command(args):
+    history = load_history(args.history)
+    if len(history) < 2:
+        sys.exit(f'{args.history} has {len(history)} run(s), need two to compare')
+    regressions = compare_runs(history[args.baseline], history[args.current], args.threshold)
+    if regressions:
+        sys.exit(f'{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}')
+
+
+def make_shards_command(args):
+    if args.image_folder:
+        from torchvision.datasets import ImageFolder
+        dataset = ImageFolder(args.image_folder)
+        classes = dataset.classes
+    else:
+        info = DATASETS[args.dataset]
+        dataset = info['cls'](root=args.data_root, train=args.split == 'train', download=True)
+        classes = info['classes']
+    write_shards(dataset, args.output_dir, classes, image_size=args.image_size, shard_size=args.shard_size,
+                 image_format=args.format)
+    print(f'Wrote {len(dataset)} images to {args.output_dir}')
+
+
+def sweep_command(args):
+    args = resolve(args)
+    configs = grid(args.lrs or [args.lr], args.batch_sizes or [args.batch_size], args.optimizers or [args.optimizer],
+                   num_trials=args.trials, seed=args.seed)
+    return run_sweep(args.model, args.dataset, configs, parallel=args.parallel, epochs=args.epochs, seed=args.seed,
+                     data_root=args.data_root, output_dir=args.output_dir, prune_after=args.prune_after,
+                     min_trials=args.min_trials, train_args=shlex.split(args.train_args))
+
+
+def resolution_command(args):
+    """Train the same preset at several input resolutions and compare accuracy and wall time."""
+    info = DATASETS[args.dataset]
+    sizes = args.sizes or [info['image_size'], 224]
+    results = []
+    for size in sizes:
+        print(f'--- {args.model} / {args.dataset} at {size}x{size} ---', flush=True)
+        argv = ['train', '--model', args.model, '--dataset', args.dataset, '--image-size', str(size),
+                '--data-root', args.data_root, '--seed', str(args.seed)]
+        if args.epochs is not None:
+            argv += ['--epochs', str(args.epochs)]
+        if args.device:
+            argv += ['--device', args.device]
+        start = time.perf_counter()
+        history = train_command(build_parser().parse_args(argv))
+        minutes = (time.perf_counter() - start) / 60
+        valid = [h['valid_acc'] for h in history if h['valid_acc'] is not None]
+        results.append((size, max(valid, default=float('nan')), valid[-1] if valid else float('nan'), minutes))
+    print(f'{"size":>7} | {"best valid %":>12} | {"last valid %":>12} | {"minutes":>7}')
+    for size, best, last, minutes in results:
+        print(f'{size:>3}x{size:<3} | {best:12.2f} | {last:12.2f} | {minutes:7.2f}')
+    return results
+
+
+def add_model_arguments(parser):
+    parser.add_argument('--model', required=True, choices=sorted(MODELS))
+    parser.add_argument('--dataset', required=True, choices=sorted(DATASETS))
+    parser.add_argument('--image-size', type=int, default=None,
+                        help='resize inputs to this resolution (default: preset, else native)')
+    parser.add_argument('--head', choices=HEADS, default=None,
+                        help='VGG / GoogLeNet classifier: global avg / max pool (default: avg) or the scripts\' '
+                             'flatten + Linear over the whole map')
+    parser.add_argument('--data-root', default='data')
+    parser.add_argument('--device', default=None, help='default: cuda:0 if available, else cpu')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m deepmodels')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('train', help='train a registered model on a dataset')
+    add_model_arguments(p)
+    p.add_argument('--epochs', type=int, default=None)
+    p.add_argument('--lr', type=float, default=None)
+    p.add_argument('--batch-size', type=int, default=None)
+    p.add_argument('--optimizer', choices=['adam', 'sgd'], default=None)
+    p.add_argument('--seed', type=int, default=42)
+    p.add_argument('--eval-train', action='store_true',
+                   help='re-evaluate the full training set after every epoch instead of reporting running accuracy')
+    p.add_argument('--precision', choices=sorted(PRECISIONS), default='fp32',
+                   help='autocast dtype for training and evaluation (bf16 on CPU, fp16 uses loss scaling)')
+    p.add_argument('--activation-checkpointing', choices=GRANULARITIES, default='none',
+                   help='recompute activations in backward per module or per stage to save memory')
+    p.add_argument('--aux-weights', type=float, nargs=2, default=(0.3, 0.3), metavar=('AUX1', 'AUX2'),
+                   help='loss weights of the GoogLeNet auxiliary classifiers, 0 0 skips the heads')
+    p.add_argument('--save', default=None, help='write the trained state_dict to this path')
+    p.add_argument('--scheduler', choices=SCHEDULERS, default='none',
+                   help='plateau: divide the lr by 10 when validation accuracy stalls; onecycle: warm up to --lr '
+                        'and anneal over the run')
+    p.add_argument('--early-stopping', type=int, default=0, metavar='PATIENCE',
+                   help='stop after this many validations without improvement (0: off)')
+    p.add_argument('--min-delta', type=float, default=0., help='smallest accuracy gain (points) that counts')
+    p.add_argument('--validate-every', type=int, default=1, metavar='EPOCHS')
+    p.add_argument('--validate-every-steps', type=int, default=0, metavar='BATCHES',
+                   help='also validate every this many batches within an epoch')
+    p.add_argument('--restore-best', action='store_true',
+                   help='load the weights of the best validation back before testing and saving')
+    p.add_argument('--checkpoint-dir', default=None,
+                   help='write a checkpoint here after every epoch (and every --checkpoint-every batches)')
+    p.add_argument('--checkpoint-every', type=int, default=0, metavar='BATCHES')
+    p.add_argument('--keep-checkpoints', type=int, default=3, help='how many of the newest checkpoints to keep')
+    p.add_argument('--resume', action='store_true', help='continue from the newest checkpoint in --checkpoint-dir')
+    p.add_argument('--channels-last', action='store_true',
+                   help='run the model and the input batches in the channels_last (NHWC) memory format')
+    p.add_argument('--compile', choices=['eager', 'compile'], default='eager',
+                   help='torch.compile the training step and evaluation, cached on disk across runs')
+    p.add_argument('--dist-backend', choices=['gloo', 'nccl'], default='gloo',
+                   help='process group backend when launched with torchrun')
+    p.add_argument('--bucket-cap-mb', type=float, default=25,
+                   help='DDP gradient bucket size; smaller buckets start all-reducing earlier in backward')
+    p.add_argument('--threads-per-process', type=int, default=None,
+                   help='torch threads of each torchrun process (default: cores / local processes)')
+    p.add_argument('--shards', default=None, metavar='DIR',
+                   help='stream the training set from this shard directory (make-shards) instead of --dataset; '
+                        '--dataset then only selects the preset hyperparameters')
+    p.add_argument('--val-shards', default=None, metavar='DIR', help='validation shards, required with --shards')
+    p.add_argument('--test-shards', default=None, metavar='DIR', help='test shards (default: --val-shards)')
+    p.add_argument('--shuffle-buffer', type=int, default=10000, help='samples held for shuffling the shard stream')
+    p.add_argument('--loader-workers', type=int, default=None,
+                   help='DataLoader workers (default: autotuned, 0 for --shards)')
+    p.add_argument('--history-file', default=None,
+                   help='rewrite the validation history to this JSON file after every validation')
+    p.set_defaults(func=train_command)
+
+    p = commands.add_parser('make-shards', help='write a dataset or an image folder as tar shards for train --shards')
+    p.add_argument('--output-dir', required=True)
+    source = p.add_mutually_exclusive_group(required=True)
+    source.add_argument('--dataset', choices=sorted(DATASETS))
+    source.add_argument('--image-folder', metavar='DIR', help='one sub-directory of images per class')
+    p.add_argument('--split', choices=['train', 'test'], default='train', help='split of --dataset to write')
+    p.add_argument('--image-size', type=int, default=None, help='resize to this square size while writing')
+    p.add_argument('--shard-size', type=int, default=10000, help='images per shard')
+    p.add_argument('--format', choices=['png', 'jpg'], default='png')
+    p.add_argument('--data-root', default='data')
+    p.set_defaults(func=make_shards_command)
+
+    p = commands.add_parser('optimize', help='fold BatchNorm into the convolutions for inference and time the result')
+    add_model_arguments(p)
+    p.add_argument('--weights', default=None, help='state_dict saved by train --save, or a checkpoint')
+    p.add_argument('--batch-size', type=int, default=None)
+    p.add_argument('--iters', type=int, default=20)
+    p.add_argument('--output', default=None, help='torch.save the optimized module to this path')
+    p.add_argument('--channels-last', action='store_true', help='optimize and time the model in NHWC')
+    p.set_defaults(func=optimize_command)
+
+    p = commands.add_parser('quantize', help='int8 post-training quantization calibrated on the validation split')
+    add_model_arguments(p)
+    p.add_argument('--weights', required=True, help='state_dict saved by train --save, or a checkpoint')
+    p.add_argument('--batch-size', type=int, default=None)
+    p.add_argument('--seed', type=int, default=42,
+                   help='must match the seed used for training (selects the stored validation split)')
+    p.add_argument('--calibration-batches', type=int, default=32)
+    p.add_argument('--output', default=None, help='save the int8 model as TorchScript to this path')
+    p.set_defaults(func=quantize_command)
+
+    p = commands.add_parser('memory-report',
+                            help='peak memory vs. step time for each activation checkpointing granularity')
+    add_model_arguments(p)
+    p.add_argument('--batch-size', type=int, default=None)
+    p.add_argument('--steps', type=int, default=5)
+    p.set_defaults(func=memory_report_command)
+
+    p = commands.add_parser('serve', help='serve top-k predictions over HTTP with dynamic batching')
+    add_model_arguments(p)
+    p.add_argument('--weights', required=True, help='state_dict saved by train --save, or a checkpoint')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8080)
+    p.add_argument('--unix-socket', default=None, help='listen on this Unix socket instead of host:port')
+    p.add_argument('--max-batch-size', type=int, default=64)
+    p.add_argument('--max-latency-ms', type=float, default=5.,
+                   help='how long the first request of a batch may wait for others to join it')
+    p.add_argument('--verbose', action='store_true', help='log every request')
+    p.add_argument('--channels-last', action='store_true', help='run the model in the channels_last memory format')
+    p.add_argument('--compile', choices=COMPILE_MODES, default='eager',
+                   help='torch.compile or TorchScript-trace the model, cached on disk across runs')
+    p.set_defaults(func=serve_command)
+
+    p = commands.add_parser('channels-last-report',
+                            help='time inference and training steps of each model in NCHW and channels_last')
+    p.add_argument('--models', nargs='+', choices=sorted(MODELS), default=['resnet18', 'vgg16', 'googlenet'])
+    p.add_argument('--dataset', choices=sorted(DATASETS), default='cifar10')
+    p.add_argument('--image-size', type=int, default=None, help='default: preset, else native')
+    p.add_argument('--batch-size', type=int, default=32)
+    p.add_argument('--iters', type=int, default=10)
+    p.add_argument('--device', default=None)
+    p.set_defaults(func=channels_last_command)
+
+    p = commands.add_parser('profile', help='per-module time, FLOPs and activation size of each model')
+    p.add_argument('--models', nargs='+', choices=sorted(MODELS), default=sorted(MODELS))
+    p.add_argument('--dataset', choices=sorted(DATASETS), default='cifar10')
+    p.add_argument('--image-size', type=int, default=None, help='default: preset, else native')
+    p.add_argument('--batch-size', type=int, default=32)
+    p.add_argument('--warmup', type=int, default=5)
+    p.add_argument('--iters', type=int, default=20)
+    p.add_argument('--device', default=None)
+    p.add_argument('--output-dir', default=None,
+                   help='write <model>-<dataset>.json and a Chrome trace <model>-<dataset>.trace.json here')
+    p.set_defaults(func=profile_command)
+
+    p = commands.add_parser('benchmark', help='train / eval throughput, latency and peak RSS of the script presets')
+    p.add_argument('--pairs', nargs='+', default=None, metavar='MODEL:DATASET',
+                   help='default: every (model, dataset) pair in presets.py')
+    p.add_argument('--history', default=HISTORY_FILE, help='JSON file the run is appended to')
+    p.add_argument('--label', default=None, help='free-form note stored with the run')
+    p.add_argument('--train-steps', type=int, default=10)
+    p.add_argument('--eval-iters', type=int, default=10)
+    p.add_argument('--latency-iters', type=int, default=100)
+    p.add_argument('--device', default=None)
+    p.set_defaults(func=benchmark_command)
+
+    p = commands.add_parser('sweep',
+                            help='train a grid of hyperparameters in parallel, core-pinned trials with pruning')
+    p.add_argument('--model', required=True, choices=sorted(MODELS))
+    p.add_argument('--dataset', required=True, choices=sorted(DATASETS))
+    p.add_argument('--lrs', type=float, nargs='+', default=None, help='default: the preset learning rate')
+    p.add_argument('--batch-sizes', type=int, nargs='+', default=None, help='default: the preset batch size')
+    p.add_argument('--optimizers', choices=['adam', 'sgd'], nargs='+', default=None,
+                   help='default: the preset optimizer')
+    p.add_argument('--trials', type=int, default=None, help='random sample of this many configurations (default: all)')
+    p.add_argument('--parallel', type=int, default=2, help='trials running at once, each on its own block of cores')
+    p.add_argument('--epochs', type=int, default=None, help='default: the preset')
+    p.add_argument('--prune-after', type=int, default=1, metavar='EPOCHS',
+                   help='stop trials below the median validation accuracy from this epoch on')
+    p.add_argument('--min-trials', type=int, default=3, help='trials that must have reached an epoch before pruning')
+    p.add_argument('--train-args', default='', help='extra train arguments for every trial, e.g. "--precision bf16"')
+    p.add_argument('--output-dir', default='sweep')
+    p.add_argument('--seed', type=int, default=42)
+    p.add_argument('--data-root', default='data')
+    p.set_defaults(func=sweep_command)
+
+    p = commands.add_parser('resolution-report',
+                            help='train the preset at the native resolution and at 224x224, compare accuracy and time')
+    p.add_argument('--model', required=True, choices=sorted(MODELS))
+    p.add_argument('--dataset', required=True, choices=sorted(DATASETS))
+    p.add_argument('--sizes', type=int, nargs='+', default=None, help='default: native size and 224')
+    p.add_argument('--epochs', type=int, default=None, help='default: the preset')
+    p.add_argument('--seed', type=int, default=42)
+    p.add_argument('--data-root', default='data')
+    p.add_argument('--device', default=None)
+    p.set_defaults(func=resolution_command)
+
+    p = commands.add_parser('benchmark-compare', help='compare two runs of the benchmark history, fail on regressions')
+    p.add_argument('--history', default=HISTORY_FILE)
+    p.add_argument('--baseline', type=int, default=-2, help='index of the baseline run in the history')
+    p.add_argument('--current', type=int, default=-1, help='index of the run to check')
+    p.add_argument('--threshold', type=float, default=0.05, help='relative change that counts as a regression')
+    p.set_defaults(func=benchmark_compare_command)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
@@ -0,0 +1,92 @@
+"""Opt-in compiled execution with an on-disk cache that survives the process.
+
+``compile_model(model, mode)`` returns something that is called like the
+model:
+
+``'eager'``
+    the model itself.
+``'compile'``
+    ``torch.compile``, for training and inference.  Inductor's FX graph
+    cache is switched on and pointed at ``CACHE_DIR``, so a second process
+    compiling the same model for the same shapes reuses the generated
+    kernels instead of compiling them again.
+``'script'``
+    a TorchScript trace, for inference only.  The traced module is saved
+    under ``CACHE_DIR`` keyed by the model class, its module structure and
+    settings, its parameter shapes, the input shape / memory format and the
+    torch version; a later process
+    loads it and copies the current weights in rather than tracing again.
+
+VGG with ``probas=True`` returns ``(logits, probas)``; both modes keep the
+tuple, ``engine.logits_of`` picks the logits as before.  GoogleNet's
+training-mode ``GoogLeNetOutputs`` would be traced into a plain tuple,
+which is why ``'script'`` is only offered where the model is in eval mode.
+"""
+
+import hashlib
+import os
+
+import torch
+
+COMPILE_MODES = ('eager', 'compile', 'script')
+CACHE_DIR = os.path.join(os.environ.get('DEEPMODELS_CACHE', os.path.expanduser('~/.cache/deepmodels')), 'compile')
+
+
+def enable_compile_cache(cache_dir=CACHE_DIR):
+    """Persist inductor's compiled graphs in ``cache_dir`` (unless the environment already picks a place)."""
+    os.environ.setdefault('TORCHINDUCTOR_CACHE_DIR', os.path.join(cache_dir, 'inductor'))
+    os.environ.setdefault('TORCHINDUCTOR_FX_GRAPH_CACHE', '1')
+    import torch._inductor.config as inductor_config
+    inductor_config.fx_graph_cache = True
+
+
+def _structure(model):
+    """The module tree plus the plain settings of every module (``probas``, ``aux_logits``, ...).
+
+    Parameter shapes alone do not tell apart builds that only differ in
+    their pooling (``head='avg'`` / ``'max'``), their layer order
+    (``bn_before_relu``) or what ``forward`` returns (``probas``).
+    """
+    settings = [f'{name}.{key}={value!r}' for name, module in model.named_modules()
+                for key, value in sorted(vars(module).items())
+                if not key.startswith('_') and isinstance(value, (bool, int, float, str, type(None)))]
+    return '\n'.join([repr(model)] + settings)
+
+
+def _script_key(model, example):
+    parts = [type(model).__name__, torch.__version__, str(tuple(example.shape)), str(example.dtype),
+             str(example.is_contiguous(memory_format=torch.channels_last)),
+             hashlib.sha1(_structure(model).encode()).hexdigest()]
+    parts += [f'{name}:{tuple(value.shape)}' for name, value in model.state_dict().items()]
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()[:16]
+
+
+def script_model(model, example, cache_dir=CACHE_DIR):
+    """TorchScript trace of ``model`` (in eval mode) on ``example``, loaded from the cache when possible."""
+    model.eval()
+    path = os.path.join(cache_dir, 'script', f'{_script_key(model, example)}.pt')
+    if os.path.exists(path):
+        scripted = torch.jit.load(path, map_location=example.device)
+        scripted.load_state_dict(model.state_dict())
+        return scripted.eval()
+    with torch.no_grad():
+        scripted = torch.jit.trace(model, example)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.tmp-{os.getpid()}'
+    torch.jit.save(scripted, tmp)
+    os.replace(tmp, path)
+    return scripted.eval()
+
+
+def compile_model(model, mode='compile', example=None, cache_dir=CACHE_DIR):
+    """Return ``model`` in compiled ``mode``, see the module docstring.  ``'script'`` needs ``example``."""
+    if mode not in COMPILE_MODES:
+        raise ValueError(f'mode must be one of {COMPILE_MODES}, got {mode!r}')
+    if mode == 'compile':
+        enable_compile_cache(cache_dir)
+        return torch.compile(model)
+    if mode == 'script':
+        if example is None:
+            raise ValueError("mode 'script' needs an example input to trace")
+        return script_model(model, example, cache_dir)
+    return model
@@ -0,0 +1,69 @@
+"""Datasets known to the CLI and how to load them.
+
+Nothing is downloaded until ``load_datasets`` is called.
+"""
+
+from torchvision import datasets
+
+from .augment import BatchAugment
+from .cache import cached_dataset, split_dataset
+from .loaders import ResumableSampler, make_loader
+from .shards import ShardDataset, make_shard_loader
+
+DATASETS = {
+    'cifar10': {
+        'cls': datasets.CIFAR10,
+        'in_channels': 3,
+        'image_size': 32,
+        'split': [45000, 5000],
+        'classes': ['airplane', 'automobile', 'bird', 'cat', 'deer', 'dog', 'frog', 'horse', 'ship', 'truck'],
+    },
+    'mnist': {
+        'cls': datasets.MNIST,
+        'in_channels': 1,
+        'image_size': 28,
+        'split': [50000, 10000],
+        'classes': ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9'],
+    },
+}
+
+
+def load_datasets(name, root='data', download=True, seed=0, size=None):
+    """Return ``(train_set, val_set, test_ds)`` as uint8 datasets, resized to ``size`` once (default: native).
+
+    A resized cache (``cache.py``) is built on first use, so e.g. the 224x224
+    presets do not upsample every batch of every epoch; ``BatchAugment``
+    then finds the images at its target size and only rotates / normalizes.
+    The validation split depends only on ``seed`` and is stored on disk, see ``cache.split_dataset``.
+    """
+    info = DATASETS[name]
+    size = None if size == info['image_size'] else size
+    train_ds = cached_dataset(info['cls'], root=root, train=True, size=size, raw=True, download=download)
+    train_set, val_set = split_dataset(train_ds, info['split'], name, root=root, seed=seed)
+    test_ds = cached_dataset(info['cls'], root=root, train=False, size=size, raw=True, download=download)
+    return train_set, val_set, test_ds
+
+
+def make_loaders(train_set, val_set, test_ds, batch_size, seed=0, num_workers=None):
+    """Train / validation / test loaders; ``num_workers`` fixes the worker count instead of autotuning it."""
+    kwargs = {} if num_workers is None else {'num_workers': num_workers}
+    train_loader = make_loader(train_set, batch_size=batch_size, sampler=ResumableSampler(train_set, seed), **kwargs)
+    val_loader = make_loader(val_set, batch_size=batch_size, shuffle=False, **kwargs)
+    test_loader = make_loader(test_ds, batch_size=batch_size, shuffle=False, **kwargs)
+    return train_loader, val_loader, test_loader
+
+
+def make_shard_loaders(train_dir, val_dir, test_dir, batch_size, seed=0, shuffle_buffer=10000, num_workers=0):
+    """The loaders of ``make_loaders`` for shard directories (``shards.py``) instead of in-memory datasets.
+
+    Only the training shards are split between ``torch.distributed`` ranks;
+    rank 0 validates and tests on all of ``val_dir`` / ``test_dir``.
+    """
+    train_set = ShardDataset(train_dir, batch_size, shuffle_buffer=shuffle_buffer, seed=seed)
+    val_set = ShardDataset(val_dir, batch_size, shuffle=False, num_replicas=1, rank=0)
+    test_ds = ShardDataset(test_dir or val_dir, batch_size, shuffle=False, num_replicas=1, rank=0)
+    return tuple(make_shard_loader(dataset, num_workers) for dataset in (train_set, val_set, test_ds))
+
+
+def make_augment(image_size=None, degrees=0, mean=None, std=None, seed=None):
+    return BatchAugment(size=image_size, degrees=degrees, mean=mean, std=std, seed=seed)
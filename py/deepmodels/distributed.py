@@ -0,0 +1,139 @@
+"""Multi-process data-parallel training with ``DistributedDataParallel``.
+
+Start one process per worker with ``torchrun``, on one machine or several::
+
+    torchrun --nproc-per-node 8 -m deepmodels train --model resnet18 --dataset cifar10
+    torchrun --nnodes 2 --node-rank 0 --nproc-per-node 8 --master-addr host0 --master-port 29500 \\
+        -m deepmodels train --model resnet18 --dataset cifar10
+
+``torchrun`` sets ``RANK`` / ``WORLD_SIZE`` / ``LOCAL_RANK``; when they are
+absent everything here degrades to a single process.  The default backend
+is gloo, so it runs on CPU.  Every process trains on its own shard of each
+epoch (``ResumableSampler`` shards by rank) with the per-process
+``--batch-size``; DDP all-reduces the gradients in buckets of
+``bucket_cap_mb`` while backward is still running.  Logging, evaluation
+and checkpoint writes happen on rank 0 only.  Work that writes shared
+files (downloads, dataset caches, the stored split, loader tuning) runs
+inside ``rank_zero_first``, so the other processes only read it.
+"""
+
+import os
+from contextlib import contextmanager
+
+import torch
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
+
+
+def is_distributed():
+    return dist.is_available() and dist.is_initialized()
+
+
+def get_rank():
+    return dist.get_rank() if is_distributed() else 0
+
+
+def get_world_size():
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def is_main_process():
+    return get_rank() == 0
+
+
+def get_local_rank():
+    return int(os.environ.get('LOCAL_RANK', 0)) if is_distributed() else 0
+
+
+def get_local_world_size():
+    """The number of processes on this machine."""
+    return int(os.environ.get('LOCAL_WORLD_SIZE', get_world_size())) if is_distributed() else 1
+
+
+def init_distributed(backend='gloo', threads=None):
+    """Join the process group described by the ``torchrun`` environment, if there is one.
+
+    Returns the device this process should train on.  ``torchrun`` limits
+    every process to one thread unless told otherwise; by default the cores
+    of the machine are split evenly between its local processes instead.
+    """
+    if int(os.environ.get('WORLD_SIZE', 1)) <= 1:
+        return None
+    dist.init_process_group(backend)
+    local_rank = get_local_rank()
+    torch.set_num_threads(threads or max(1, (os.cpu_count() or 1) // get_local_world_size()))
+    if backend == 'nccl':
+        torch.cuda.set_device(local_rank)
+        return torch.device('cuda', local_rank)
+    return torch.device('cpu')
+
+
+def wrap_model(model, device, bucket_cap_mb=25, find_unused_parameters=False):
+    """Wrap ``model`` (already on ``device``) in DDP when running distributed."""
+    if not is_distributed():
+        return model
+    device_ids = [device.index] if device.type == 'cuda' else None
+    return DistributedDataParallel(model, device_ids=device_ids, bucket_cap_mb=bucket_cap_mb,
+                                   find_unused_parameters=find_unused_parameters)
+
+
+def unwrap_model(model):
+    """The model inside DDP and ``torch.compile`` wrappers, whose ``state_dict`` has the plain keys."""
+    while True:
+        if isinstance(model, DistributedDataParallel):
+            model = model.module
+        elif hasattr(model, '_orig_mod'):
+            model = model._orig_mod
+        else:
+            return model
+
+
+def all_reduce_sum(tensor):
+    """Sum ``tensor`` over all processes, in place."""
+    if is_distributed():
+        dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor
+
+
+def broadcast_value(value, src=0):
+    """Send a picklable ``value`` from rank ``src`` to every process."""
+    if not is_distributed():
+        return value
+    holder = [value]
+    dist.broadcast_object_list(holder, src=src)
+    return holder[0]
+
+
+def all_gather_value(value):
+    """Collect a picklable ``value`` from every process, as a list indexed by rank."""
+    if not is_distributed():
+        return [value]
+    values = [None] * get_world_size()
+    dist.all_gather_object(values, value)
+    return values
+
+
+def barrier():
+    if is_distributed():
+        dist.barrier()
+
+
+@contextmanager
+def rank_zero_first():
+    """Run the block on rank 0 first, then on local rank 0 of the other machines, then on the rest.
+
+    Whatever the block downloads, builds or tunes is on disk before a
+    process that would race for the same files gets there; those only read
+    it.  Every process passes two barriers, so all of them have to enter.
+    """
+    turn = 0 if is_main_process() else 1 if get_local_rank() == 0 else 2
+    for _ in range(turn):
+        barrier()
+    yield
+    for _ in range(turn, 2):
+        barrier()
+
+
+def cleanup():
+    if is_distributed():
+        dist.destroy_process_group()
@@ -0,0 +1,360 @@
+"""Training and evaluation loop shared by every model and dataset."""
+
+import itertools
+import math
+import os
+import time
+
+import torch
+from torch.utils.data import IterableDataset
+from tqdm.autonotebook import tqdm
+
+from .checkpoint import (cpu_snapshot, process_rng_state, restore_training_state, rng_state, set_rng_state,
+                         training_state)
+from .distributed import (all_gather_value, all_reduce_sum, broadcast_value, is_distributed, is_main_process,
+                          unwrap_model)
+from .loaders import prefetch_to_device
+from .models import GoogLeNetOutputs
+from .precision import autocast, grad_scaler
+from .schedule import current_lr, steps_per_batch
+
+
+def init_weights(m):
+    if isinstance(m, torch.nn.Conv2d) or isinstance(m, torch.nn.Linear):
+        torch.nn.init.kaiming_uniform_(m.weight, mode='fan_in', nonlinearity='relu')
+        if m.bias is not None:
+            m.bias.detach().zero_()
+
+
+def logits_of(output):
+    """VGG built with ``probas=True`` returns ``(logits, probas)``, the rest return logits."""
+    return output[0] if isinstance(output, tuple) else output
+
+
+def criterion(output, targets, aux_weights=(0.3, 0.3)):
+    """Cross entropy of the logits, plus the weighted auxiliary losses when GoogleNet returns them."""
+    loss = torch.nn.functional.cross_entropy(logits_of(output), targets)
+    if isinstance(output, GoogLeNetOutputs):
+        for weight, aux in zip(aux_weights, (output.aux1, output.aux2)):
+            if weight:
+                loss = loss + weight * torch.nn.functional.cross_entropy(aux, targets)
+    return loss
+
+
+def accuracy(model, data_loader, device, augment=None, precision='fp32'):
+    with torch.inference_mode():
+        correct_predictions, counter = 0, 0
+        for img, label in prefetch_to_device(data_loader, device):
+            if augment is not None:
+                img = augment(img)
+            with autocast(device, precision):
+                logits = logits_of(model(img))
+            _, predicted_label = torch.max(logits, 1)
+            counter += label.size(0)
+            correct_predictions += (predicted_label == label).sum()
+    return correct_predictions.float()/counter * 100
+
+
+def _running_totals(correct, loss_sum, seen, device):
+    """Running accuracy / loss sums of the epoch so far, summed over all processes."""
+    return {'correct': all_reduce_sum(correct.clone()), 'loss_sum': all_reduce_sum(loss_sum.clone()),
+            'seen': int(all_reduce_sum(torch.tensor(seen, device=device)).item())}
+
+
+def train(model, num_epochs, train_loader, valid_loader, test_loader, optimizer, device, augment=None,
+          eval_train=False, precision='fp32', aux_weights=(0.3, 0.3), checkpoints=None, checkpoint_every=0,
+          resume=None, scheduler=None, early_stopping=None, validate_every=1, validate_every_steps=0,
+          restore_best=False, on_validate=None):
+    """Train for up to ``num_epochs`` and return a list with one metrics dict per validation.
+
+    The reported train accuracy and loss are accumulated from the logits the
+    training step already computed, on ``device`` and without a host sync
+    per batch, so they are running values over the epoch (dropout active,
+    weights changing).  ``eval_train=True`` additionally re-evaluates the
+    whole training set at the end of each validated epoch, as the original
+    scripts did.
+
+    ``precision`` selects fp32, bf16 or fp16 autocast for the training and
+    evaluation forward passes, see ``precision.py``.  ``aux_weights`` weigh
+    the GoogLeNet auxiliary classifiers in the loss.
+
+    Validation runs every ``validate_every`` epochs (and on the last one)
+    and, with ``validate_every_steps``, every that many batches within an
+    epoch.  A ``scheduler`` from ``schedule.make_scheduler`` is stepped per
+    batch (one-cycle) or on every validation accuracy (plateau);
+    ``early_stopping`` ends the run when validation accuracy plateaus.  The
+    best validated weights are written to ``best.pt`` when checkpointing
+    and, with ``restore_best``, loaded back before the test evaluation.
+    ``on_validate(history)`` is called on rank 0 after every validation,
+    e.g. to report progress to a sweep (``sweep.py``).
+
+    With a ``CheckpointManager`` as ``checkpoints`` a checkpoint is written
+    after every epoch and, if ``checkpoint_every`` is set, every that many
+    batches.  ``resume`` takes a loaded checkpoint and continues from the
+    batch it was taken at; the order of the remaining batches is only
+    reproduced exactly when ``train_loader`` uses a ``ResumableSampler`` or a
+    ``shards.ShardDataset``.
+
+    ``model`` may be wrapped in ``DistributedDataParallel`` (see
+    ``distributed.py``); the running metrics are then summed over all
+    processes and only rank 0 prints, evaluates and writes checkpoints.
+    It may also be compiled (``compiled.py``); checkpoints always hold the
+    plain model's ``state_dict``.
+    """
+    start_time = time.time()
+    history = []
+    main = is_main_process()
+    net = unwrap_model(model)
+    # rank 0 evaluates alone, a DDP forward there would wait for the other ranks
+    evaluator = net if is_distributed() else model
+    scaler = grad_scaler(device, precision)
+    per_batch_schedule = steps_per_batch(scheduler)
+    sampler = train_loader.sampler
+    batch_size = train_loader.batch_size
+    if isinstance(train_loader.dataset, IterableDataset):
+        # a streaming dataset (shards.py) batches, shuffles and keeps its position itself
+        sampler = train_loader.dataset
+        batch_size = batch_size or sampler.batch_size
+    samples = getattr(sampler, 'num_samples', len(train_loader.dataset))
+    batches_per_epoch = math.ceil(samples / batch_size)
+    start_epoch, start_batch, running, resume_rng = 0, 0, None, None
+    if resume is not None:
+        start_epoch, start_batch, running, history = restore_training_state(
+            resume, net, optimizer, scaler, sampler, scheduler, early_stopping, restore_rng=False)
+        resume_rng = process_rng_state(resume)
+        if main:
+            print(f'Resuming from epoch {start_epoch + 1}, batch {start_batch}')
+    validated = [h['valid_acc'] for h in history if h['valid_acc'] is not None]
+    best_acc = max(validated) if validated else None
+    best_state = None
+
+    def save_checkpoint(epoch, batch, running=None, name=None):
+        # every process takes part, the checkpoint keeps the RNG states of all of them
+        rng = all_gather_value(rng_state())
+        if main:
+            checkpoints.save(training_state(net, optimizer, scaler, sampler, epoch, batch, running, history,
+                                            scheduler, early_stopping, rng), name=name)
+
+    def log_prefix(epoch, batch):
+        step = f' Step: {batch:06d}/{batches_per_epoch:06d}' if batch < batches_per_epoch else ''
+        return f'Epoch: {epoch+1:03d}/{num_epochs:03d}{step} '
+
+    def validate(epoch, batch, correct, loss_sum, seen):
+        """Validate after ``batch`` batches of ``epoch``; return True when training should stop."""
+        nonlocal best_acc, best_state
+        totals = _running_totals(correct, loss_sum, seen, device)
+        train_acc = totals['correct'].item() / totals['seen'] * 100
+        train_loss = totals['loss_sum'].item() / totals['seen']
+        end_of_epoch = batch == batches_per_epoch
+        model.eval()
+        if augment is not None:
+            augment.eval()
+        valid_acc = None
+        if main:
+            if eval_train and end_of_epoch:
+                train_acc = accuracy(evaluator, train_loader, device, augment, precision).item()
+            valid_acc = accuracy(evaluator, valid_loader, device, augment, precision).item()
+            print(f'{log_prefix(epoch, batch)}'
+                  f'| Loss: {train_loss :.4f} '
+                  f'| Train: {train_acc :.2f}% '
+                  f'| Validation: {valid_acc :.2f}%')
+        train_acc, valid_acc = broadcast_value((train_acc, valid_acc))
+        history.append({'epoch': epoch + 1, 'step': epoch * batches_per_epoch + batch,
+                        'train_loss': train_loss, 'train_acc': train_acc, 'valid_acc': valid_acc,
+                        'lr': current_lr(optimizer)})
+        if on_validate is not None and main:
+            on_validate(history)
+        if scheduler is not None and not per_batch_schedule:
+            scheduler.step(valid_acc)
+        if early_stopping is not None:
+            early_stopping.step(valid_acc)
+        if best_acc is None or valid_acc > best_acc:
+            best_acc = valid_acc
+            if restore_best:
+                best_state = cpu_snapshot(net.state_dict())
+            if checkpoints is not None:
+                if end_of_epoch:
+                    save_checkpoint(epoch + 1, 0, name='best')
+                else:
+                    save_checkpoint(epoch, batch, totals, name='best')
+        model.train()
+        if augment is not None:
+            augment.train()
+        if early_stopping is not None and early_stopping.should_stop:
+            if main:
+                print(f'Stopping early: no improvement for {early_stopping.patience} validations, '
+                      f'best validation accuracy {best_acc:.2f}%')
+            return True
+        return False
+
+    stop = False
+    for epoch in range(start_epoch, num_epochs):
+        model.train()
+        if augment is not None:
+            augment.train()
+        correct = torch.zeros((), dtype=torch.long, device=device)
+        loss_sum = torch.zeros((), device=device)
+        seen = 0
+        batches = train_loader
+        if start_batch and main:
+            # the checkpoint holds the totals of all processes, rank 0 carries them on
+            correct += running['correct']
+            loss_sum += running['loss_sum']
+            seen = running['seen']
+        if hasattr(sampler, 'set_epoch'):
+            sampler.set_epoch(epoch, start=start_batch * batch_size)
+        elif start_batch:
+            batches = itertools.islice(train_loader, batches_per_epoch - start_batch)
+        if resume_rng is not None and not start_batch:
+            set_rng_state(resume_rng)
+            resume_rng = None
+        batches = iter(batches)
+        if resume_rng is not None:
+            # a mid-epoch checkpoint was taken after this epoch's loader iterator had drawn its seed
+            # from the torch RNG, so restore the RNG only once the iterator exists
+            set_rng_state(resume_rng)
+            resume_rng = None
+        for batch_idx, (features, targets) in tqdm(enumerate(batches, start_batch), total=batches_per_epoch,
+                                                   initial=start_batch, disable=not main):
+            features = features.to(device)
+            if augment is not None:
+                features = augment(features, step=epoch * batches_per_epoch + batch_idx)
+            targets = targets.to(device)
+            with autocast(device, precision):
+                output = model(features)
+                logits = logits_of(output)
+                loss = criterion(output, targets, aux_weights)
+            optimizer.zero_grad()
+            scaler.scale(loss).backward()
+            scaler.step(optimizer)
+            scaler.update()
+            if per_batch_schedule:
+                scheduler.step()
+            with torch.no_grad():
+                correct += (logits.argmax(1) == targets).sum()
+                loss_sum += loss.detach() * targets.size(0)
+            seen += targets.size(0)
+            done = batch_idx + 1
+            if done == batches_per_epoch:
+                continue
+            if validate_every_steps and (epoch * batches_per_epoch + done) % validate_every_steps == 0:
+                stop = validate(epoch, done, correct, loss_sum, seen)
+                if stop:
+                    break
+            if checkpoints is not None and checkpoint_every and done % checkpoint_every == 0:
+                running = _running_totals(correct, loss_sum, seen, device)
+                save_checkpoint(epoch, done, running)
+        if stop:
+            break
+        if hasattr(sampler, 'set_epoch'):
+            sampler.set_epoch(epoch)
+        start_batch = 0
+        if (epoch + 1) % validate_every == 0 or epoch + 1 == num_epochs:
+            stop = validate(epoch, batches_per_epoch, correct, loss_sum, seen)
+        else:
+            totals = _running_totals(correct, loss_sum, seen, device)
+            train_acc = totals['correct'].item() / totals['seen'] * 100
+            train_loss = totals['loss_sum'].item() / totals['seen']
+            history.append({'epoch': epoch + 1, 'step': (epoch + 1) * batches_per_epoch, 'train_loss': train_loss,
+                            'train_acc': train_acc, 'valid_acc': None, 'lr': current_lr(optimizer)})
+            if main:
+                print(f'{log_prefix(epoch, batches_per_epoch)}| Loss: {train_loss :.4f} | Train: {train_acc :.2f}%')
+        if checkpoints is not None:
+            save_checkpoint(epoch + 1, 0)
+        elapsed = (time.time() - start_time)/60
+        if main:
+            print(f'Time elapsed: {elapsed:.2f} min')
+        if stop:
+            break
+    if checkpoints is not None:
+        checkpoints.wait()
+    if restore_best:
+        best_path = os.path.join(checkpoints.directory, 'best.pt') if checkpoints is not None else None
+        if best_state is None and best_path and os.path.exists(best_path):
+            best_state = checkpoints.load(best_path)['model']
+        if best_state is not None:
+            net.load_state_dict(best_state)
+            if main:
+                print(f'Restored the weights with the best validation accuracy ({best_acc:.2f}%)')
+    model.eval()
+    if augment is not None:
+        augment.eval()
+    if main:
+        elapsed = (time.time() - start_time)/60
+        print(f'Total Training Time: {elapsed:.2f} min')
+        test_acc = accuracy(evaluator, test_loader, device, augment, precision)
+        print(f'Test accuracy {test_acc :.2f}%')
+    return history
+
+
+def model_device(model):
+    # quantized models keep their weights in packed params, they run on CPU
+    param = next(iter(model.parameters()), None)
+    return param.device if param is not None else torch.device('cpu')
+
+
+def get_prediction(x, model, augment=None):
+    """Predicted classes and softmax probabilities of the batch ``x``, computed on the model's device.
+
+    The model (and ``augment``) are switched to eval mode and stay where
+    they are; ``x`` is copied to them.
+    """
+    device = model_device(model)
+    model.eval()
+    if augment is not None:
+        augment.eval()
+    with torch.inference_mode():
+        x = x.to(device, non_blocking=True)
+        if augment is not None:
+            x = augment(x)
+        probabilities = torch.softmax(logits_of(model(x)).float(), dim=1)
+    return probabilities.argmax(dim=1), probabilities
+
+
+def predict(model, data_loader, augment=None, device=None, precision='fp32', with_targets=False):
+    """Predicted classes and probabilities for every sample of ``data_loader``, in loader order.
+
+    Runs in eval mode under ``inference_mode`` on ``device`` (default: the
+    model's), copying the next batch to the device while the current one
+    is computed.  Results stay on the device as ``(N,)`` and
+    ``(N, num_classes)`` tensors, written into preallocated buffers sized
+    from the sampler; a streaming dataset (``shards.py``) does not know its
+    sample count up front, its batches are concatenated at the end.
+    ``with_targets=True`` also returns the ``(N,)`` targets.
+    """
+    device = torch.device(device) if device is not None else model_device(model)
+    model.eval()
+    if augment is not None:
+        augment.eval()
+    total = None if isinstance(data_loader.dataset, IterableDataset) else len(data_loader.sampler)
+    probabilities = targets = None
+    chunks, target_chunks, filled = [], [], 0
+    with torch.inference_mode():
+        for features, labels in prefetch_to_device(data_loader, device):
+            if augment is not None:
+                features = augment(features)
+            with autocast(device, precision):
+                logits = logits_of(model(features))
+            batch = torch.softmax(logits.float(), dim=1)
+            if total is None:
+                chunks.append(batch)
+                target_chunks.append(labels)
+                continue
+            if probabilities is None:
+                probabilities = torch.empty(total, logits.size(1), device=device)
+                targets = torch.empty(total, dtype=labels.dtype, device=device)
+            end = filled + logits.size(0)
+            probabilities[filled:end] = batch
+            targets[filled:end] = labels
+            filled = end
+    if chunks:
+        probabilities, targets = torch.cat(chunks), torch.cat(target_chunks)
+    elif probabilities is None:
+        empty = torch.empty(0, dtype=torch.long, device=device)
+        return (empty, torch.empty(0, 0, device=device)) + ((empty,) if with_targets else ())
+    else:
+        probabilities, targets = probabilities[:filled], targets[:filled]
+    predictions = probabilities.argmax(dim=1)
+    if with_targets:
+        return predictions, probabilities, targets
+    return predictions, probabilities
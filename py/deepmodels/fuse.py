@@ -0,0 +1,100 @@
+"""Inference-time graph clean-up: fold BatchNorm into convolutions and drop no-ops.
+
+``optimize_for_inference`` returns an eval-mode copy of a model in which
+
+* every ``Conv2d`` directly followed by a ``BatchNorm2d`` has the running
+  statistics folded into its weight and bias, either inside an
+  ``nn.Sequential`` (VGG ``_make_layers``, the ResNet shortcuts) or as a
+  ``convN`` / ``bnN`` attribute pair (``BasicBlock``, ``Bottleneck``,
+  ``Block``, the ResNet stems), whose forward always applies ``bnN`` right
+  after ``convN``;
+* modules that do nothing at inference (1x1 stride-1 pools such as the
+  ``MaxPool2d`` in ``InceptionModule.pool_proj`` and the ``AvgPool2d`` at
+  the end of ``VGG._make_layers``, ``Dropout``) are removed.
+
+The result computes the same function up to float rounding, but its
+``state_dict`` keys differ from the original, so save the training model,
+not the optimized one.  ReLUs stay separate modules: an eager
+``ConvReLU2d`` is only a ``Sequential`` of the two and runs them one after
+the other; the Conv + ReLU fusion that does pay off is the quantized one
+(``quantize.py``).
+"""
+
+import copy
+
+import torch
+from torch import nn
+from torch.nn.modules.utils import _pair
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+
+def _is_noop(m):
+    if isinstance(m, (nn.MaxPool2d, nn.AvgPool2d)):
+        stride = m.stride if m.stride is not None else m.kernel_size
+        return (_pair(m.kernel_size) == (1, 1) and _pair(stride) == (1, 1)
+                and _pair(m.padding) == (0, 0))
+    return isinstance(m, (nn.Dropout, nn.Identity))
+
+
+def _fuse_sequence(modules):
+    modules = [m for m in modules if not _is_noop(m)]
+    fused, i = [], 0
+    while i < len(modules):
+        m = modules[i]
+        if type(m) is nn.Conv2d:
+            if i + 1 < len(modules) and isinstance(modules[i + 1], nn.BatchNorm2d):
+                m = fuse_conv_bn_eval(m, modules[i + 1])
+                i += 1
+        fused.append(m)
+        i += 1
+    return fused
+
+
+def _fold_named_pairs(module):
+    children = dict(module.named_children())
+    for name, conv in children.items():
+        if not name.startswith('conv') or type(conv) is not nn.Conv2d:
+            continue
+        bn = children.get('bn' + name[len('conv'):])
+        if isinstance(bn, nn.BatchNorm2d):
+            setattr(module, name, fuse_conv_bn_eval(conv, bn))
+            setattr(module, 'bn' + name[len('conv'):], nn.Identity())
+
+
+def _optimize(module):
+    for name, child in list(module.named_children()):
+        _optimize(child)
+        if type(child) is nn.Sequential:
+            fused = _fuse_sequence(list(child))
+            if not fused:
+                child = nn.Identity()
+            elif len(fused) == 1:
+                child = fused[0]
+            else:
+                child = nn.Sequential(*fused)
+            setattr(module, name, child)
+        elif _is_noop(child):
+            setattr(module, name, nn.Identity())
+    _fold_named_pairs(module)
+
+
+def optimize_for_inference(model, example_input=None, rtol=1e-3, atol=1e-4):
+    """Return a BN-folded eval-mode copy of ``model`` without no-op modules.
+
+    When ``example_input`` is given the optimized model is run on it next
+    to the original and a ``RuntimeError`` is raised if the logits differ
+    by more than the tolerances.
+    """
+    from .engine import logits_of
+
+    model.eval()
+    optimized = copy.deepcopy(model)
+    _optimize(optimized)
+    if example_input is not None:
+        with torch.no_grad():
+            expected = logits_of(model(example_input))
+            actual = logits_of(optimized(example_input))
+        if not torch.allclose(expected, actual, rtol=rtol, atol=atol):
+            diff = (expected - actual).abs().max().item()
+            raise RuntimeError(f'optimized model differs from the original (max abs diff {diff:.3g})')
+    return optimized
@@ -0,0 +1,79 @@
+"""channels_last (NHWC) execution for the models and their input batches.
+
+oneDNN convolutions on CPU are considerably faster on NHWC data.
+``to_channels_last`` converts the parameters of a model (or the
+``BatchAugment`` in front of it) and switches on its ``channels_last``
+mode, after which every activation stays NHWC end to end: convolutions,
+BatchNorm, pooling and the ``torch.cat`` of the inception branches keep the
+format of their inputs, and the classifiers run on the feature map through
+``models.classify_map`` instead of flattening it, which would need a copy
+back to NCHW.  The ResNets pool down to 1x1 before their ``view``, which
+is a view in either format.  ``state_dict`` is unchanged, so weights load
+into either layout.
+"""
+
+import copy
+
+import torch
+
+from .timing import median, time_fn
+
+
+def to_channels_last(module):
+    """Convert ``module`` to channels_last in place and return it."""
+    module.to(memory_format=torch.channels_last)
+    for m in module.modules():
+        if hasattr(m, 'channels_last'):
+            m.channels_last = True
+    return module
+
+
+def _step_time(model, features, targets, device, iters, train):
+    from .engine import criterion, logits_of
+
+    if not train:
+        model.eval()
+
+        def step():
+            with torch.no_grad():
+                logits_of(model(features))
+        return median(time_fn(step, device, iters=iters))
+
+    model.train()
+    optimizer = torch.optim.SGD(model.parameters(), lr=1e-3)
+
+    def step():
+        optimizer.zero_grad()
+        criterion(model(features), targets).backward()
+        optimizer.step()
+    return median(time_fn(step, device, warmup=1, iters=iters))
+
+
+def channels_last_report(models, batch_size, num_classes=10, device='cpu', iters=10):
+    """Inference and training step time in NCHW and NHWC for each ``{name: (model, (C, H, W))}``."""
+    from .engine import logits_of
+
+    device = torch.device(device)
+    rows = []
+    for name, (model, shape) in models.items():
+        nchw = model.to(device)
+        nhwc = to_channels_last(copy.deepcopy(model))
+        features = torch.rand(batch_size, *shape, device=device)
+        targets = torch.randint(num_classes, (batch_size,), device=device)
+        nchw.eval()
+        nhwc.eval()
+        with torch.no_grad():
+            max_diff = (logits_of(nchw(features)) - logits_of(nhwc(features))).abs().max().item()
+        features_cl = features.contiguous(memory_format=torch.channels_last)
+        for mode in ('inference', 'train'):
+            before = _step_time(nchw, features, targets, device, iters, mode == 'train')
+            after = _step_time(nhwc, features_cl, targets, device, iters, mode == 'train')
+            rows.append({'model': name, 'mode': mode, 'nchw_ms': before * 1000, 'nhwc_ms': after * 1000,
+                         'speedup': before / after, 'max_abs_diff': max_diff})
+
+    print(f'batch {batch_size} on {device}')
+    print(f'{"model":>18} | {"mode":>9} | {"NCHW ms":>8} | {"NHWC ms":>8} | speedup | max |diff|')
+    for row in rows:
+        print(f'{row["model"]:>18} | {row["mode"]:>9} | {row["nchw_ms"]:8.1f} | {row["nhwc_ms"]:8.1f} '
+              f'| {row["speedup"]:6.2f}x | {row["max_abs_diff"]:.1e}')
+    return rows
@@ -0,0 +1,219 @@
+"""DataLoader factory with worker / prefetch auto-tuning.
+
+``make_loader`` is a drop-in for ``DataLoader(dataset=..., batch_size=...,
+shuffle=...)``.  The first time a dataset is seen on a machine it times a
+few ``num_workers`` / ``prefetch_factor`` settings over a handful of
+batches, keeps the fastest and remembers it in a small JSON file keyed by
+the dataset, its transform, the batch size and the number of processes.
+Later runs read the choice back without benchmarking again.  Under
+``torchrun`` the candidates stop at this process's share of the cores, as
+every process on the machine starts that many workers.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import torch
+from torch.utils.data import DataLoader, Sampler, Subset
+
+TUNING_FILE = os.path.join(os.environ.get('DEEPMODELS_CACHE', os.path.expanduser('~/.cache/deepmodels')),
+                           'loader_tuning.json')
+
+
+class ResumableSampler(Sampler):
+    """Shuffling sampler whose order depends only on ``seed`` and the epoch.
+
+    ``set_epoch(epoch, start)`` selects the permutation of ``epoch`` and
+    skips its first ``start`` indices, so a run restored from a mid-epoch
+    checkpoint sees exactly the samples it had not reached yet.
+
+    Under ``torch.distributed`` each of the ``num_replicas`` processes
+    (default: the world size) takes every ``num_replicas``-th index of the
+    shared permutation, padded so all shards have the same length, the way
+    ``DistributedSampler`` does.
+    """
+
+    def __init__(self, data_source, seed=0, num_replicas=None, rank=None):
+        from .distributed import get_rank, get_world_size
+
+        self.data_source = data_source
+        self.seed = seed
+        self.num_replicas = num_replicas if num_replicas is not None else get_world_size()
+        self.rank = rank if rank is not None else get_rank()
+        self.num_samples = -(-len(data_source) // self.num_replicas)
+        self.epoch = 0
+        self.start = 0
+
+    def set_epoch(self, epoch, start=0):
+        self.epoch = epoch
+        self.start = start
+
+    def __iter__(self):
+        generator = torch.Generator()
+        generator.manual_seed(self.seed + self.epoch)
+        order = torch.randperm(len(self.data_source), generator=generator).tolist()
+        total = self.num_samples * self.num_replicas
+        order += order[:total - len(order)]
+        return iter(order[self.rank:total:self.num_replicas][self.start:])
+
+    def __len__(self):
+        return self.num_samples - self.start
+
+    def state_dict(self):
+        return {'seed': self.seed, 'epoch': self.epoch}
+
+    def load_state_dict(self, state):
+        self.seed = state['seed']
+        self.epoch = state['epoch']
+
+
+def _base_dataset(dataset):
+    while isinstance(dataset, Subset):
+        dataset = dataset.dataset
+    return dataset
+
+
+def loader_signature(dataset, batch_size):
+    """Key identifying a dataset / transform / batch size / process count combination on this machine."""
+    from .distributed import get_local_world_size, get_world_size
+
+    base = _base_dataset(dataset)
+    parts = [type(base).__name__, getattr(base, 'path', getattr(base, 'root', '')),
+             repr(getattr(base, 'transform', None)), str(len(dataset)), str(batch_size),
+             str(os.cpu_count()), str(get_world_size()), str(get_local_world_size())]
+    return hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest()[:16]
+
+
+def candidate_settings(max_workers=None):
+    max_workers = max_workers or os.cpu_count() or 1
+    workers = sorted({0, 2, 4, max_workers // 2, max_workers} & set(range(max_workers + 1)))
+    settings = [{'num_workers': 0, 'prefetch_factor': None}]
+    for num_workers in workers:
+        if num_workers == 0:
+            continue
+        for prefetch_factor in (2, 4):
+            settings.append({'num_workers': num_workers, 'prefetch_factor': prefetch_factor})
+    return settings
+
+
+def _load_tuning():
+    try:
+        with open(TUNING_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_tuning(key, setting):
+    tuning = _load_tuning()
+    tuning[key] = setting
+    os.makedirs(os.path.dirname(TUNING_FILE), exist_ok=True)
+    tmp = f'{TUNING_FILE}.tmp-{os.getpid()}'
+    with open(tmp, 'w') as f:
+        json.dump(tuning, f, indent=1)
+    os.replace(tmp, TUNING_FILE)
+
+
+def _loader_kwargs(setting, pin_memory, persistent):
+    kwargs = {'num_workers': setting['num_workers'], 'pin_memory': pin_memory}
+    if setting['num_workers'] > 0:
+        kwargs['prefetch_factor'] = setting['prefetch_factor']
+        kwargs['persistent_workers'] = persistent
+    return kwargs
+
+
+def time_setting(dataset, batch_size, setting, num_batches=20, pin_memory=False):
+    """Seconds per batch for ``setting``, not counting worker start-up."""
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=True,
+                        **_loader_kwargs(setting, pin_memory, persistent=False))
+    num_batches = min(num_batches, len(loader) - 1)
+    it = iter(loader)
+    next(it)
+    start = time.perf_counter()
+    for _ in range(num_batches):
+        next(it)
+    elapsed = time.perf_counter() - start
+    del it
+    return elapsed / max(num_batches, 1)
+
+
+def workers_per_process():
+    """This process's share of the cores when ``torchrun`` started several on the machine."""
+    from .distributed import get_local_world_size
+
+    return max(1, (os.cpu_count() or 1) // get_local_world_size())
+
+
+def autotune(dataset, batch_size, num_batches=20, pin_memory=False, verbose=True, max_workers=None):
+    """Time every candidate setting with up to ``max_workers`` (default: this process's cores), return the fastest."""
+    best, best_time = None, float('inf')
+    for setting in candidate_settings(max_workers or workers_per_process()):
+        seconds = time_setting(dataset, batch_size, setting, num_batches, pin_memory)
+        if verbose:
+            print(f'loader autotune: workers={setting["num_workers"]} '
+                  f'prefetch={setting["prefetch_factor"]} {seconds * 1000:.1f} ms/batch')
+        if seconds < best_time:
+            best, best_time = setting, seconds
+    return best
+
+
+def make_loader(dataset, batch_size, shuffle=False, tune=True, **kwargs):
+    """Build a ``DataLoader`` with tuned ``num_workers`` / ``prefetch_factor``.
+
+    Workers are persistent and memory is pinned when CUDA is available.
+    Explicit keyword arguments win over the tuned values, ``tune=False``
+    skips tuning and loads in the main process as before.
+    """
+    pin_memory = kwargs.pop('pin_memory', torch.cuda.is_available())
+    setting = {'num_workers': 0, 'prefetch_factor': None}
+    if tune and 'num_workers' not in kwargs:
+        key = loader_signature(dataset, batch_size)
+        tuning = _load_tuning()
+        if key in tuning:
+            setting = tuning[key]
+        else:
+            setting = autotune(dataset, batch_size, pin_memory=pin_memory)
+            _save_tuning(key, setting)
+    loader_kwargs = _loader_kwargs(setting, pin_memory, persistent=True)
+    loader_kwargs.update(kwargs)
+    if loader_kwargs.get('num_workers', 0) == 0:
+        loader_kwargs.pop('prefetch_factor', None)
+        loader_kwargs.pop('persistent_workers', None)
+    return DataLoader(dataset=dataset, batch_size=batch_size, shuffle=shuffle, **loader_kwargs)
+
+
+def prefetch_to_device(batches, device):
+    """Yield the tensors of each batch on ``device``, copying batch ``i + 1`` while batch ``i`` is in use.
+
+    On CUDA the copies are issued with ``non_blocking=True`` on a side
+    stream, which overlaps them with compute when the loader pins memory
+    (``make_loader`` does).  On CPU this is a plain ``.to(device)``.
+    """
+    device = torch.device(device)
+    if device.type != 'cuda':
+        for batch in batches:
+            yield tuple(t.to(device) for t in batch)
+        return
+
+    stream = torch.cuda.Stream(device)
+
+    def load(batch):
+        with torch.cuda.stream(stream):
+            return tuple(t.to(device, non_blocking=True) for t in batch)
+
+    it = iter(batches)
+    try:
+        upcoming = load(next(it))
+    except StopIteration:
+        return
+    while upcoming is not None:
+        torch.cuda.current_stream(device).wait_stream(stream)
+        current = upcoming
+        for t in current:
+            # the side stream allocated it, keep it alive until the compute stream is done with it
+            t.record_stream(torch.cuda.current_stream(device))
+        batch = next(it, None)
+        upcoming = load(batch) if batch is not None else None
+        yield current
@@ -0,0 +1,98 @@
+"""Streaming classification metrics kept on the device.
+
+``ClassificationMetrics`` replaces collecting ``true_y`` / ``pred_y`` as
+Python lists of 0-d tensors for sklearn: every batch adds its predictions
+to a ``(C, C)`` confusion matrix with one ``bincount`` and counts the top-k
+hits, both on the device the logits live on.  Precision, recall, F1,
+accuracy and top-k accuracy are derived from those counts; nothing is
+copied to the host until ``compute`` / ``report`` is called.
+"""
+
+import torch
+
+from .engine import logits_of, predict
+
+
+class ClassificationMetrics:
+    """Confusion matrix (rows: true class, columns: predicted) and top-k hit counts."""
+
+    def __init__(self, num_classes, topk=(1, 5), device='cpu'):
+        self.num_classes = num_classes
+        self.topk = tuple(k for k in topk if k <= num_classes)
+        self.matrix = torch.zeros(num_classes, num_classes, dtype=torch.long, device=device)
+        self.topk_correct = torch.zeros(len(self.topk), dtype=torch.long, device=device)
+
+    def update(self, logits, targets):
+        logits = logits_of(logits)
+        targets = targets.to(logits.device)
+        if self.matrix.device != logits.device:
+            self.matrix = self.matrix.to(logits.device)
+            self.topk_correct = self.topk_correct.to(logits.device)
+        predicted = logits.argmax(1)
+        self.matrix += torch.bincount(targets * self.num_classes + predicted,
+                                      minlength=self.num_classes ** 2).view(self.num_classes, self.num_classes)
+        if self.topk:
+            # hit within the first k predictions <=> cumulative hit count at column k - 1
+            hits = (logits.topk(max(self.topk), dim=1).indices == targets[:, None]).cumsum(1)
+            self.topk_correct += hits[:, [k - 1 for k in self.topk]].sum(0)
+
+    def compute(self):
+        """Per-class and averaged metrics as CPU tensors / floats."""
+        matrix = self.matrix.double()
+        tp = matrix.diag()
+        support = matrix.sum(1)
+        predicted = matrix.sum(0)
+        total = support.sum()
+        precision = tp / predicted.clamp(min=1)
+        recall = tp / support.clamp(min=1)
+        f1 = torch.where(precision + recall > 0, 2 * precision * recall / (precision + recall),
+                         torch.zeros_like(precision))
+        weights = support / total.clamp(min=1)
+        per_class = torch.stack([precision, recall, f1, support]).cpu()
+        summary = torch.stack([
+            tp.sum() / total.clamp(min=1),
+            precision.mean(), recall.mean(), f1.mean(),
+            (precision * weights).sum(), (recall * weights).sum(), (f1 * weights).sum(),
+            total,
+        ]).cpu().tolist()
+        topk = (self.topk_correct.double() / total.clamp(min=1)).cpu().tolist()
+        return {
+            'precision': per_class[0],
+            'recall': per_class[1],
+            'f1': per_class[2],
+            'support': per_class[3].long(),
+            'accuracy': summary[0],
+            'macro_avg': {'precision': summary[1], 'recall': summary[2], 'f1': summary[3]},
+            'weighted_avg': {'precision': summary[4], 'recall': summary[5], 'f1': summary[6]},
+            'total': int(summary[7]),
+            'topk_accuracy': dict(zip(self.topk, topk)),
+        }
+
+    def report(self, classes=None, digits=3):
+        """Text table in the layout of sklearn's ``classification_report``, plus the top-k accuracies."""
+        m = self.compute()
+        classes = [str(c) for c in (classes or range(self.num_classes))]
+        width = max(len(c) for c in classes + ['weighted avg'])
+        lines = [f'{"":>{width}} {"precision":>9} {"recall":>9} {"f1-score":>9} {"support":>9}', '']
+        for i, name in enumerate(classes):
+            lines.append(f'{name:>{width}} {m["precision"][i]:9.{digits}f} {m["recall"][i]:9.{digits}f} '
+                         f'{m["f1"][i]:9.{digits}f} {int(m["support"][i]):9d}')
+        lines.append('')
+        lines.append(f'{"accuracy":>{width}} {"":>9} {"":>9} {m["accuracy"]:9.{digits}f} {m["total"]:9d}')
+        for name, key in (('macro avg', 'macro_avg'), ('weighted avg', 'weighted_avg')):
+            avg = m[key]
+            lines.append(f'{name:>{width}} {avg["precision"]:9.{digits}f} {avg["recall"]:9.{digits}f} '
+                         f'{avg["f1"]:9.{digits}f} {m["total"]:9d}')
+        for k, value in m['topk_accuracy'].items():
+            lines.append(f'{f"top-{k} acc":>{width}} {"":>9} {"":>9} {value:9.{digits}f} {m["total"]:9d}')
+        return '\n'.join(lines)
+
+
+def evaluate(model, data_loader, device, num_classes, augment=None, precision='fp32', topk=(1, 5)):
+    """Run ``model`` over ``data_loader`` (``engine.predict``) and return the filled ``ClassificationMetrics``."""
+    metrics = ClassificationMetrics(num_classes, topk, device)
+    _, probabilities, targets = predict(model, data_loader, augment, device, precision, with_targets=True)
+    # softmax keeps the order of the logits, so argmax and top-k are the same on the probabilities
+    with torch.inference_mode():
+        metrics.update(probabilities, targets)
+    return metrics
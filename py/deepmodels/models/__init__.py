@@ -0,0 +1,79 @@
+"""Model registry.
+
+Every architecture registers a builder ``fn(num_classes, in_channels,
+image_size, **kwargs)`` under a short name; ``build_model('resnet18')``
+looks it up.  Importing this package only defines classes, it does not
+touch data or start training.
+
+VGG and GoogLeNet take a ``head``: ``'flatten'`` is the classifier of the
+original scripts (flatten the last feature map into an ``nn.Linear``),
+``'avg'`` / ``'max'`` pool the map to 1x1 first, so the classifier only
+sees the channels and does not depend on the input size.  The registry
+builders default to ``'avg'``.
+"""
+
+import inspect
+
+import torch.nn.functional as F
+from torch import nn
+
+MODELS = {}
+
+HEADS = ('flatten', 'avg', 'max')
+
+
+def register(name):
+    def decorator(builder):
+        MODELS[name] = builder
+        return builder
+    return decorator
+
+
+def build_model(name, num_classes=10, in_channels=3, image_size=None, **kwargs):
+    if name not in MODELS:
+        raise KeyError(f'unknown model {name!r}, choose from {", ".join(sorted(MODELS))}')
+    return MODELS[name](num_classes=num_classes, in_channels=in_channels, image_size=image_size, **kwargs)
+
+
+def takes_argument(name, argument):
+    """Whether the builder of model ``name`` has a keyword argument ``argument``."""
+    parameters = inspect.signature(MODELS[name]).parameters.values()
+    return any(p.name == argument or p.kind is p.VAR_KEYWORD for p in parameters)
+
+
+def global_pool(head):
+    """The pooling between the feature extractor and the classifier for ``head``."""
+    if head not in HEADS:
+        raise ValueError(f'head must be one of {HEADS}, got {head!r}')
+    if head == 'avg':
+        return nn.AdaptiveAvgPool2d(1)
+    if head == 'max':
+        return nn.AdaptiveMaxPool2d(1)
+    return nn.Identity()
+
+
+def classify_map(classifier, x):
+    """``classifier(x.flatten(1))`` for a ``(N, C, H, W)`` feature map, without the flatten.
+
+    Used by the models' ``channels_last`` mode: flattening a channels_last
+    map in NCHW order would copy it, so the first ``nn.Linear`` runs as a
+    convolution whose kernel covers the whole map (its weight viewed as
+    ``(out, C, H, W)``) and yields ``(N, out, 1, 1)``, which flattens as a
+    view.  Same parameters and result as the flatten + Linear.  Layers in
+    front of the Linear (dropout) are applied to the map.
+    """
+    layers = classifier if isinstance(classifier, nn.Sequential) else [classifier]
+    flat = False
+    for layer in layers:
+        if isinstance(layer, nn.Linear) and not flat:
+            weight = layer.weight.view(layer.out_features, *x.shape[1:])
+            x = F.conv2d(x, weight, layer.bias).flatten(1)
+            flat = True
+        else:
+            x = layer(x)
+    return x
+
+
+from .googlenet import AuxClassifier, ConvBlock, GoogleNet, GoogLeNetOutputs, InceptionModule, ReducedConvBlock  # noqa: E402,E501
+from .resnet import BasicBlock, Block, Bottleneck, ResNet, resNet  # noqa: E402
+from .vgg import VGG, cfg  # noqa: E402
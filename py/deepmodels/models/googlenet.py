@@ -0,0 +1,219 @@
+"""GoogLeNet (Inception v1) from googlenet_cifar10.py / googlenet_mnist.py."""
+
+from collections import namedtuple
+
+import torch
+from torch import nn
+
+from . import classify_map, global_pool, register
+
+# largest input side that gets the stride-1 stem instead of the ImageNet one
+NATIVE_STEM_MAX_SIZE = 64
+
+
+def _halved(size, times):
+    for _ in range(times):
+        size = (size + 1) // 2
+    return size
+
+
+class ConvBlock(nn.Module):
+    def __init__(self, in_ch, out_ch, k, s, p):
+        super(ConvBlock, self).__init__()
+        self.convolution = nn.Sequential(
+            nn.Conv2d(in_channels=in_ch,
+                      out_channels=out_ch,
+                      kernel_size=(k, k),
+                      stride=(s, s),
+                      padding=(p, p)),
+            nn.ReLU()
+        )
+
+    def forward(self, x):
+        x = self.convolution(x)
+        return x
+
+
+class ReducedConvBlock(nn.Module):
+    def __init__(self, in_ch, out_ch1,out_ch2, k, p):
+        super(ReducedConvBlock, self).__init__()
+        self.reducedConv = nn.Sequential(
+            nn.Conv2d(in_channels=in_ch,
+                      out_channels= out_ch1,
+                      kernel_size=(1,1),
+                      stride=(1,1)),
+            nn.ReLU(),
+            nn.Conv2d(in_channels= out_ch1,
+                      out_channels= out_ch2,
+                      kernel_size=(k, k),
+                      stride=(1, 1),
+                      padding=(p, p)),
+            nn.ReLU()
+        )
+
+    def forward(self, x):
+        x = self.reducedConv(x)
+        return x
+
+class InceptionModule(nn.Module):
+    def __init__(self, curr_in_fts, f_1x1, f_3x3_r, f_3x3, f_5x5_r, f_5x5, f_pool_proj):
+        super(InceptionModule, self).__init__()
+        self.conv1 = ConvBlock(curr_in_fts, f_1x1, 1, 1, 0)
+        self.conv2 = ReducedConvBlock(curr_in_fts, f_3x3_r, f_3x3, 3, 1)
+        self.conv3 = ReducedConvBlock(curr_in_fts, f_5x5_r, f_5x5, 5, 2)
+
+        self.pool_proj = nn.Sequential(
+            nn.MaxPool2d(kernel_size=(1, 1), stride=(1, 1)),
+            nn.Conv2d(in_channels=curr_in_fts,
+                      out_channels=f_pool_proj,
+                      kernel_size=(1, 1),
+                      stride=(1, 1)),
+            nn.ReLU()
+        )
+
+    def forward(self, input_img):
+        out1 = self.conv1(input_img)
+        out2 = self.conv2(input_img)
+        out3 = self.conv3(input_img)
+        out4 = self.pool_proj(input_img)
+
+
+        x = torch.cat([out1, out2, out3, out4], dim=1)
+
+        return x
+
+class AuxClassifier(nn.Module):
+    channels_last = False  # set by layout.to_channels_last
+
+    def __init__(self, in_fts, num_classes, size=14, head='flatten'):
+        super(AuxClassifier, self).__init__()
+        if head == 'flatten':
+            self.avgpool = nn.AvgPool2d(kernel_size=(5, 5), stride=(3, 3))
+            size = (size - 5) // 3 + 1
+        else:
+            self.avgpool = global_pool(head)
+            size = 1
+        self.conv = nn.Conv2d(in_channels=in_fts,
+                              out_channels=128,
+                              kernel_size=(1, 1),
+                              stride=(1, 1))
+        self.relu = nn.ReLU()
+        self.fc = nn.Linear(size * size * 128, 1024)
+        self.dropout = nn.Dropout(p=0.7)
+        self.classifier = nn.Linear(1024, num_classes)
+
+    def forward(self, input_img):
+        N = input_img.shape[0]
+        x = self.avgpool(input_img)
+        x = self.conv(x)
+        x = self.relu(x)
+        if self.channels_last:
+            x = classify_map(self.fc, x)
+        else:
+            x = x.reshape(N, -1)
+            x = self.fc(x)
+        x = self.dropout(x)
+        x = self.classifier(x)
+        return x
+
+# returned by GoogleNet.forward in training mode, logits first so that output[0] works everywhere
+GoogLeNetOutputs = namedtuple('GoogLeNetOutputs', ['logits', 'aux1', 'aux2'])
+
+
+class GoogleNet(nn.Module):
+    """Inception v1.
+
+    In training mode (and with ``aux_logits``) ``forward`` returns
+    ``GoogLeNetOutputs(logits, aux1, aux2)`` so the auxiliary heads can be
+    added to the loss; in eval mode the heads are skipped and only the
+    logits are returned.
+
+    ``image_size`` picks the stem: from ``NATIVE_STEM_MAX_SIZE`` down (CIFAR,
+    MNIST) the 7x7 stride-2 convolution and the two stem max pools are
+    replaced by a 3x3 stride-1 convolution, so a 28x28 image reaches the
+    inception blocks at 28x28 exactly like a 224x224 image does with the
+    ImageNet stem, without being upsampled first.  The auxiliary heads are
+    sized for the feature maps they actually get.
+
+    ``head='flatten'`` is the scripts' classifier on the 7x7-pooled map
+    (``1024 * 7 * 7`` inputs); ``'avg'`` / ``'max'`` pool the main and the
+    auxiliary heads globally, as the original Inception v1 does.
+    """
+    channels_last = False  # set by layout.to_channels_last
+
+    def __init__(self, in_fts=3, num_class=10, aux_logits=True, image_size=224, head='flatten'):
+        super(GoogleNet, self).__init__()
+        self.aux_logits = aux_logits
+        self.maxpool1 = nn.MaxPool2d(kernel_size=(3, 3), stride=(2, 2), padding=(1, 1))
+        if image_size <= NATIVE_STEM_MAX_SIZE:
+            self.conv1 = ConvBlock(in_fts, 64, 3, 1, 1)
+            self.stem_pool = nn.Identity()
+            size = image_size
+        else:
+            self.conv1 = ConvBlock(in_fts, 64, 7, 2, 3)
+            self.stem_pool = nn.MaxPool2d(kernel_size=(3, 3), stride=(2, 2), padding=(1, 1))
+            # the stride-2 convolution and the two stem pools each halve the map (rounding up)
+            size = _halved(image_size, 3)
+        self.conv2 = nn.Sequential(
+            ConvBlock(64, 64, 1, 1, 0),
+            ConvBlock(64, 192, 3, 1, 1)
+        )
+
+        self.inception_3a = InceptionModule(192, 64, 96, 128, 16, 32, 32)
+        self.inception_3b = InceptionModule(256, 128, 128, 192, 32, 96, 64)
+        self.inception_4a = InceptionModule(480, 192, 96, 208, 16, 48, 64)
+        self.inception_4b = InceptionModule(512, 160, 112, 224, 24, 64, 64)
+        self.inception_4c = InceptionModule(512, 128, 128, 256, 24, 64, 64)
+        self.inception_4d = InceptionModule(512, 112, 144, 288, 32, 64, 64)
+        self.inception_4e = InceptionModule(528, 256, 160, 320, 32, 128, 128)
+        self.inception_5a = InceptionModule(832, 256, 160, 320, 32, 128, 128)
+        self.inception_5b = InceptionModule(832, 384, 192, 384, 48, 128, 128)
+
+        size = _halved(size, 1)  # maxpool1 after inception_3b
+        self.aux_classifier1 = AuxClassifier(512, num_class, size, head)
+        self.aux_classifier2 = AuxClassifier(528, num_class, size, head)
+        if head == 'flatten':
+            self.avgpool = nn.AdaptiveAvgPool2d(output_size=(7, 7))
+            size = 7
+        else:
+            self.avgpool = global_pool(head)
+            size = 1
+        self.classifier = nn.Sequential(
+            nn.Dropout(p=0.4),
+            nn.Linear(1024 * size * size, num_class)
+        )
+
+    def forward(self, input_img):
+        N = input_img.shape[0]
+        x = self.conv1(input_img)
+        x = self.stem_pool(x)
+        x = self.conv2(x)
+        x = self.stem_pool(x)
+        x = self.inception_3a(x)
+        x = self.inception_3b(x)
+        x = self.maxpool1(x)
+        x = self.inception_4a(x)
+        aux = self.training and self.aux_logits
+        out1 = self.aux_classifier1(x) if aux else None
+        x = self.inception_4b(x)
+        x = self.inception_4c(x)
+        x = self.inception_4d(x)
+        out2 = self.aux_classifier2(x) if aux else None
+        x = self.inception_4e(x)
+        x = self.maxpool1(x)
+        x = self.inception_5a(x)
+        x = self.inception_5b(x)
+        x = self.avgpool(x)
+        if self.channels_last:
+            x = classify_map(self.classifier, x)
+        else:
+            x = x.reshape(N, -1)
+            x = self.classifier(x)
+        if aux:
+            return GoogLeNetOutputs(x, out1, out2)
+        return x
+
+
+@register('googlenet')
+def googlenet(num_classes=10, in_channels=3, image_size=224, head='avg', **kwargs):
+    return GoogleNet(in_channels, num_classes, image_size=image_size or 224, head=head, **kwargs)
@@ -0,0 +1,218 @@
+"""ResNets.
+
+``ResNet`` with ``BasicBlock`` / ``Bottleneck`` is the CIFAR-style network
+from resnet_cifar10.py (3x3 stem, no max pool).  ``resNet`` with ``Block``
+is the ImageNet-style ResNet-50 from resnet_mnist.py (7x7 stride 2 stem).
+"""
+
+import torch
+from torch import nn
+import torch.nn.functional as F
+
+from . import register
+
+
+class BasicBlock(nn.Module):
+    expansion = 1
+
+    def __init__(self, in_planes, planes, stride=1):
+        super(BasicBlock, self).__init__()
+        self.conv1 = nn.Conv2d(
+            in_planes, planes, kernel_size=3, stride=stride, padding=1, bias=False)
+        self.bn1 = nn.BatchNorm2d(planes)
+        self.conv2 = nn.Conv2d(planes, planes, kernel_size=3,
+                               stride=1, padding=1, bias=False)
+        self.bn2 = nn.BatchNorm2d(planes)
+
+        self.shortcut = nn.Sequential()
+        if stride != 1 or in_planes != self.expansion*planes:
+            self.shortcut = nn.Sequential(
+                nn.Conv2d(in_planes, self.expansion*planes,
+                          kernel_size=1, stride=stride, bias=False),
+                nn.BatchNorm2d(self.expansion*planes)
+            )
+
+    def forward(self, x):
+        out = F.relu(self.bn1(self.conv1(x)))
+        out = self.bn2(self.conv2(out))
+        out += self.shortcut(x)
+        out = F.relu(out)
+        return out
+
+
+class Bottleneck(nn.Module):
+    expansion = 4
+
+    def __init__(self, in_planes, planes, stride=1):
+        super(Bottleneck, self).__init__()
+        self.conv1 = nn.Conv2d(in_planes, planes, kernel_size=1, bias=False)
+        self.bn1 = nn.BatchNorm2d(planes)
+        self.conv2 = nn.Conv2d(planes, planes, kernel_size=3,
+                               stride=stride, padding=1, bias=False)
+        self.bn2 = nn.BatchNorm2d(planes)
+        self.conv3 = nn.Conv2d(planes, self.expansion *
+                               planes, kernel_size=1, bias=False)
+        self.bn3 = nn.BatchNorm2d(self.expansion*planes)
+
+        self.shortcut = nn.Sequential()
+        if stride != 1 or in_planes != self.expansion*planes:
+            self.shortcut = nn.Sequential(
+                nn.Conv2d(in_planes, self.expansion*planes,
+                          kernel_size=1, stride=stride, bias=False),
+                nn.BatchNorm2d(self.expansion*planes)
+            )
+
+    def forward(self, x):
+        out = F.relu(self.bn1(self.conv1(x)))
+        out = F.relu(self.bn2(self.conv2(out)))
+        out = self.bn3(self.conv3(out))
+        out += self.shortcut(x)
+        out = F.relu(out)
+        return out
+
+
+class ResNet(nn.Module):
+    def __init__(self, block, num_blocks, num_classes=10, in_channels=3):
+        super(ResNet, self).__init__()
+        self.in_planes = 64
+
+        self.conv1 = nn.Conv2d(in_channels, 64, kernel_size=3,
+                               stride=1, padding=1, bias=False)
+        self.bn1 = nn.BatchNorm2d(64)
+        self.layer1 = self._make_layer(block, 64, num_blocks[0], stride=1)
+        self.layer2 = self._make_layer(block, 128, num_blocks[1], stride=2)
+        self.layer3 = self._make_layer(block, 256, num_blocks[2], stride=2)
+        self.layer4 = self._make_layer(block, 512, num_blocks[3], stride=2)
+        self.linear = nn.Linear(512*block.expansion, num_classes)
+
+    def _make_layer(self, block, planes, num_blocks, stride):
+        strides = [stride] + [1]*(num_blocks-1)
+        layers = []
+        for stride in strides:
+            layers.append(block(self.in_planes, planes, stride))
+            self.in_planes = planes * block.expansion
+        return nn.Sequential(*layers)
+
+    def forward(self, x):
+        out = F.relu(self.bn1(self.conv1(x)))
+        out = self.layer1(out)
+        out = self.layer2(out)
+        out = self.layer3(out)
+        out = self.layer4(out)
+        # global pooling: the 4x4 map of a 32x32 input as before, any other size too
+        out = F.adaptive_avg_pool2d(out, 1)
+        out = out.view(out.size(0), -1)
+        out = self.linear(out)
+        # probas = F.softmax(out, dim=1)
+        return out
+
+
+class Block(torch.nn.Module):
+    def __init__(self, in_channels, out_channels, identity_downsample=None, stride=1):
+        super(Block, self).__init__()
+        self.expansion = 4
+        self.conv1 = torch.nn.Conv2d(in_channels, out_channels, kernel_size=1, stride=1, padding=0)
+        self.bn1 = torch.nn.BatchNorm2d(out_channels)
+        self.conv2 = torch.nn.Conv2d(out_channels, out_channels, kernel_size=3, stride=stride, padding=1)
+        self.bn2 = torch.nn.BatchNorm2d(out_channels)
+        self.conv3 = torch.nn.Conv2d(out_channels, out_channels * self.expansion, kernel_size=1, stride=1, padding=0)
+        self.bn3 = torch.nn.BatchNorm2d(out_channels * self.expansion)
+        self.relu = torch.nn.ReLU()
+        self.identity_downsample = identity_downsample
+
+    def forward(self, x):
+        identity = x
+        x = self.conv1(x)
+        x = self.bn1(x)
+        x = self.relu(x)
+        x = self.conv2(x)
+        x = self.bn2(x)
+        x = self.relu(x)
+        x = self.conv3(x)
+        x = self.bn3(x)
+
+        if self.identity_downsample is not None:
+            identity = self.identity_downsample(identity)
+
+        x += identity
+        x = self.relu(x)
+        return x
+
+
+class resNet(torch.nn.Module):
+    def __init__(self, num_classes, in_channels=1):
+        super(resNet, self).__init__()
+
+        self.in_channels = 64
+        self.expansion = 4
+        self.conv1 = torch.nn.Conv2d(in_channels, 64, kernel_size=7, stride=2, padding=3)
+        self.bn1 = torch.nn.BatchNorm2d(64)
+        self.relu = torch.nn.ReLU()
+        self.maxpool = torch.nn.MaxPool2d(kernel_size=3, stride=2, padding=1)
+
+        # ResNetLayers
+        self.layer1 = self.make_layers(num_layers=3, channels=64, stride=1)
+        self.layer2 = self.make_layers(num_layers=4, channels=128, stride=2)
+        self.layer3 = self.make_layers(num_layers=6, channels=256, stride=2)
+        self.layer4 = self.make_layers(num_layers=3, channels=512, stride=2)
+
+        self.avgpool = torch.nn.AdaptiveAvgPool2d((1, 1))
+        self.fc = torch.nn.Linear(512 * self.expansion, num_classes)
+
+    def forward(self, x):
+        x = self.conv1(x)
+        x = self.bn1(x)
+        x = self.relu(x)
+        x = self.maxpool(x)
+
+        x = self.layer1(x)
+        x = self.layer2(x)
+        x = self.layer3(x)
+        x = self.layer4(x)
+
+        x = self.avgpool(x)
+        x = x.reshape(x.shape[0], -1)
+        x = self.fc(x)
+        return x
+
+    def make_layers(self, num_layers, channels, stride):
+        layers = []
+        identity_downsample = torch.nn.Sequential(
+            torch.nn.Conv2d(self.in_channels, channels*self.expansion, kernel_size=1, stride=stride),
+            torch.nn.BatchNorm2d(channels*self.expansion)
+            )
+        layers.append(Block(self.in_channels, channels, identity_downsample, stride))
+        self.in_channels = channels * self.expansion
+        for _ in range(num_layers-1):
+            layers.append(Block(self.in_channels, channels))
+        return torch.nn.Sequential(*layers)
+
+
+@register('resnet18')
+def resnet18(num_classes=10, in_channels=3, image_size=None):
+    return ResNet(BasicBlock, [2, 2, 2, 2], num_classes, in_channels)
+
+
+@register('resnet34')
+def resnet34(num_classes=10, in_channels=3, image_size=None):
+    return ResNet(BasicBlock, [3, 4, 6, 3], num_classes, in_channels)
+
+
+@register('resnet50')
+def resnet50(num_classes=10, in_channels=3, image_size=None):
+    return ResNet(Bottleneck, [3, 4, 6, 3], num_classes, in_channels)
+
+
+@register('resnet101')
+def resnet101(num_classes=10, in_channels=3, image_size=None):
+    return ResNet(Bottleneck, [3, 4, 23, 3], num_classes, in_channels)
+
+
+@register('resnet152')
+def resnet152(num_classes=10, in_channels=3, image_size=None):
+    return ResNet(Bottleneck, [3, 8, 36, 3], num_classes, in_channels)
+
+
+@register('resnet50_imagenet')
+def resnet50_imagenet(num_classes=10, in_channels=3, image_size=None):
+    return resNet(num_classes, in_channels)
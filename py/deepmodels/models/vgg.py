@@ -0,0 +1,85 @@
+"""VGG from vgg16_cifar10.py / vgg16_mnist.py.
+
+The two scripts differed in three places, which are now arguments:
+``bn_before_relu`` (the CIFAR10 script used Conv -> ReLU -> BN), the
+classifier input size (512 at 32x32, 25088 at 224x224, now derived from
+``image_size``) and ``probas`` (the MNIST script returned ``(out, probas)``).
+"""
+
+from torch import nn
+import torch.nn.functional as F
+
+from . import classify_map, global_pool, register
+
+cfg = {
+    'VGG11': [64, 'M', 128, 'M', 256, 256, 'M', 512, 512, 'M', 512, 512, 'M'],
+    'VGG13': [64, 64, 'M', 128, 128, 'M', 256, 256, 'M', 512, 512, 'M', 512, 512, 'M'],
+    'VGG16': [64, 64, 'M', 128, 128, 'M', 256, 256, 256, 'M', 512, 512, 512, 'M', 512, 512, 512, 'M'],
+    'VGG19': [64, 64, 'M', 128, 128, 'M', 256, 256, 256, 256, 'M', 512, 512, 512, 512, 'M', 512, 512, 512, 512, 'M'],
+}
+
+
+class VGG(nn.Module):
+    channels_last = False  # set by layout.to_channels_last
+
+    def __init__(self, vgg_name, in_ch=3, num_classes=10, image_size=32, probas=False, bn_before_relu=True,
+                 head='flatten'):
+        super(VGG, self).__init__()
+        self.in_ch = in_ch  # in_ch determine if its RGB or GrayScale
+        self.probas = probas
+        self.bn_before_relu = bn_before_relu
+        self.features, size = self._make_layers(cfg[vgg_name], image_size)
+        self.pool = global_pool(head)
+        if head != 'flatten':
+            size = 1
+        self.classifier = nn.Linear(512 * size * size, num_classes)
+
+    def forward(self, x):
+        out = self.pool(self.features(x))
+        if self.channels_last:
+            out = classify_map(self.classifier, out)
+        else:
+            out = out.view(out.size(0), -1)
+            out = self.classifier(out)
+        if not self.probas:
+            return out
+        probas = F.softmax(out, dim=1)
+        return out, probas
+
+    def _make_layers(self, cfg, size):
+        """The feature extractor for ``size`` x ``size`` inputs and the side of its output map.
+
+        A max pool that would shrink the map below 1x1 is left out, so a
+        28x28 MNIST image goes through four pools (28 -> 1) instead of
+        having to be upsampled to 32 or 224 first.
+        """
+        layers = []
+        in_channels = self.in_ch
+        for x in cfg:
+            if x == 'M':
+                if size // 2 == 0:
+                    continue
+                layers += [nn.MaxPool2d(kernel_size=2, stride=2)]
+                size //= 2
+            elif self.bn_before_relu:
+                layers += [nn.Conv2d(in_channels, x, kernel_size=3, padding=1),
+                           nn.BatchNorm2d(x),
+                           nn.ReLU(inplace=True)]
+                in_channels = x
+            else:
+                layers += [nn.Conv2d(in_channels, x, kernel_size=3, padding=1),
+                           nn.ReLU(inplace=True),
+                           nn.BatchNorm2d(x)]
+                in_channels = x
+        layers += [nn.AvgPool2d(kernel_size=1, stride=1)]
+        return nn.Sequential(*layers), size
+
+
+def _vgg(vgg_name):
+    def build(num_classes=10, in_channels=3, image_size=32, head='avg', **kwargs):
+        return VGG(vgg_name, in_channels, num_classes, image_size or 32, head=head, **kwargs)
+    return build
+
+
+for _name in cfg:
+    register(_name.lower())(_vgg(_name))
@@ -0,0 +1,32 @@
+"""Plotting helpers used by the evaluation sections of the scripts."""
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+
+def plot_confusion_matrix(cm, classes, normalize=False, title='Confusion matrix', cmap=plt.cm.YlGnBu, rotation=0):
+    if hasattr(cm, 'cpu'):  # ClassificationMetrics.matrix
+        cm = cm.cpu().numpy()
+    fig, ax = plt.subplots(figsize=(16,16))
+    if normalize:
+        cm = cm.astype('float') / cm.sum(axis=1)[:, np.newaxis]
+        print("Normalized confusion matrix")
+    else:
+        print('Confusion matrix, without normalization')
+
+    print(cm)
+    plt.imshow(cm, interpolation='nearest', cmap=cmap)
+    plt.title(title)
+    plt.colorbar()
+    tick_marks = np.arange(len(classes))
+    plt.xticks(tick_marks, classes, rotation=rotation)
+    plt.yticks(tick_marks, classes)
+
+    fmt = '.2f' if normalize else 'd'
+    thresh = cm.max() / 2.
+    for (i, j), value in np.ndenumerate(cm):
+        plt.text(j, i, format(value, fmt), horizontalalignment="center", color="white" if value > thresh else "black")
+
+    plt.tight_layout()
+    plt.ylabel('True label')
+    plt.xlabel('Predicted label')
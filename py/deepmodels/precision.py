@@ -0,0 +1,77 @@
+"""Mixed precision for the shared training and evaluation paths.
+
+``precision='bf16'`` runs the forward pass under ``torch.autocast`` with
+bfloat16 (the useful mode on CPU), ``'fp16'`` uses float16 together with a
+``GradScaler`` so small gradients do not underflow.  Parameters and the
+optimizer state stay float32 in every mode; autocast only changes the dtype
+of the activations.  Before ``torch.amp.GradScaler`` (torch 2.3) the only
+scaler is CUDA's, so fp16 on CPU is refused there rather than trained
+without loss scaling.
+"""
+
+import contextlib
+
+import torch
+
+from .timing import median, time_fn
+
+PRECISIONS = {'fp32': None, 'bf16': torch.bfloat16, 'fp16': torch.float16}
+
+
+def autocast(device, precision='fp32'):
+    dtype = PRECISIONS[precision]
+    if dtype is None:
+        return contextlib.nullcontext()
+    return torch.autocast(device_type=torch.device(device).type, dtype=dtype)
+
+
+def check_precision(device, precision='fp32'):
+    """Raise ``ValueError`` if ``precision`` cannot train on ``device`` with this torch."""
+    if precision not in PRECISIONS:
+        raise ValueError(f'precision must be one of {tuple(PRECISIONS)}, got {precision!r}')
+    device_type = torch.device(device).type
+    if precision == 'fp16' and device_type != 'cuda' and not hasattr(torch.amp, 'GradScaler'):
+        raise ValueError(f'fp16 on {device_type} needs torch.amp.GradScaler (torch >= 2.3) for loss scaling, '
+                         f'torch {torch.__version__} only has the CUDA one; use bf16 instead')
+
+
+def grad_scaler(device, precision='fp32'):
+    """Loss scaler for ``precision``, a pass-through unless it is fp16."""
+    check_precision(device, precision)
+    enabled = precision == 'fp16'
+    device_type = torch.device(device).type
+    if hasattr(torch.amp, 'GradScaler'):
+        return torch.amp.GradScaler(device_type, enabled=enabled)
+    return torch.cuda.amp.GradScaler(enabled=enabled)
+
+
+def precision_report(model, data_loader, device, augment=None, precisions=('fp32', 'bf16'), iters=10):
+    """Accuracy on ``data_loader`` and forward throughput for each precision, relative to the first one."""
+    from .engine import accuracy, logits_of
+
+    model.eval()
+    if augment is not None:
+        augment.eval()
+    features, _ = next(iter(data_loader))
+    features = features.to(device)
+    if augment is not None:
+        features = augment(features)
+
+    rows = []
+    for precision in precisions:
+        acc = accuracy(model, data_loader, device, augment, precision=precision).item()
+
+        def forward():
+            with torch.no_grad(), autocast(device, precision):
+                logits_of(model(features))
+        seconds = median(time_fn(forward, device, iters=iters))
+        rows.append({'precision': precision, 'accuracy': acc, 'images_per_sec': features.size(0) / seconds})
+
+    base = rows[0]
+    print(f'{"precision":>9} | {"accuracy":>8} | {"delta":>6} | {"images/s":>9} | speedup')
+    for row in rows:
+        row['accuracy_delta'] = row['accuracy'] - base['accuracy']
+        row['speedup'] = row['images_per_sec'] / base['images_per_sec']
+        print(f'{row["precision"]:>9} | {row["accuracy"]:7.2f}% | {row["accuracy_delta"]:+6.2f} '
+              f'| {row["images_per_sec"]:9.1f} | {row["speedup"]:.2f}x')
+    return rows
@@ -0,0 +1,36 @@
+"""Hyperparameters of the six original scripts, keyed by ``(model, dataset)``.
+
+``get_preset`` falls back to ``DEFAULTS`` for pairs that had no script.
+The scripts upsampled CIFAR-10 / MNIST to 224x224 for VGG16 on MNIST and
+for GoogLeNet, and the presets keep doing so.  Both models also build for
+the native 32x32 / 28x28 (``--image-size 32`` / ``28``); the presets move
+there once ``resolution-report`` shows it loses no accuracy.
+"""
+
+DEFAULTS = {
+    'epochs': 10,
+    'lr': 1e-3,
+    'batch_size': 64,
+    'optimizer': 'adam',
+    'image_size': None,   # None keeps the dataset's native resolution
+    'degrees': 0,
+    'mean': None,
+    'std': None,
+    'model_kwargs': {},
+}
+
+PRESETS = {
+    ('resnet18', 'cifar10'): {'lr': 1e-3, 'batch_size': 64},
+    ('resnet50_imagenet', 'mnist'): {'lr': 1e-3, 'batch_size': 128},
+    ('vgg16', 'cifar10'): {'lr': 1e-3, 'batch_size': 32, 'model_kwargs': {'bn_before_relu': False}},
+    ('vgg16', 'mnist'): {'lr': 1e-2, 'batch_size': 64, 'image_size': 224, 'degrees': 30,
+                         'mean': (0.5,), 'std': (0.5,), 'model_kwargs': {'probas': True}},
+    ('googlenet', 'cifar10'): {'lr': 1e-2, 'batch_size': 128, 'optimizer': 'sgd', 'image_size': 224},
+    ('googlenet', 'mnist'): {'lr': 1e-3, 'batch_size': 64, 'image_size': 224},
+}
+
+
+def get_preset(model, dataset):
+    preset = dict(DEFAULTS)
+    preset.update(PRESETS.get((model, dataset), {}))
+    return preset
@@ -0,0 +1,190 @@
+"""Per-module latency, FLOP and activation profile of a model's forward pass.
+
+Forward hooks time the blocks an optimization would target:
+
+* GoogleNet: every ``InceptionModule`` and each of its four branches, the
+  ``AuxClassifier`` heads;
+* ResNets: every ``BasicBlock`` / ``Bottleneck`` / ``Block``;
+* VGG and the stems / classifiers of all models: every ``Conv2d`` and
+  ``Linear`` that is not inside one of the blocks above.
+
+Times are inclusive (an inception module includes its branches), FLOPs
+count the multiply-adds of the convolutions and linear layers inside a
+module twice, activation bytes are the size of the module's output.  The
+forward runs in eval mode without autograd; on CUDA every hook
+synchronizes, which slows the model down but attributes the time
+correctly.
+"""
+
+import json
+import time
+from collections import defaultdict
+
+import torch
+from torch import nn
+
+from .models import AuxClassifier, BasicBlock, Block, Bottleneck, InceptionModule
+from .timing import median, synchronize
+
+BLOCK_TYPES = (InceptionModule, AuxClassifier, BasicBlock, Bottleneck, Block)
+
+
+def profile_targets(model):
+    """``[(name, module)]`` of the modules to time, in registration order."""
+    targets = []
+    blocks = [name for name, module in model.named_modules() if isinstance(module, BLOCK_TYPES)]
+    branches = {f'{name}.{child}' for name, module in model.named_modules()
+                if isinstance(module, InceptionModule) for child, _ in module.named_children()}
+    for name, module in model.named_modules():
+        inside = any(name.startswith(block + '.') for block in blocks)
+        if isinstance(module, BLOCK_TYPES) or name in branches:
+            targets.append((name, module))
+        elif isinstance(module, (nn.Conv2d, nn.Linear)) and not inside:
+            targets.append((name, module))
+    return targets
+
+
+def _flops(module, inputs, output):
+    if isinstance(module, nn.Conv2d):
+        per_output = module.in_channels // module.groups * module.kernel_size[0] * module.kernel_size[1]
+        return 2 * output.numel() * per_output
+    return 2 * output.numel() * module.in_features
+
+
+def _nbytes(output):
+    if isinstance(output, torch.Tensor):
+        return output.numel() * output.element_size()
+    if isinstance(output, (tuple, list)):
+        return sum(_nbytes(o) for o in output if o is not None)
+    return 0
+
+
+class ModuleProfiler:
+    """Context manager that records per-call wall time, FLOPs and output bytes of ``profile_targets``."""
+
+    def __init__(self, model, device='cpu'):
+        self.model = model
+        self.device = device
+        self.targets = profile_targets(model)
+        self.events = []           # (name, start_s, duration_s) of the recorded calls
+        self.flops = defaultdict(int)
+        self.bytes = {}
+        self.recording = False
+        self._starts = {}
+        self._leaf_flops = defaultdict(int)
+        self._handles = []
+
+    def __enter__(self):
+        names = {module: name for name, module in self.targets}
+        for name, module in self.targets:
+            self._handles.append(module.register_forward_pre_hook(self._pre_hook(name)))
+            self._handles.append(module.register_forward_hook(self._post_hook(name)))
+        # FLOPs are counted on every conv / linear and summed into the targets that contain them
+        for leaf_name, leaf in self.model.named_modules():
+            if isinstance(leaf, (nn.Conv2d, nn.Linear)):
+                owners = [name for module, name in names.items()
+                          if leaf_name == name or leaf_name.startswith(name + '.')]
+                owners.append('')  # the whole model
+                self._handles.append(leaf.register_forward_hook(self._flop_hook(owners)))
+        return self
+
+    def __exit__(self, *exc):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+    def _pre_hook(self, name):
+        def hook(module, inputs):
+            if self.recording:
+                synchronize(self.device)
+                self._starts[name] = time.perf_counter()
+        return hook
+
+    def _post_hook(self, name):
+        def hook(module, inputs, output):
+            if self.recording:
+                synchronize(self.device)
+                start = self._starts.pop(name)
+                self.events.append((name, start, time.perf_counter() - start))
+            self.bytes[name] = _nbytes(output)
+        return hook
+
+    def _flop_hook(self, owners):
+        def hook(module, inputs, output):
+            flops = _flops(module, inputs, output)
+            for owner in owners:
+                self._leaf_flops[owner] += flops
+        return hook
+
+    def run(self, forward, warmup=5, iters=20):
+        """Call ``forward`` ``warmup`` times, then time ``iters`` calls; return the per-call wall times."""
+        with torch.no_grad():
+            for _ in range(warmup):
+                forward()
+            self._leaf_flops.clear()
+            forward()
+            self.flops = dict(self._leaf_flops)
+            self.recording = True
+            totals = []
+            for _ in range(iters):
+                synchronize(self.device)
+                start = time.perf_counter()
+                forward()
+                synchronize(self.device)
+                totals.append(time.perf_counter() - start)
+            self.recording = False
+        return totals
+
+    def rows(self, iters):
+        """Per-module summary, slowest first."""
+        per_module = defaultdict(float)
+        for name, _, duration in self.events:
+            per_module[name] += duration
+        types = {name: type(module).__name__ for name, module in self.targets}
+        rows = []
+        for name, _ in self.targets:
+            seconds = per_module.get(name, 0.) / iters
+            flops = self.flops.get(name, 0)
+            rows.append({'module': name, 'type': types[name], 'ms': seconds * 1000, 'gflop': flops / 1e9,
+                         'activation_mb': self.bytes.get(name, 0) / 2**20,
+                         'gflops_per_s': flops / seconds / 1e9 if seconds else 0.})
+        return sorted(rows, key=lambda row: -row['ms'])
+
+    def chrome_trace(self):
+        """The recorded calls in the Chrome trace event format (``chrome://tracing`` / Perfetto)."""
+        origin = min((start for _, start, _ in self.events), default=0.)
+        return {'traceEvents': [{'name': name, 'cat': 'module', 'ph': 'X', 'pid': 0, 'tid': 0,
+                                 'ts': (start - origin) * 1e6, 'dur': duration * 1e6}
+                                for name, start, duration in self.events],
+                'displayTimeUnit': 'ms'}
+
+
+def profile_model(model, example, device='cpu', warmup=5, iters=20, json_path=None, trace_path=None, label=None):
+    """Profile ``model`` on ``example``, print the per-module table and optionally export JSON / a trace."""
+    from .engine import logits_of
+
+    device = torch.device(device)
+    model = model.to(device).eval()
+    example = example.to(device)
+    with ModuleProfiler(model, device) as profiler:
+        totals = profiler.run(lambda: logits_of(model(example)), warmup, iters)
+    total_ms = median(totals) * 1000
+    rows = profiler.rows(iters)
+    total_gflop = profiler.flops.get('', 0) / 1e9
+    report = {'model': label or type(model).__name__, 'input_shape': list(example.shape), 'device': str(device),
+              'warmup': warmup, 'iters': iters, 'total_ms': total_ms, 'total_gflop': total_gflop,
+              'gflops_per_s': total_gflop / total_ms * 1000, 'modules': rows}
+
+    print(f'{report["model"]} {tuple(example.shape)} on {device}: {total_ms:.2f} ms per forward, '
+          f'{total_gflop:.2f} GFLOP, {report["gflops_per_s"]:.1f} GFLOP/s')
+    print(f'{"module":>32} | {"type":>16} | {"ms":>8} | {"%":>5} | {"GFLOP":>7} | {"act MB":>7} | GFLOP/s')
+    for row in rows:
+        print(f'{row["module"]:>32} | {row["type"]:>16} | {row["ms"]:8.3f} | {row["ms"] / total_ms * 100:5.1f} '
+              f'| {row["gflop"]:7.3f} | {row["activation_mb"]:7.2f} | {row["gflops_per_s"]:.1f}')
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(report, f, indent=1)
+    if trace_path:
+        with open(trace_path, 'w') as f:
+            json.dump(profiler.chrome_trace(), f)
+    return report
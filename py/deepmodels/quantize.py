@@ -0,0 +1,89 @@
+"""Post-training static int8 quantization.
+
+Uses FX graph mode quantization rather than eager mode: the models add
+residuals with ``+=``, concatenate inception branches with ``torch.cat``
+and call ``F.relu``, and FX handles those without rewriting the model
+classes around ``QuantStub`` / ``FloatFunctional``.  ``prepare_fx`` fuses
+Conv/BN/ReLU and inserts observers, a few batches of the validation split
+calibrate them, ``convert_fx`` swaps conv and linear layers for their int8
+kernels.  Quantized models run on CPU only.
+"""
+
+import copy
+import io
+
+import torch
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+from .timing import median, time_fn
+
+
+def quantized_engine():
+    for engine in ('x86', 'fbgemm', 'qnnpack'):
+        if engine in torch.backends.quantized.supported_engines:
+            return engine
+    raise RuntimeError('this torch build has no quantized CPU engine')
+
+
+def _batches(data_loader, augment, num_batches):
+    for index, (features, _) in enumerate(data_loader):
+        if index >= num_batches:
+            break
+        yield augment(features) if augment is not None else features
+
+
+def quantize(model, calibration_loader, augment=None, num_batches=32, backend=None):
+    """Return an int8 copy of ``model`` calibrated on ``num_batches`` of ``calibration_loader``."""
+    backend = backend or quantized_engine()
+    torch.backends.quantized.engine = backend
+    model = copy.deepcopy(model).cpu().eval()
+    if augment is not None:
+        augment = copy.deepcopy(augment).cpu().eval()
+
+    example = next(_batches(calibration_loader, augment, 1))
+    prepared = prepare_fx(model, get_default_qconfig_mapping(backend), (example,))
+    with torch.no_grad():
+        for features in _batches(calibration_loader, augment, num_batches):
+            prepared(features)
+    return convert_fx(prepared)
+
+
+def model_size_mb(model):
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 2**20
+
+
+def quantize_report(models, data_loader, augment=None, iters=20):
+    """Print size, single-image / batch latency and accuracy of each ``{name: model}`` on CPU."""
+    from .engine import accuracy, logits_of
+
+    if augment is not None:
+        augment = copy.deepcopy(augment).cpu().eval()
+    batch = next(_batches(data_loader, augment, 1))
+    single = batch[:1]
+
+    rows = []
+    for name, model in models.items():
+        def run(x):
+            def forward():
+                with torch.no_grad():
+                    logits_of(model(x))
+            return forward
+        rows.append({
+            'model': name,
+            'size_mb': model_size_mb(model),
+            'latency_ms': median(time_fn(run(single), iters=iters)) * 1000,
+            'batch_ms': median(time_fn(run(batch), iters=iters)) * 1000,
+            'accuracy': accuracy(model, data_loader, 'cpu', augment).item(),
+        })
+
+    base = rows[0]
+    print(f'{"model":>6} | {"size MB":>8} | {"1-image ms":>10} | {f"{len(batch)}-batch ms":>12} | accuracy')
+    for row in rows:
+        print(f'{row["model"]:>6} | {row["size_mb"]:8.2f} | {row["latency_ms"]:10.2f} | {row["batch_ms"]:12.2f} '
+              f'| {row["accuracy"]:.2f}% ({row["accuracy"] - base["accuracy"]:+.2f}, '
+              f'{base["latency_ms"] / row["latency_ms"]:.2f}x faster, '
+              f'{base["size_mb"] / row["size_mb"]:.2f}x smaller)')
+    return rows
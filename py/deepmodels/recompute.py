@@ -0,0 +1,142 @@
+"""Activation checkpointing for the deep stacks.
+
+``enable_activation_checkpointing(model, granularity)`` makes selected
+submodules drop their intermediate activations in the forward pass and
+recompute them during backward, trading step time for memory:
+
+==========  =====================================  ==============================
+model       ``'module'``                           ``'stage'``
+==========  =====================================  ==============================
+GoogleNet   every ``InceptionModule``              same (the aux heads tap between
+                                                   modules, so they cannot be grouped)
+ResNet      every block of ``layer1``..``layer4``  ``layer1``..``layer4`` as a whole
+VGG         every Conv / BN / ReLU unit            every segment between max pools
+==========  =====================================  ==============================
+
+Checkpointing only applies in training mode with grad enabled; evaluation
+runs the normal forward.  The module tree and ``state_dict`` are left
+unchanged, the forward of the selected modules is replaced per instance.
+BatchNorm layers inside a checkpointed region see the batch twice, so
+their running statistics move a little faster than without it.
+"""
+
+import functools
+import types
+
+import torch
+from torch.utils.checkpoint import checkpoint
+
+from .models import GoogleNet, InceptionModule, ResNet, VGG, resNet
+
+GRANULARITIES = ('none', 'module', 'stage')
+
+
+def _checkpointed_forward(self, *args):
+    forward = functools.partial(type(self).forward, self)
+    if self.training and torch.is_grad_enabled():
+        return checkpoint(forward, *args, use_reentrant=False)
+    return forward(*args)
+
+
+def _run_range(sequential, start, end, x):
+    for module in list(sequential)[start:end]:
+        x = module(x)
+    return x
+
+
+def _segmented_forward(self, x):
+    if not (self.training and torch.is_grad_enabled()):
+        return _run_range(self, 0, len(self), x)
+    for start, end in self._checkpoint_segments:
+        x = checkpoint(_run_range, self, start, end, x, use_reentrant=False)
+    return x
+
+
+def _checkpoint_module(module):
+    module.forward = types.MethodType(_checkpointed_forward, module)
+
+
+def _checkpoint_segments(sequential, starts):
+    bounds = sorted(set(starts) | {0}) + [len(sequential)]
+    sequential._checkpoint_segments = [(a, b) for a, b in zip(bounds, bounds[1:]) if a < b]
+    sequential.forward = types.MethodType(_segmented_forward, sequential)
+
+
+def enable_activation_checkpointing(model, granularity='module'):
+    """Checkpoint the blocks of ``model`` at ``granularity`` (see the module docstring)."""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'granularity must be one of {GRANULARITIES}, got {granularity!r}')
+    if granularity == 'none':
+        return model
+
+    if isinstance(model, GoogleNet):
+        for module in model.modules():
+            if isinstance(module, InceptionModule):
+                _checkpoint_module(module)
+    elif isinstance(model, (ResNet, resNet)):
+        for layer in (model.layer1, model.layer2, model.layer3, model.layer4):
+            if granularity == 'stage':
+                _checkpoint_module(layer)
+            else:
+                for block in layer:
+                    _checkpoint_module(block)
+    elif isinstance(model, VGG):
+        layers = list(model.features)
+        if granularity == 'stage':
+            starts = [i + 1 for i, m in enumerate(layers) if isinstance(m, torch.nn.MaxPool2d)]
+        else:
+            starts = [i for i, m in enumerate(layers) if isinstance(m, torch.nn.Conv2d)]
+        _checkpoint_segments(model.features, starts)
+    else:
+        raise TypeError(f'no activation checkpointing plan for {type(model).__name__}')
+    return model
+
+
+def measure_step(model_name, batch_size, image_size, in_channels=3, num_classes=10,
+                 granularity='none', device='cpu', steps=5, model_kwargs=None):
+    """Time a few SGD steps on random data and report the peak memory they needed."""
+    from .engine import criterion
+    from .models import build_model
+    from .timing import median, peak_rss_mb, time_fn
+
+    torch.manual_seed(0)
+    device = torch.device(device)
+    model = build_model(model_name, num_classes=num_classes, in_channels=in_channels,
+                        image_size=image_size, **(model_kwargs or {})).to(device).train()
+    enable_activation_checkpointing(model, granularity)
+    optimizer = torch.optim.SGD(model.parameters(), lr=1e-3)
+    features = torch.randn(batch_size, in_channels, image_size, image_size, device=device)
+    targets = torch.randint(num_classes, (batch_size,), device=device)
+
+    def step():
+        optimizer.zero_grad()
+        loss = criterion(model(features), targets)
+        loss.backward()
+        optimizer.step()
+
+    if device.type == 'cuda':
+        torch.cuda.reset_peak_memory_stats(device)
+    seconds = median(time_fn(step, device, warmup=1, iters=steps))
+    if device.type == 'cuda':
+        peak = torch.cuda.max_memory_allocated(device) / 2**20
+    else:
+        peak = peak_rss_mb()
+    return {'granularity': granularity, 'step_ms': seconds * 1000, 'peak_mb': peak}
+
+
+def memory_report(model_name, batch_size, image_size, in_channels=3, num_classes=10,
+                  granularities=GRANULARITIES, device='cpu', steps=5, model_kwargs=None):
+    """Peak memory vs. step time for each granularity, every one measured in a fresh process."""
+    from .timing import run_isolated
+
+    rows = [run_isolated(measure_step, model_name, batch_size, image_size, in_channels, num_classes,
+                         granularity, str(device), steps, model_kwargs)
+            for granularity in granularities]
+    base = rows[0]
+    kind = 'allocated' if torch.device(device).type == 'cuda' else 'RSS'
+    print(f'{model_name} batch {batch_size} at {image_size}x{image_size} on {device}')
+    print(f'{"granularity":>11} | {"step ms":>8} | {f"peak {kind} MB":>16} | vs {base["granularity"]}')
+    for row in rows:
+        print(f'{row["granularity"]:>11} | {row["step_ms"]:8.1f} | {row["peak_mb"]:16.1f} '
+              f'| {row["step_ms"] / base["step_ms"]:.2f}x time, {row["peak_mb"] / base["peak_mb"]:.2f}x memory')
+    return rows
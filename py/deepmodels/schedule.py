@@ -0,0 +1,68 @@
+"""Learning rate schedules and early stopping for ``engine.train``.
+
+``make_scheduler`` attaches a schedule to the existing SGD / Adam
+optimizer: ``'plateau'`` lowers the learning rate when validation accuracy
+stops improving and is stepped after every validation, ``'onecycle'``
+warms up to ``lr`` and anneals over the whole run and is stepped after
+every batch.  ``EarlyStopping`` ends the run once validation accuracy has
+not improved for ``patience`` validations; it is plain Python, torch is
+only imported by the functions that build or inspect a scheduler.
+"""
+
+SCHEDULERS = ('none', 'plateau', 'onecycle')
+
+
+def make_scheduler(name, optimizer, lr, epochs, steps_per_epoch, factor=0.1, patience=1):
+    if name not in SCHEDULERS:
+        raise ValueError(f'scheduler must be one of {SCHEDULERS}, got {name!r}')
+    if name == 'none':
+        return None
+    from torch.optim.lr_scheduler import OneCycleLR, ReduceLROnPlateau
+
+    if name == 'plateau':
+        return ReduceLROnPlateau(optimizer, mode='max', factor=factor, patience=patience)
+    return OneCycleLR(optimizer, max_lr=lr, epochs=epochs, steps_per_epoch=steps_per_epoch)
+
+
+def steps_per_batch(scheduler):
+    """True for schedules stepped after every batch, False for those stepped on validation accuracy."""
+    if scheduler is None:
+        return False
+    from torch.optim.lr_scheduler import ReduceLROnPlateau
+
+    return not isinstance(scheduler, ReduceLROnPlateau)
+
+
+def current_lr(optimizer):
+    return optimizer.param_groups[0]['lr']
+
+
+class EarlyStopping:
+    """Stop after ``patience`` validations without an improvement of more than ``min_delta``."""
+
+    def __init__(self, patience=3, min_delta=0.):
+        self.patience = patience
+        self.min_delta = min_delta
+        self.best = None
+        self.bad_validations = 0
+
+    def step(self, value):
+        """Record a validation result; return True when it is the best so far."""
+        if self.best is None or value > self.best + self.min_delta:
+            self.best = value
+            self.bad_validations = 0
+            return True
+        self.bad_validations += 1
+        return False
+
+    @property
+    def should_stop(self):
+        return self.bad_validations >= self.patience
+
+    def state_dict(self):
+        return {'best': self.best, 'bad_validations': self.bad_validations}
+
+    def load_state_dict(self, state):
+        self.best = state['best']
+        self.bad_validations = state['bad_validations']
+
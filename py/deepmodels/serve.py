@@ -0,0 +1,204 @@
+"""Long-running local inference service with dynamic batching.
+
+The model is loaded once.  Every HTTP request (on a TCP port or a Unix
+socket) decodes its image and hands it to a ``DynamicBatcher``, whose single
+worker thread waits until ``max_batch_size`` images are queued or
+``max_latency_ms`` have passed since the oldest one arrived, runs them as
+one batch and answers every request with its top-k classes.
+
+    POST /predict?top_k=3   body: an encoded image (PNG, JPEG, ...)
+    -> {"predictions": [{"class": 3, "label": "cat", "probability": 0.91}, ...]}
+    GET /health             -> {"status": "ok"}
+
+``top_k`` defaults to 5; a request whose ``top_k`` is not a positive
+integer is answered with 400.
+"""
+
+import io
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import torch
+from PIL import Image
+
+from .engine import logits_of
+
+
+def decode_image(data, in_channels, size):
+    """Encoded image bytes -> ``(C, size, size)`` uint8 tensor."""
+    img = Image.open(io.BytesIO(data)).convert('L' if in_channels == 1 else 'RGB')
+    if img.size != (size, size):
+        img = img.resize((size, size), Image.BILINEAR)
+    arr = np.asarray(img, dtype=np.uint8)
+    if arr.ndim == 2:
+        arr = arr[:, :, None]
+    return torch.from_numpy(arr.transpose(2, 0, 1).copy())
+
+
+def check_top_k(top_k):
+    """Return ``top_k`` if it is a positive integer, raise ``ValueError`` otherwise."""
+    if isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1:
+        raise ValueError(f'top_k must be a positive integer, got {top_k!r}')
+    return top_k
+
+
+def parse_top_k(query, default=5):
+    """``top_k`` from a URL query string, see ``check_top_k``."""
+    values = parse_qs(query).get('top_k')
+    if not values:
+        return default
+    try:
+        top_k = int(values[0])
+    except ValueError:
+        raise ValueError(f'top_k must be a positive integer, got {values[0]!r}') from None
+    return check_top_k(top_k)
+
+
+class DynamicBatcher:
+    """Collects single images into micro-batches under a latency deadline."""
+
+    def __init__(self, model, augment, device, classes, max_batch_size=64, max_latency_ms=5.):
+        self.model = model.to(device).eval()
+        self.augment = augment.to(device).eval() if augment is not None else None
+        self.device = device
+        self.classes = classes
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self._loop, name='dynamic-batcher', daemon=True)
+        self.thread.start()
+
+    def submit(self, image, top_k=5):
+        top_k = min(check_top_k(top_k), len(self.classes))
+        future = Future()
+        self.requests.put((image, top_k, future))
+        return future
+
+    def close(self):
+        self.requests.put(None)
+        self.thread.join()
+
+    def _loop(self):
+        while True:
+            item = self.requests.get()
+            if item is None:
+                return
+            batch, stop = [item], False
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._run(batch)
+            if stop:
+                return
+
+    def _run(self, batch):
+        try:
+            images = torch.stack([image for image, _, _ in batch]).to(self.device)
+            with torch.inference_mode():
+                if self.augment is not None:
+                    images = self.augment(images)
+                probabilities = torch.softmax(logits_of(self.model(images)).float(), dim=1)
+                top_p, top_i = probabilities.topk(max(k for _, k, _ in batch), dim=1)
+            top_p, top_i = top_p.cpu().tolist(), top_i.cpu().tolist()
+        except Exception as exc:
+            for _, _, future in batch:
+                future.set_exception(exc)
+            return
+        for row, (_, k, future) in enumerate(batch):
+            future.set_result([{'class': i, 'label': self.classes[i], 'probability': p}
+                               for i, p in zip(top_i[row][:k], top_p[row][:k])])
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    batcher = None
+    in_channels = 3
+    image_size = 32
+    verbose = False
+
+    def address_string(self):
+        # Unix socket peers have no (host, port) address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/health':
+            self._reply(200, {'status': 'ok'})
+        else:
+            self._reply(404, {'error': 'not found'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/predict':
+            self._reply(404, {'error': 'not found'})
+            return
+        try:
+            top_k = parse_top_k(url.query)
+            data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            image = decode_image(data, self.in_channels, self.image_size)
+        except Exception as exc:
+            self._reply(400, {'error': f'bad request: {exc}'})
+            return
+        try:
+            predictions = self.batcher.submit(image, top_k).result()
+        except Exception as exc:
+            self._reply(500, {'error': str(exc)})
+            return
+        self._reply(200, {'predictions': predictions})
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(batcher, in_channels, image_size, host='127.0.0.1', port=8080, socket_path=None, verbose=False):
+    """Serve ``batcher`` over HTTP until interrupted."""
+    handler = type('Handler', (PredictionHandler,), {
+        'batcher': batcher, 'in_channels': in_channels, 'image_size': image_size, 'verbose': verbose})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = UnixHTTPServer(socket_path, handler)
+        where = f'unix:{socket_path}'
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        where = f'http://{host}:{port}'
+    print(f'Serving predictions on {where} (max batch {batcher.max_batch_size}, '
+          f'max latency {batcher.max_latency * 1000:.1f} ms)')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
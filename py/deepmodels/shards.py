@@ -0,0 +1,356 @@
+"""Sharded tar datasets streamed from disk, for training sets larger than RAM.
+
+A shard directory holds ``shard-000000.tar``, ``shard-000001.tar``, ... and
+an ``index.json`` with the number of samples per shard, the channel count,
+the image size and the class names.  Every sample is two consecutive tar
+members, ``<key>.png`` (or ``.jpg``) with the encoded image and
+``<key>.cls`` with the label as text, so the shards can also be read with
+``tar`` or other tools.
+
+``ShardWriter`` / ``write_shards`` produce the directory (CLI:
+``make-shards``).  ``ShardDataset`` streams it as an ``IterableDataset``
+that yields whole uint8 batches, like the cached datasets do after
+collation, so it takes the place of the ``random_split`` train set in
+``train_loader``:
+
+* each epoch the shard order is shuffled with ``seed + epoch``, dealt
+  round-robin to the ranks and each rank's shards round-robin to its
+  DataLoader workers; samples are mixed further by a shuffle buffer of
+  ``shuffle_buffer`` encoded samples;
+* an epoch is one pass: every worker reads each of its shards once and
+  flushes its shuffle buffer at the end, so every sample is served once.
+  Ranks that got fewer batches than the others are padded with whole
+  batches repeated from the start of their workers' pass, after it, so
+  every rank yields the same number of batches;
+* ``set_epoch(epoch, start)`` resumes an epoch after ``start`` samples, the
+  same interface as ``ResumableSampler``, so mid-epoch checkpoints work.
+  The skipped samples are still read from the tar files but not decoded.
+"""
+
+import io
+import itertools
+import json
+import os
+import random
+import tarfile
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, IterableDataset, get_worker_info
+
+INDEX_FILE = 'index.json'
+
+
+def shard_name(index):
+    return f'shard-{index:06d}.tar'
+
+
+def encode_image(image, image_format='png'):
+    """PNG / JPEG bytes of a PIL image or a ``(C, H, W)`` / ``(H, W)`` uint8 array or tensor."""
+    if not isinstance(image, Image.Image):
+        arr = np.asarray(image, dtype=np.uint8)
+        if arr.ndim == 3:
+            arr = arr[0] if arr.shape[0] == 1 else arr.transpose(1, 2, 0)
+        image = Image.fromarray(arr)
+    buffer = io.BytesIO()
+    if image_format == 'jpg':
+        image.save(buffer, format='JPEG', quality=95)
+    else:
+        image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def decode_image(data, in_channels):
+    """``(C, H, W)`` uint8 tensor of encoded image bytes."""
+    image = Image.open(io.BytesIO(data)).convert('L' if in_channels == 1 else 'RGB')
+    arr = np.asarray(image, dtype=np.uint8)
+    if arr.ndim == 2:
+        arr = arr[:, :, None]
+    return torch.from_numpy(arr.transpose(2, 0, 1).copy())
+
+
+class ShardWriter:
+    """Writes ``(image, label)`` samples into tar shards of at most ``shard_size`` samples.
+
+    Each shard is written under a temporary name and renamed when it is
+    full; ``close`` (or leaving the ``with`` block) finishes the last one
+    and writes ``index.json``, so a directory with an index is complete.
+    """
+
+    def __init__(self, directory, in_channels, image_size, classes, shard_size=10000, image_format='png'):
+        if image_format not in ('png', 'jpg'):
+            raise ValueError(f'image_format must be png or jpg, got {image_format!r}')
+        self.directory = directory
+        self.in_channels = in_channels
+        self.image_size = image_size
+        self.classes = list(classes)
+        self.shard_size = shard_size
+        self.image_format = image_format
+        self.shards = []
+        self._tar = None
+        self._count = 0
+        self._written = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _add(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        self._tar.addfile(info, io.BytesIO(data))
+
+    def write(self, image, label):
+        if self._tar is None:
+            self._path = os.path.join(self.directory, shard_name(len(self.shards)))
+            self._tar = tarfile.open(f'{self._path}.tmp-{os.getpid()}', 'w')
+        key = f'{self._written:09d}'
+        self._add(f'{key}.{self.image_format}', encode_image(image, self.image_format))
+        self._add(f'{key}.cls', str(int(label)).encode())
+        self._count += 1
+        self._written += 1
+        if self._count == self.shard_size:
+            self._finish_shard()
+
+    def _finish_shard(self):
+        tmp = self._tar.name
+        self._tar.close()
+        os.replace(tmp, self._path)
+        self.shards.append({'name': os.path.basename(self._path), 'count': self._count})
+        self._tar = None
+        self._count = 0
+
+    def close(self):
+        if self._tar is not None:
+            self._finish_shard()
+        index = {'shards': self.shards, 'in_channels': self.in_channels, 'image_size': self.image_size,
+                 'classes': self.classes}
+        tmp = os.path.join(self.directory, f'{INDEX_FILE}.tmp-{os.getpid()}')
+        with open(tmp, 'w') as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp, os.path.join(self.directory, INDEX_FILE))
+
+
+def write_shards(dataset, directory, classes, image_size=None, shard_size=10000, image_format='png'):
+    """Write a dataset of ``(PIL.Image, label)`` pairs (torchvision, ``ImageFolder``) as shards.
+
+    Images are resized to ``image_size`` x ``image_size`` when it is given,
+    so batches can be stacked; otherwise they must already share one size.
+    """
+    writer = None
+    for index in range(len(dataset)):
+        image, label = dataset[index]
+        if image_size is not None and image.size != (image_size, image_size):
+            image = image.resize((image_size, image_size), Image.BILINEAR)
+        if writer is None:
+            in_channels = 1 if image.mode in ('L', '1', 'I', 'F') else 3
+            writer = ShardWriter(directory, in_channels, image.size[0], classes, shard_size, image_format)
+        writer.write(image, label)
+    if writer is not None:
+        writer.close()
+    return directory
+
+
+def load_index(directory):
+    with open(os.path.join(directory, INDEX_FILE)) as f:
+        return json.load(f)
+
+
+def shard_info(directory):
+    """The ``DATASETS`` entry fields (in_channels, image_size, classes) of a shard directory."""
+    index = load_index(directory)
+    return {'in_channels': index['in_channels'], 'image_size': index['image_size'], 'classes': index['classes']}
+
+
+def read_shard(path):
+    """Yield ``(encoded image, label)`` of a shard in file order."""
+    with tarfile.open(path, 'r|') as tar:
+        image = None
+        for member in tar:
+            data = tar.extractfile(member).read()
+            if member.name.endswith('.cls'):
+                yield image, int(data)
+                image = None
+            else:
+                image = data
+
+
+def shuffled(samples, buffer_size, rng):
+    """Shuffle a stream with a buffer of ``buffer_size`` items."""
+    buffer = []
+    for sample in samples:
+        if len(buffer) < buffer_size:
+            buffer.append(sample)
+            continue
+        i = rng.randrange(buffer_size)
+        buffer[i], sample = sample, buffer[i]
+        yield sample
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+class ShardDataset(IterableDataset):
+    """Streams a shard directory as uint8 ``(images, labels)`` batches, see the module docstring.
+
+    Use it with ``make_shard_loader``, which sets ``num_workers`` to the
+    loader's worker count; the batch plan depends on it.  ``shuffle=False``
+    reads the shards in order without a buffer and without padding, for
+    validation and test sets.
+    """
+
+    def __init__(self, directory, batch_size, shuffle=True, shuffle_buffer=10000, seed=0,
+                 num_replicas=None, rank=None):
+        from .distributed import get_rank, get_world_size
+
+        index = load_index(directory)
+        self.directory = directory
+        self.shards = [os.path.join(directory, shard['name']) for shard in index['shards']]
+        self.counts = [shard['count'] for shard in index['shards']]
+        self.in_channels = index['in_channels']
+        self.total = sum(self.counts)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.num_replicas = num_replicas if num_replicas is not None else get_world_size()
+        self.rank = rank if rank is not None else get_rank()
+        self.num_workers = 1
+        self.epoch = 0
+        self.start = 0
+
+    def set_epoch(self, epoch, start=0):
+        self.epoch = epoch
+        self.start = start
+
+    def state_dict(self):
+        return {'seed': self.seed, 'epoch': self.epoch}
+
+    def load_state_dict(self, state):
+        self.seed = state['seed']
+        self.epoch = state['epoch']
+
+    def _slots(self, num_workers):
+        """The shard indices of every worker of every rank, slot ``rank * num_workers + worker``."""
+        order = list(range(len(self.shards)))
+        if self.shuffle:
+            generator = torch.Generator()
+            generator.manual_seed(self.seed + self.epoch)
+            order = torch.randperm(len(self.shards), generator=generator).tolist()
+        ranks = [order[rank::self.num_replicas] for rank in range(self.num_replicas)]
+        return [shards[worker::num_workers] for shards in ranks for worker in range(num_workers)]
+
+    def _plan(self, num_workers):
+        """``(shards, samples, batches of the pass, padding batches)`` of each worker of this rank."""
+        slots = self._slots(num_workers)
+        samples = [sum(self.counts[i] for i in slot) for slot in slots]
+        batches = [-(-n // self.batch_size) for n in samples]
+        per_rank = [sum(batches[r * num_workers:(r + 1) * num_workers]) for r in range(self.num_replicas)]
+        mine = range(self.rank * num_workers, (self.rank + 1) * num_workers)
+        padding = [0] * num_workers
+        # DDP needs the same number of batches on every rank: pad the shorter ones with
+        # whole batches, spread over the workers that have samples to repeat
+        deficit = max(per_rank) - per_rank[self.rank]
+        donors = [i for i, slot in enumerate(mine) if samples[slot]]
+        if deficit and not donors:
+            raise ValueError(f'rank {self.rank} got no shards: {len(self.shards)} shards for '
+                             f'{self.num_replicas} ranks')
+        for k in range(deficit):
+            padding[donors[k % len(donors)]] += 1
+        return [([self.shards[i] for i in slots[slot]], samples[slot], batches[slot], padding[w])
+                for w, slot in enumerate(mine)]
+
+    @property
+    def num_batches(self):
+        if not self.shuffle:
+            return sum(-(-n // self.batch_size) for _, n, _, _ in self._plan(self.num_workers))
+        return sum(b + pad for _, _, b, pad in self._plan(self.num_workers))
+
+    @property
+    def num_samples(self):
+        # what ``engine.train`` derives the batches per epoch from
+        return self.num_batches * self.batch_size
+
+    def __len__(self):
+        return self.num_batches - self.start // self.batch_size
+
+    def _resume_point(self, plan, first):
+        """How many of each worker's batches come before batch ``first``, and which worker serves it.
+
+        ``DataLoader`` takes one batch from each worker in turn and leaves
+        out the exhausted ones; that order is replayed here.
+        """
+        left = [batches + pad for _, _, batches, pad in plan]
+        skipped = [0] * len(plan)
+
+        def upcoming():
+            active = [w for w in range(len(plan)) if left[w]]
+            return min(active, key=lambda w: (skipped[w], w)) if active else 0
+
+        for _ in range(first):
+            w = upcoming()
+            skipped[w] += 1
+            left[w] -= 1
+        return skipped, upcoming()
+
+    def _pass(self, shards, worker):
+        """One pass over ``shards``; the shuffle buffer is flushed at its end."""
+        samples = (sample for path in shards for sample in read_shard(path))
+        if self.shuffle and self.shuffle_buffer > 1:
+            rng = random.Random(f'{self.seed}-{self.epoch}-{self.rank}-{worker}')
+            samples = shuffled(samples, self.shuffle_buffer, rng)
+        return samples
+
+    def _batches(self, samples, sizes):
+        for size in sizes:
+            chunk = [sample for _, sample in zip(range(size), samples)]
+            if not chunk:
+                return
+            images = torch.stack([decode_image(data, self.in_channels) for data, _ in chunk])
+            yield images, torch.tensor([label for _, label in chunk], dtype=torch.long)
+
+    def __iter__(self):
+        info = get_worker_info()
+        worker, num_workers = (info.id, info.num_workers) if info is not None else (0, 1)
+        plan = self._plan(num_workers)
+        if not self.shuffle:
+            shards = plan[worker][0]
+            yield from self._batches(self._pass(shards, worker), itertools.repeat(self.batch_size))
+            return
+
+        skipped, upcoming = self._resume_point(plan, self.start // self.batch_size)
+        # a new DataLoader asks worker 0 first: rotate the roles so that worker 0 continues
+        # with the part of the plan whose batch was up next when the epoch was interrupted
+        role = (upcoming + worker) % num_workers
+        shards, count, batches, padding = plan[role]
+        if not shards:
+            return
+
+        # the full pass first, then whole batches repeated from the start of the same pass
+        repeats = (sample for _ in itertools.count() for sample in self._pass(shards, role))
+        samples = itertools.chain(self._pass(shards, role), repeats)
+        sizes = [self.batch_size] * (count // self.batch_size)
+        if count % self.batch_size:
+            sizes.append(count % self.batch_size)
+        sizes += [self.batch_size] * padding
+        skip = skipped[role]
+        for size in sizes[:skip]:
+            # skipped without decoding, to keep the shuffle buffer in step
+            for _ in range(size):
+                next(samples)
+        yield from self._batches(samples, sizes[skip:])
+
+
+def make_shard_loader(dataset, num_workers=0, pin_memory=None):
+    """``DataLoader`` over a ``ShardDataset``.
+
+    Workers are not persistent: each epoch starts new ones, which pick up
+    the epoch and start position set with ``set_epoch``.
+    """
+    if pin_memory is None:
+        pin_memory = torch.cuda.is_available()
+    dataset.num_workers = max(1, num_workers)
+    return DataLoader(dataset, batch_size=None, num_workers=num_workers, pin_memory=pin_memory)
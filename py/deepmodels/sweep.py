@@ -0,0 +1,169 @@
+"""Hyperparameter sweeps: many ``train`` runs in parallel on one machine.
+
+``run_sweep`` takes a grid of learning rates, batch sizes and optimizers
+(or ``num_trials`` random picks from it) and runs every configuration as a
+``python -m deepmodels train`` subprocess:
+
+* ``parallel`` trials run at once, each pinned with ``sched_setaffinity``
+  to its own block of cores and limited to that many torch threads, so
+  trials do not fight over the same cores;
+* the dataset cache and the validation split are built once before the
+  first trial starts; every trial then maps the same read-only uint8 file
+  (``cache.py``), which the page cache holds once for all of them, and
+  validates on the same images;
+* each trial writes its history (``engine.train``) to a JSON file after
+  every validation.  A trial whose best validation accuracy after epoch
+  ``e >= prune_after`` is below the median of what the other trials had
+  reached after ``e`` epochs is stopped (median stopping rule), once at
+  least ``min_trials`` of them got that far.
+
+Trial logs, histories and ``sweep.json`` with every trial's configuration,
+status and best validation accuracy go to ``output_dir``.
+"""
+
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from statistics import median
+
+
+def save_json(path, obj):
+    tmp = f'{path}.tmp-{os.getpid()}'
+    with open(tmp, 'w') as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
+
+def _load_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def grid(lrs, batch_sizes, optimizers, num_trials=None, seed=0):
+    """Every ``(lr, batch_size, optimizer)`` combination, or ``num_trials`` random ones."""
+    configs = [{'lr': lr, 'batch_size': batch_size, 'optimizer': optimizer}
+               for lr, batch_size, optimizer in itertools.product(lrs, batch_sizes, optimizers)]
+    if num_trials is not None and num_trials < len(configs):
+        configs = random.Random(seed).sample(configs, num_trials)
+    return configs
+
+
+def core_slots(parallel, cores=None):
+    """Split the usable cores into ``parallel`` disjoint blocks."""
+    cores = sorted(cores or os.sched_getaffinity(0))
+    parallel = max(1, min(parallel, len(cores)))
+    per_trial = len(cores) // parallel
+    return [cores[i * per_trial:(i + 1) * per_trial] for i in range(parallel)]
+
+
+def best_by_epoch(history):
+    """``{epoch: best validation accuracy up to the end of that epoch}``."""
+    best, curve = None, {}
+    for entry in history:
+        if entry['valid_acc'] is not None:
+            best = entry['valid_acc'] if best is None else max(best, entry['valid_acc'])
+        if best is not None:
+            curve[entry['epoch']] = best
+    return curve
+
+
+def should_prune(curve, others, prune_after=1, min_trials=3):
+    """Median stopping rule: is the trial behind the median of ``others`` at its latest epoch?"""
+    if not curve:
+        return False
+    epoch = max(curve)
+    if epoch < prune_after:
+        return False
+    reached = [other[epoch] for other in others if epoch in other]
+    return len(reached) >= min_trials and curve[epoch] < median(reached)
+
+
+def _prepare_data(model, dataset, data_root, seed):
+    """Build the memory-mapped cache (at the preset size) and the stored split once, before any trial needs them."""
+    from .data import load_datasets
+    from .presets import get_preset
+    load_datasets(dataset, root=data_root, seed=seed, size=get_preset(model, dataset)['image_size'])
+
+
+def _launch(trial, model, dataset, epochs, seed, data_root, output_dir, cores, train_args):
+    name = f'trial-{trial["id"]:03d}'
+    trial['history_file'] = os.path.join(output_dir, f'{name}.history.json')
+    argv = [sys.executable, '-m', 'deepmodels', 'train', '--model', model, '--dataset', dataset,
+            '--lr', str(trial['lr']), '--batch-size', str(trial['batch_size']), '--optimizer', trial['optimizer'],
+            '--seed', str(seed), '--data-root', data_root, '--history-file', trial['history_file'],
+            '--loader-workers', '0'] + list(train_args)
+    if epochs is not None:
+        argv += ['--epochs', str(epochs)]
+    env = dict(os.environ, OMP_NUM_THREADS=str(len(cores)), MKL_NUM_THREADS=str(len(cores)))
+    log = open(os.path.join(output_dir, f'{name}.log'), 'w')
+    trial['process'] = subprocess.Popen(argv, stdout=log, stderr=subprocess.STDOUT, env=env,
+                                        preexec_fn=lambda: os.sched_setaffinity(0, cores))
+    trial['log'] = log
+    trial['cores'] = cores
+    trial['start'] = time.time()
+    print(f'{name}: lr={trial["lr"]} batch_size={trial["batch_size"]} optimizer={trial["optimizer"]} '
+          f'on cores {cores[0]}-{cores[-1]}', flush=True)
+
+
+def _finish(trial, status):
+    trial['log'].close()
+    curve = best_by_epoch(_load_json(trial['history_file']))
+    trial.update(status=status, minutes=(time.time() - trial['start']) / 60,
+                 epochs=max(curve, default=0), best_valid_acc=max(curve.values(), default=None), curve=curve)
+    acc = 'n/a' if trial['best_valid_acc'] is None else f'{trial["best_valid_acc"]:.2f}%'
+    print(f'trial-{trial["id"]:03d}: {status} after {trial["epochs"]} epochs, best validation {acc}', flush=True)
+
+
+def run_sweep(model, dataset, configs, parallel=2, epochs=None, seed=42, data_root='data', output_dir='sweep',
+              prune_after=1, min_trials=3, train_args=(), poll_seconds=2.):
+    """Run every config of ``grid`` as a pruned, core-pinned ``train`` subprocess; return the trials."""
+    os.makedirs(output_dir, exist_ok=True)
+    _prepare_data(model, dataset, data_root, seed)
+    pending = [dict(config, id=i) for i, config in enumerate(configs)]
+    free = core_slots(parallel)
+    running, done = [], []
+    while pending or running:
+        while pending and free:
+            trial = pending.pop(0)
+            _launch(trial, model, dataset, epochs, seed, data_root, output_dir, free.pop(0), train_args)
+            running.append(trial)
+        time.sleep(poll_seconds)
+        curves = {trial['id']: best_by_epoch(_load_json(trial['history_file'])) for trial in running}
+        finished_curves = [trial['curve'] for trial in done if trial['status'] != 'failed']
+        for trial in list(running):
+            others = finished_curves + [curve for i, curve in curves.items() if i != trial['id']]
+            code = trial['process'].poll()
+            if code is None and should_prune(curves[trial['id']], others, prune_after, min_trials):
+                trial['process'].terminate()
+                trial['process'].wait()
+                status = 'pruned'
+            elif code is None:
+                continue
+            else:
+                status = 'completed' if code == 0 else 'failed'
+            _finish(trial, status)
+            running.remove(trial)
+            done.append(trial)
+            free.append(trial['cores'])
+    results = sorted(({key: value for key, value in trial.items() if key not in ('process', 'log')}
+                      for trial in done),
+                     key=lambda t: (t['best_valid_acc'] is None, -(t['best_valid_acc'] or 0)))
+    save_json(os.path.join(output_dir, 'sweep.json'), results)
+    print_sweep(results)
+    return results
+
+
+def print_sweep(results):
+    print(f'{"trial":>5} | {"lr":>8} | {"batch":>5} | {"optimizer":>9} | {"status":>9} | {"epochs":>6} '
+          f'| {"best valid %":>12} | minutes')
+    for t in results:
+        acc = '' if t['best_valid_acc'] is None else f'{t["best_valid_acc"]:.2f}'
+        print(f'{t["id"]:>5} | {t["lr"]:>8g} | {t["batch_size"]:>5} | {t["optimizer"]:>9} | {t["status"]:>9} '
+              f'| {t["epochs"]:>6} | {acc:>12} | {t["minutes"]:.1f}')
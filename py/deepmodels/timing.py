@@ -0,0 +1,59 @@
+"""Small timing helpers shared by the reports and benchmarks."""
+
+import math
+import time
+
+import torch
+
+
+def synchronize(device):
+    if torch.device(device).type == 'cuda':
+        torch.cuda.synchronize(device)
+
+
+def time_fn(fn, device='cpu', warmup=2, iters=10):
+    """Run ``fn`` ``warmup`` times, then return the wall time in seconds of each of ``iters`` calls."""
+    for _ in range(warmup):
+        fn()
+    synchronize(device)
+    times = []
+    for _ in range(iters):
+        start = time.perf_counter()
+        fn()
+        synchronize(device)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+
+
+def percentile(values, q):
+    """Nearest-rank ``q``-th percentile, ``0 <= q <= 100``."""
+    values = sorted(values)
+    return values[max(0, min(len(values), math.ceil(q / 100 * len(values))) - 1)]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    import resource
+    import sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def run_isolated(fn, *args, **kwargs):
+    """Run ``fn(*args, **kwargs)`` in a fresh spawned process and return its result.
+
+    Peak RSS can only grow within a process, so every measurement that
+    reports it runs on its own.  ``fn`` must be importable at module level.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(fn, *args, **kwargs).result()
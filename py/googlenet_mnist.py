@@ -15,10 +15,6 @@ Original file is located at
 
 import torch
 import numpy as np
-from torch import nn
-import torch.nn.functional as F
-import time
-from torch.utils.data import DataLoader
 from torchvision.datasets import MNIST
 from torchvision.transforms import ToTensor
 
@@ -27,10 +23,17 @@ from torchvision import transforms
 
 import matplotlib.pyplot as plt
 
-from sklearn.metrics import classification_report, confusion_matrix
 from tqdm.autonotebook import tqdm
 from torchsummary import summary
 
+from deepmodels.augment import BatchAugment
+from deepmodels.cache import cached_dataset, split_dataset
+from deepmodels.engine import get_prediction, init_weights, train
+from deepmodels.loaders import make_loader
+from deepmodels.metrics import evaluate
+from deepmodels.models import GoogleNet
+from deepmodels.plots import plot_confusion_matrix
+
 """#### **2.HyperParameters**"""
 
 # Train parametes
@@ -49,41 +52,23 @@ GRAYSCALE = True # MNIST is only one channel
 
 torch.manual_seed(RANDOM_SEED)
 
-from numpy.core.fromnumeric import resize
-transform_train = transforms.Compose([
-    transforms.Resize(224),
-    transforms.ToTensor(),
-    ])
-
-transform_test = transforms.Compose([
-    transforms.Resize(224),
-    transforms.ToTensor(),
-    ])
-
+# Images are resized to 224x224 once and cached as uint8 (deepmodels/cache.py), the
+# rotation / normalization run batched on DEVICE inside train (deepmodels/augment.py)
+augment = BatchAugment(seed=RANDOM_SEED)
 
-train_ds = datasets.MNIST(root='data', 
-                               train=True, 
-                               transform=transform_train,
-                               download=True)
-train_set, val_set = torch.utils.data.random_split(train_ds, [50000, 10000])
+train_ds = cached_dataset(datasets.MNIST, root='data', train=True, size=224, raw=True, download=True)
+train_set, val_set = split_dataset(train_ds, [50000, 10000], 'mnist', root='data', seed=RANDOM_SEED)
 
-test_ds = datasets.MNIST(root='data', 
-                              train=False, 
-                              transform=transform_test)
+test_ds = cached_dataset(datasets.MNIST, root='data', train=False, size=224, raw=True)
 
 
-train_loader = DataLoader(dataset=train_set,
-                          batch_size=BATCH_SIZE,
-                      shuffle = True)
+# worker count / prefetch are benchmarked once per machine (deepmodels/loaders.py)
+train_loader = make_loader(train_set, batch_size=BATCH_SIZE, shuffle=True)
 
 
-val_loader = DataLoader(dataset=val_set,
-                          batch_size=BATCH_SIZE,
-                      shuffle = False)
+val_loader = make_loader(val_set, batch_size=BATCH_SIZE, shuffle=False)
 
-test_loader = DataLoader(dataset=test_ds,
-                     batch_size=BATCH_SIZE,
-                     shuffle = False)
+test_loader = make_loader(test_ds, batch_size=BATCH_SIZE, shuffle=False)
 
 # Checking the dataset
 images, labels = next(iter(train_loader))  
@@ -101,252 +86,46 @@ for index in range(25):
 
 """#### **3.Model**
 
-##### **Building small blocks for the Inception Model**
+GoogleNet and its blocks live in deepmodels/models/googlenet.py
 """
 
-# Model
-
-class ConvBlock(nn.Module):
-    def __init__(self, in_fts, out_fts, k, s, p):
-        super(ConvBlock, self).__init__()
-        self.convolution = nn.Sequential(
-            nn.Conv2d(in_channels=in_fts, out_channels=out_fts, kernel_size=(k, k), stride=(s, s), padding=(p, p)),
-            nn.ReLU()
-        )
-    def forward(self, input_img):
-        x = self.convolution(input_img)
-        return x
-
-class ReduceConvBlock(nn.Module):
-    def __init__(self, in_fts, out_fts_1, out_fts_2, k, p):
-        super(ReduceConvBlock, self).__init__()
-        self.redConv = nn.Sequential(
-            nn.Conv2d(in_channels=in_fts, out_channels=out_fts_1, kernel_size=(1, 1), stride=(1, 1)),
-            nn.ReLU(),
-            nn.Conv2d(in_channels=out_fts_1, out_channels=out_fts_2, kernel_size=(k, k), stride=(1, 1), padding=(p, p)),
-            nn.ReLU()
-        )
-
-    def forward(self, input_img):
-        x = self.redConv(input_img)
-
-        return x
-
-
-class AuxClassifier(nn.Module):
-    def __init__(self, in_fts, num_classes):
-        super(AuxClassifier, self).__init__()
-        self.avgpool = nn.AvgPool2d(kernel_size=(5, 5), stride=(3, 3))
-        self.conv = nn.Conv2d(in_channels=in_fts, out_channels=128, kernel_size=(1, 1), stride=(1, 1))
-        self.relu = nn.ReLU()
-        self.fc = nn.Linear(4 * 4 * 128, 1024)
-        self.dropout = nn.Dropout(p=0.7)
-        self.classifier = nn.Linear(1024, num_classes)
-
-    def forward(self, input_img):
-        N = input_img.shape[0]
-        x = self.avgpool(input_img)
-        x = self.conv(x)
-        x = self.relu(x)
-        x = x.reshape(N, -1)
-        x = self.fc(x)
-        x = self.dropout(x)
-        x = self.classifier(x)
-        return x
-
-
-class InceptionModule(nn.Module):
-    def __init__(self, curr_in_fts, f_1x1, f_3x3_r, f_3x3, f_5x5_r, f_5x5, f_pool_proj):
-        super(InceptionModule, self).__init__()
-        self.conv1 = ConvBlock(curr_in_fts, f_1x1, 1, 1, 0)
-        self.conv2 = ReduceConvBlock(curr_in_fts, f_3x3_r, f_3x3, 3, 1)
-        self.conv3 = ReduceConvBlock(curr_in_fts, f_5x5_r, f_5x5, 5, 2)
-
-        self.pool_proj = nn.Sequential(
-            nn.MaxPool2d(kernel_size=(1, 1), stride=(1, 1)),
-            nn.Conv2d(in_channels=curr_in_fts, out_channels=f_pool_proj, kernel_size=(1, 1), stride=(1, 1)),
-            nn.ReLU()
-        )
-    def forward(self, input_img):
-        out1 = self.conv1(input_img)
-        out2 = self.conv2(input_img)
-        out3 = self.conv3(input_img)
-        out4 = self.pool_proj(input_img)
-        x = torch.cat([out1, out2, out3, out4], dim=1)
-        return x
-
-class GoogleNet(nn.Module):
-    def __init__(self, in_fts=1, num_class=10):
-        super(GoogleNet, self).__init__()
-        self.conv1 = ConvBlock(in_fts, 64, 7, 2, 3)
-        self.maxpool1 = nn.MaxPool2d(kernel_size=(3, 3), stride=(2, 2), padding=(1, 1))
-        self.conv2 = nn.Sequential(
-            ConvBlock(64, 64, 1, 1, 0),
-            ConvBlock(64, 192, 3, 1, 1)
-        )
-
-        self.inception_3a = InceptionModule(192, 64, 96, 128, 16, 32, 32)
-        self.inception_3b = InceptionModule(256, 128, 128, 192, 32, 96, 64)
-        self.inception_4a = InceptionModule(480, 192, 96, 208, 16, 48, 64)
-        self.inception_4b = InceptionModule(512, 160, 112, 224, 24, 64, 64)
-        self.inception_4c = InceptionModule(512, 128, 128, 256, 24, 64, 64)
-        self.inception_4d = InceptionModule(512, 112, 144, 288, 32, 64, 64)
-        self.inception_4e = InceptionModule(528, 256, 160, 320, 32, 128, 128)
-        self.inception_5a = InceptionModule(832, 256, 160, 320, 32, 128, 128)
-        self.inception_5b = InceptionModule(832, 384, 192, 384, 48, 128, 128)
-
-        self.aux_classifier1 = AuxClassifier(512, num_class)
-        self.aux_classifier2 = AuxClassifier(528, num_class)
-        self.avgpool = nn.AdaptiveAvgPool2d(output_size=(7, 7))
-        self.classifier = nn.Sequential(
-            nn.Dropout(p=0.4),
-            nn.Linear(1024 * 7 * 7, num_class)
-        )
-
-    def forward(self, input_img):
-        N = input_img.shape[0]
-        x = self.conv1(input_img)
-        x = self.maxpool1(x)
-        x = self.conv2(x)
-        x = self.maxpool1(x)
-        x = self.inception_3a(x)
-        x = self.inception_3b(x)
-        x = self.maxpool1(x)
-        x = self.inception_4a(x)
-        out1 = self.aux_classifier1(x)
-        x = self.inception_4b(x)
-        x = self.inception_4c(x)
-        x = self.inception_4d(x)
-        out2 = self.aux_classifier2(x)
-        x = self.inception_4e(x)
-        x = self.maxpool1(x)
-        x = self.inception_5a(x)
-        x = self.inception_5b(x)
-        x = self.avgpool(x)        
-        x = x.reshape(N, -1)
-        x = self.classifier(x)
-        return x
-
-    
 torch.manual_seed(RANDOM_SEED)
 
-"""##### **GoogLeNet**"""
-
-def init_weights(m):
-    if isinstance(m, torch.torch.nn.Conv2d) or isinstance(m, torch.torch.nn.Linear):
-        torch.nn.init.kaiming_uniform_(m.weight, mode='fan_in', nonlinearity='relu')
-        if m.bias is not None:
-            m.bias.detach().zero_()
-
-def accuracy(model, data_loader, device):
-    with torch.no_grad():
-        correct_predictions, counter = 0, 0
-        for _, (img, label) in enumerate(data_loader):
-            img = img.to(device)
-            label = label.float().to(device)
-            logits = model(img)
-            _, predicted_label = torch.max(logits, 1)
-            counter += label.size(0)
-            correct_predictions += (predicted_label == label).sum()
-    return correct_predictions.float()/counter * 100
-
 """#### **4.Train and Logging**"""
 
 DEVICE = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
-model = GoogleNet(1,10)
+model = GoogleNet(1,10, head='avg')
 model.apply(init_weights)
 optimizer = torch.optim.Adam(model.parameters(), lr=LEARNING_RATE)
 model = model.to(DEVICE)
+augment = augment.to(DEVICE)
 summary(model,(1,224,224))
 
-def train(model, num_epochs, train_loader,valid_loader, test_loader, optimizer):
-    start_time = time.time()
-    for epoch in range(num_epochs):
-        model.train()
-        for batch_idx, (features, targets) in tqdm(enumerate(train_loader), total= len(train_loader)):
-            features = features.to(DEVICE)
-            targets = targets.to(DEVICE)
-            logits = model(features)
-            loss = torch.nn.functional.cross_entropy(logits, targets)
-            optimizer.zero_grad()
-            loss.backward()
-            optimizer.step()
-        model.eval()
-        with torch.no_grad():
-            train_acc = accuracy(model, train_loader, device=DEVICE)
-            valid_acc = accuracy(model, valid_loader, device=DEVICE)
-            print(f'Epoch: {epoch+1:03d}/{num_epochs:03d} '
-                  f'| Train: {train_acc :.2f}% '
-                  f'| Validation: {valid_acc :.2f}%')
-        elapsed = (time.time() - start_time)/60
-        print(f'Time elapsed: {elapsed:.2f} min')        
-    elapsed = (time.time() - start_time)/60
-    print(f'Total Training Time: {elapsed:.2f} min')
-    test_acc = accuracy(model, test_loader, device=DEVICE)
-    print(f'Test accuracy {test_acc :.2f}%')
-
 train(model= model,
       num_epochs = NUM_EPOCHS,
       train_loader= train_loader,
       valid_loader = val_loader,
       test_loader = test_loader,
-      optimizer = optimizer)
+      optimizer = optimizer,
+      device = DEVICE,
+      augment = augment)
 
 """#### **5.Evaluation**"""
 
-def get_prediction(x, model):
-    model.to('cpu') # prepares model for predicting
-    probabilities = torch.softmax(model(x), dim=1)
-    predicted_class = torch.argmax(probabilities, dim=1)
-    return predicted_class, probabilities
-
-true_y, pred_y = [], []
-for batch in tqdm(iter(test_loader), total=len(test_loader)):
-    x, y = batch
-    true_y.extend(y)
-    #print(type(x))
-    preds, probs = get_prediction(x, model)
-    pred_y.extend(preds.cpu())
+metrics = evaluate(model, test_loader, DEVICE, NUM_CLASSES, augment)
 
-print(classification_report(true_y, pred_y, digits=3))
+print(metrics.report(digits=3))
 
 features, targets = next(iter(test_loader))    
 nhwc_img = np.transpose(features[3], axes=(1, 2, 0))
 nhw_img = np.squeeze(nhwc_img.numpy(), axis=2)
 plt.imshow(nhw_img, cmap='Greys')
 
-predicted, probability = get_prediction(features[3, None], model)
+predicted, probability = get_prediction(features[3, None], model, augment)
 print('Predicted:', predicted)
 print('Probability:', probability[0][predicted]*100)
 
-import itertools
-
-def plot_confusion_matrix(cm, classes, normalize=False, title='Confusion matrix', cmap=plt.cm.YlGnBu):
-    fig, ax = plt.subplots(figsize=(16,16))
-    if normalize:
-        cm = cm.astype('float') / cm.sum(axis=1)[:, np.newaxis]
-        print("Normalized confusion matrix")
-    else:
-        print('Confusion matrix, without normalization')
-
-    print(cm)
-    plt.imshow(cm, interpolation='nearest', cmap=cmap)
-    plt.title(title)
-    plt.colorbar()
-    tick_marks = np.arange(len(classes))
-    plt.xticks(tick_marks, classes, rotation=0)
-    plt.yticks(tick_marks, classes)
-
-    fmt = '.2f' if normalize else 'd'
-    thresh = cm.max() / 2.
-    for i, j in itertools.product(range(cm.shape[0]), range(cm.shape[1])):
-        plt.text(j, i, format(cm[i, j], fmt), horizontalalignment="center", color="white" if cm[i, j] > thresh else "black")
-
-    plt.tight_layout()
-    plt.ylabel('True label')
-    plt.xlabel('Predicted label')
-
-cm = confusion_matrix(true_y, pred_y)
+cm = metrics.matrix
 labels = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9']
 plot_confusion_matrix(cm,labels)
 
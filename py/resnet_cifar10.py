@@ -9,22 +9,25 @@ Original file is located at
 
 import torch
 print(torch.__version__)
-from torch import nn
-from torch.utils.data import DataLoader
 from torchvision import transforms
-import time
 import numpy as np
 from torchvision.datasets import CIFAR10
 from torchvision.transforms import ToTensor
 
-import torch.nn.functional as F
 import torchvision
 from torchvision import datasets
 import matplotlib.pyplot as plt
 from tqdm.autonotebook import tqdm
-from sklearn.metrics import classification_report, confusion_matrix
 from torchsummary import summary
 
+from deepmodels.augment import BatchAugment
+from deepmodels.cache import cached_dataset, split_dataset
+from deepmodels.engine import get_prediction, init_weights, train
+from deepmodels.loaders import make_loader
+from deepmodels.metrics import evaluate
+from deepmodels.models import BasicBlock, ResNet
+from deepmodels.plots import plot_confusion_matrix
+
 # Hyperparameters
 RANDOM_SEED = 42
 LEARNING_RATE = 1e-3
@@ -41,38 +44,23 @@ GRAYSCALE = False
 
 torch.manual_seed(RANDOM_SEED)
 
-transform_train = transforms.Compose([
-    transforms.ToTensor(),
-    ])
-
-transform_test = transforms.Compose([
-    transforms.ToTensor(),
-    ])
+# Images are cached once as uint8 at their native resolution (deepmodels/cache.py), the
+# resize / rotation / normalization run batched on DEVICE inside train (deepmodels/augment.py)
+augment = BatchAugment(seed=RANDOM_SEED)
 
+train_ds = cached_dataset(datasets.CIFAR10, root='data', train=True, raw=True, download=True)
+train_set, val_set = split_dataset(train_ds, [45000, 5000], 'cifar10', root='data', seed=RANDOM_SEED)
 
-train_ds = datasets.CIFAR10(root='data', 
-                               train=True, 
-                               transform=transform_train,
-                               download=True)
-train_set, val_set = torch.utils.data.random_split(train_ds, [45000, 5000])
+test_ds = cached_dataset(datasets.CIFAR10, root='data', train=False, raw=True)
 
-test_ds = datasets.CIFAR10(root='data', 
-                              train=False, 
-                              transform=transform_test)
 
+# worker count / prefetch are benchmarked once per machine (deepmodels/loaders.py)
+train_loader = make_loader(train_set, batch_size=BATCH_SIZE, shuffle=True)
 
-train_loader = DataLoader(dataset=train_set,
-                          batch_size=BATCH_SIZE,
-                      shuffle = True)
 
+val_loader = make_loader(val_set, batch_size=BATCH_SIZE, shuffle=False)
 
-val_loader = DataLoader(dataset=val_set,
-                          batch_size=BATCH_SIZE,
-                      shuffle = False)
-
-test_loader = DataLoader(dataset=test_ds,
-                     batch_size=BATCH_SIZE,
-                     shuffle = False)
+test_loader = make_loader(test_ds, batch_size=BATCH_SIZE, shuffle=False)
 
 # Checking the dataset
 images, labels = next(iter(train_loader))  
@@ -85,210 +73,36 @@ plt.figure(figsize=(16,8))
 plt.axis('off')
 plt.imshow(torchvision.utils.make_grid(images, nrow=16).permute((1, 2, 0)))
 
-class BasicBlock(nn.Module):
-    expansion = 1
-
-    def __init__(self, in_planes, planes, stride=1):
-        super(BasicBlock, self).__init__()
-        self.conv1 = nn.Conv2d(
-            in_planes, planes, kernel_size=3, stride=stride, padding=1, bias=False)
-        self.bn1 = nn.BatchNorm2d(planes)
-        self.conv2 = nn.Conv2d(planes, planes, kernel_size=3,
-                               stride=1, padding=1, bias=False)
-        self.bn2 = nn.BatchNorm2d(planes)
-
-        self.shortcut = nn.Sequential()
-        if stride != 1 or in_planes != self.expansion*planes:
-            self.shortcut = nn.Sequential(
-                nn.Conv2d(in_planes, self.expansion*planes,
-                          kernel_size=1, stride=stride, bias=False),
-                nn.BatchNorm2d(self.expansion*planes)
-            )
-
-    def forward(self, x):
-        out = F.relu(self.bn1(self.conv1(x)))
-        out = self.bn2(self.conv2(out))
-        out += self.shortcut(x)
-        out = F.relu(out)
-        return out
-
-
-class Bottleneck(nn.Module):
-    expansion = 4
-
-    def __init__(self, in_planes, planes, stride=1):
-        super(Bottleneck, self).__init__()
-        self.conv1 = nn.Conv2d(in_planes, planes, kernel_size=1, bias=False)
-        self.bn1 = nn.BatchNorm2d(planes)
-        self.conv2 = nn.Conv2d(planes, planes, kernel_size=3,
-                               stride=stride, padding=1, bias=False)
-        self.bn2 = nn.BatchNorm2d(planes)
-        self.conv3 = nn.Conv2d(planes, self.expansion *
-                               planes, kernel_size=1, bias=False)
-        self.bn3 = nn.BatchNorm2d(self.expansion*planes)
-
-        self.shortcut = nn.Sequential()
-        if stride != 1 or in_planes != self.expansion*planes:
-            self.shortcut = nn.Sequential(
-                nn.Conv2d(in_planes, self.expansion*planes,
-                          kernel_size=1, stride=stride, bias=False),
-                nn.BatchNorm2d(self.expansion*planes)
-            )
-
-    def forward(self, x):
-        out = F.relu(self.bn1(self.conv1(x)))
-        out = F.relu(self.bn2(self.conv2(out)))
-        out = self.bn3(self.conv3(out))
-        out += self.shortcut(x)
-        out = F.relu(out)
-        return out
-
-
-class ResNet(nn.Module):
-    def __init__(self, block, num_blocks, num_classes=10):
-        super(ResNet, self).__init__()
-        self.in_planes = 64
-
-        self.conv1 = nn.Conv2d(3, 64, kernel_size=3,
-                               stride=1, padding=1, bias=False)
-        self.bn1 = nn.BatchNorm2d(64)
-        self.layer1 = self._make_layer(block, 64, num_blocks[0], stride=1)
-        self.layer2 = self._make_layer(block, 128, num_blocks[1], stride=2)
-        self.layer3 = self._make_layer(block, 256, num_blocks[2], stride=2)
-        self.layer4 = self._make_layer(block, 512, num_blocks[3], stride=2)
-        self.linear = nn.Linear(512*block.expansion, num_classes)
-
-    def _make_layer(self, block, planes, num_blocks, stride):
-        strides = [stride] + [1]*(num_blocks-1)
-        layers = []
-        for stride in strides:
-            layers.append(block(self.in_planes, planes, stride))
-            self.in_planes = planes * block.expansion
-        return nn.Sequential(*layers)
-
-    def forward(self, x):
-        out = F.relu(self.bn1(self.conv1(x)))
-        out = self.layer1(out)
-        out = self.layer2(out)
-        out = self.layer3(out)
-        out = self.layer4(out)
-        out = F.avg_pool2d(out, 4)
-        out = out.view(out.size(0), -1)
-        out = self.linear(out)
-        # probas = F.softmax(out, dim=1)
-        return out
-
-def accuracy(model, data_loader, device):
-    with torch.no_grad():
-        correct_predictions, counter = 0, 0
-        for _, (img, label) in enumerate(data_loader):
-            img = img.to(device)
-            label = label.float().to(device)
-            logits = model(img)
-            _, predicted_label = torch.max(logits, 1)
-            counter += label.size(0)
-            correct_predictions += (predicted_label == label).sum()
-    return correct_predictions.float()/counter * 100
-
-def init_weights(m):
-    if isinstance(m, torch.torch.nn.Conv2d) or isinstance(m, torch.torch.nn.Linear):
-        torch.nn.init.kaiming_uniform_(m.weight, mode='fan_in', nonlinearity='relu')
-        if m.bias is not None:
-            m.bias.detach().zero_()
-
 DEVICE = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
 model = ResNet(BasicBlock, [2, 2, 2, 2])
 model.apply(init_weights)
 optimizer = torch.optim.Adam(model.parameters(), lr=LEARNING_RATE)
 model = model.to(DEVICE)
-
-def train(model, num_epochs, train_loader,valid_loader, test_loader, optimizer):
-    start_time = time.time()
-    for epoch in range(num_epochs):
-        model.train()
-        for batch_idx, (features, targets) in tqdm(enumerate(train_loader), total= len(train_loader)):
-            features = features.to(DEVICE)
-            targets = targets.to(DEVICE)
-            logits = model(features)
-            loss = torch.nn.functional.cross_entropy(logits, targets)
-            optimizer.zero_grad()
-            loss.backward()
-            optimizer.step()
-        model.eval()
-        with torch.no_grad():
-            train_acc = accuracy(model, train_loader, device=DEVICE)
-            valid_acc = accuracy(model, valid_loader, device=DEVICE)
-            print(f'Epoch: {epoch+1:03d}/{num_epochs:03d} '
-                  f'| Train: {train_acc :.2f}% '
-                  f'| Validation: {valid_acc :.2f}%')
-        elapsed = (time.time() - start_time)/60
-        print(f'Time elapsed: {elapsed:.2f} min')        
-    elapsed = (time.time() - start_time)/60
-    print(f'Total Training Time: {elapsed:.2f} min')
-    test_acc = accuracy(model, test_loader, device=DEVICE)
-    print(f'Test accuracy {test_acc :.2f}%')
+augment = augment.to(DEVICE)
 
 train(model= model,
       num_epochs = NUM_EPOCHS,
       train_loader= train_loader,
       valid_loader = val_loader,
       test_loader = test_loader,
-      optimizer = optimizer)
-
-def get_prediction(x, model):
-    model.to('cpu') # prepares model for predicting
-    probabilities = torch.softmax(model(x), dim=1)
-    predicted_class = torch.argmax(probabilities, dim=1)
-    return predicted_class, probabilities
+      optimizer = optimizer,
+      device = DEVICE,
+      augment = augment)
 
-true_y, pred_y = [], []
-for batch in tqdm(iter(test_loader), total=len(test_loader)):
-    x, y = batch
-    true_y.extend(y)
-    #print(type(x))
-    preds, probs = get_prediction(x, model)
-    pred_y.extend(preds.cpu())
-
-print(classification_report(true_y, pred_y, digits=3))
+metrics = evaluate(model, test_loader, DEVICE, NUM_CLASSES, augment)
+print(metrics.report(digits=3))
 
 features, targets = next(iter(test_loader))    
 nhwc_img = np.transpose(features[3], axes=(1, 2, 0))
 # nhw_img = np.squeeze(nhwc_img.numpy(), axis=2)
 plt.imshow(nhwc_img, cmap='Greys')
 
-predicted, probability = get_prediction(features[3, None], model)
+predicted, probability = get_prediction(features[3, None], model, augment)
 classes = ['plane', 'car', 'bird', 'cat', 'deer', 'dog', 'frog', 'horse', 'ship', 'truck']
 print('Predicted: {}'.format(classes[predicted[0]]), predicted)
 print('Probability:', probability[0][predicted]*100)
 
-import itertools
-
-def plot_confusion_matrix(cm, classes, normalize=False, title='Confusion matrix', cmap=plt.cm.YlGnBu):
-    fig, ax = plt.subplots(figsize=(16,16))
-    if normalize:
-        cm = cm.astype('float') / cm.sum(axis=1)[:, np.newaxis]
-        print("Normalized confusion matrix")
-    else:
-        print('Confusion matrix, without normalization')
-
-    print(cm)
-    plt.imshow(cm, interpolation='nearest', cmap=cmap)
-    plt.title(title)
-    plt.colorbar()
-    tick_marks = np.arange(len(classes))
-    plt.xticks(tick_marks, classes, rotation=0)
-    plt.yticks(tick_marks, classes)
-
-    fmt = '.2f' if normalize else 'd'
-    thresh = cm.max() / 2.
-    for i, j in itertools.product(range(cm.shape[0]), range(cm.shape[1])):
-        plt.text(j, i, format(cm[i, j], fmt), horizontalalignment="center", color="white" if cm[i, j] > thresh else "black")
-
-    plt.tight_layout()
-    plt.ylabel('True label')
-    plt.xlabel('Predicted label')
-
-cm = confusion_matrix(true_y, pred_y)
+cm = metrics.matrix
 classes = ['plane', 'car', 'bird', 'cat', 'deer', 'dog', 'frog', 'horse', 'ship', 'truck']
 plot_confusion_matrix(cm,classes)
 
@@ -9,22 +9,25 @@ Original file is located at
 
 import torch
 print(torch.__version__)
-from torch import nn
-from torch.utils.data import DataLoader
 from torchvision import transforms
-import time
 import numpy as np
 from torchvision.datasets import MNIST
 from torchvision.transforms import ToTensor
 
-import torch.nn.functional as F
 
 from torchvision import datasets
 import matplotlib.pyplot as plt
 from tqdm.autonotebook import tqdm
-from sklearn.metrics import classification_report, confusion_matrix
 from torchsummary import summary
 
+from deepmodels.augment import BatchAugment
+from deepmodels.cache import cached_dataset, split_dataset
+from deepmodels.engine import get_prediction, init_weights, train
+from deepmodels.loaders import make_loader
+from deepmodels.metrics import evaluate
+from deepmodels.models import resNet
+from deepmodels.plots import plot_confusion_matrix
+
 # Hyperparameters
 RANDOM_SEED = 42
 LEARNING_RATE = 1e-3
@@ -41,38 +44,23 @@ GRAYSCALE = True
 
 torch.manual_seed(RANDOM_SEED)
 
-transform_train = transforms.Compose([
-    transforms.ToTensor(),
-    ])
-
-transform_test = transforms.Compose([
-    transforms.ToTensor(),
-    ])
+# Images are cached once as uint8 at their native resolution (deepmodels/cache.py), the
+# resize / rotation / normalization run batched on DEVICE inside train (deepmodels/augment.py)
+augment = BatchAugment(seed=RANDOM_SEED)
 
+train_ds = cached_dataset(datasets.MNIST, root='data', train=True, raw=True, download=True)
+train_set, val_set = split_dataset(train_ds, [50000, 10000], 'mnist', root='data', seed=RANDOM_SEED)
 
-train_ds = datasets.MNIST(root='data', 
-                               train=True, 
-                               transform=transform_train,
-                               download=True)
-train_set, val_set = torch.utils.data.random_split(train_ds, [50000, 10000])
+test_ds = cached_dataset(datasets.MNIST, root='data', train=False, raw=True)
 
-test_ds = datasets.MNIST(root='data', 
-                              train=False, 
-                              transform=transform_test)
 
+# worker count / prefetch are benchmarked once per machine (deepmodels/loaders.py)
+train_loader = make_loader(train_set, batch_size=BATCH_SIZE, shuffle=True)
 
-train_loader = DataLoader(dataset=train_set,
-                          batch_size=BATCH_SIZE,
-                      shuffle = True)
 
+val_loader = make_loader(val_set, batch_size=BATCH_SIZE, shuffle=False)
 
-val_loader = DataLoader(dataset=val_set,
-                          batch_size=BATCH_SIZE,
-                      shuffle = False)
-
-test_loader = DataLoader(dataset=test_ds,
-                     batch_size=BATCH_SIZE,
-                     shuffle = False)
+test_loader = make_loader(test_ds, batch_size=BATCH_SIZE, shuffle=False)
 
 # Checking the dataset
 images, labels = next(iter(train_loader))  
@@ -88,196 +76,35 @@ for index in range(25):
     ax[index//5][index%5].imshow(features[index].numpy().squeeze(axis=0), cmap='Greys')
     ax[index//5][index%5].axis('off')
 
-class Block(torch.nn.Module):
-    def __init__(self, in_channels, out_channels, identity_downsample=None, stride=1):
-        super(Block, self).__init__()
-        self.expansion = 4
-        self.conv1 = torch.nn.Conv2d(in_channels, out_channels, kernel_size=1, stride=1, padding=0)
-        self.bn1 = torch.nn.BatchNorm2d(out_channels)
-        self.conv2 = torch.nn.Conv2d(out_channels, out_channels, kernel_size=3, stride=stride, padding=1)
-        self.bn2 = torch.nn.BatchNorm2d(out_channels)
-        self.conv3 = torch.nn.Conv2d(out_channels, out_channels * self.expansion, kernel_size=1, stride=1, padding=0)
-        self.bn3 = torch.nn.BatchNorm2d(out_channels * self.expansion)
-        self.relu = torch.nn.ReLU()
-        self.identity_downsample = identity_downsample
-
-    def forward(self, x):
-        identity = x
-        x = self.conv1(x)
-        x = self.bn1(x)
-        x = self.relu(x)
-        x = self.conv2(x)
-        x = self.bn2(x)
-        x = self.relu(x)
-        x = self.conv3(x)
-        x = self.bn3(x)
-
-        if self.identity_downsample is not None:
-            identity = self.identity_downsample(identity)
-
-        x += identity
-        x = self.relu(x)
-        return x
-
-
-class resNet(torch.nn.Module):
-    def __init__(self, num_classes):
-        super(resNet, self).__init__()
-
-        self.in_channels = 64
-        self.expansion = 4
-        self.conv1 = torch.nn.Conv2d(1, 64, kernel_size=7, stride=2, padding=3)
-        self.bn1 = torch.nn.BatchNorm2d(64)
-        self.relu = torch.nn.ReLU()
-        self.maxpool = torch.nn.MaxPool2d(kernel_size=3, stride=2, padding=1)
-
-        # ResNetLayers
-        self.layer1 = self.make_layers(num_layers=3, channels=64, stride=1)
-        self.layer2 = self.make_layers(num_layers=4, channels=128, stride=2)
-        self.layer3 = self.make_layers(num_layers=6, channels=256, stride=2)
-        self.layer4 = self.make_layers(num_layers=3, channels=512, stride=2)
-
-        self.avgpool = torch.nn.AdaptiveAvgPool2d((1, 1))
-        self.fc = torch.nn.Linear(512 * self.expansion, num_classes)
-
-    def forward(self, x):
-        x = self.conv1(x)
-        x = self.bn1(x)
-        x = self.relu(x)
-        x = self.maxpool(x)
-
-        x = self.layer1(x)
-        x = self.layer2(x)
-        x = self.layer3(x)
-        x = self.layer4(x)
-
-        x = self.avgpool(x)
-        x = x.reshape(x.shape[0], -1)
-        x = self.fc(x)
-        return x
-
-    def make_layers(self, num_layers, channels, stride):
-        layers = []
-        identity_downsample = torch.nn.Sequential(
-            torch.nn.Conv2d(self.in_channels, channels*self.expansion, kernel_size=1, stride=stride),
-            torch.nn.BatchNorm2d(channels*self.expansion)
-            )
-        layers.append(Block(self.in_channels, channels, identity_downsample, stride))
-        self.in_channels = channels * self.expansion
-        for _ in range(num_layers-1):
-            layers.append(Block(self.in_channels, channels))
-        return torch.nn.Sequential(*layers)
-
-def accuracy(model, data_loader, device):
-    with torch.no_grad():
-        correct_predictions, counter = 0, 0
-        for _, (img, label) in enumerate(data_loader):
-            img = img.to(device)
-            label = label.float().to(device)
-            logits = model(img)
-            _, predicted_label = torch.max(logits, 1)
-            counter += label.size(0)
-            correct_predictions += (predicted_label == label).sum()
-    return correct_predictions.float()/counter * 100
-
-def init_weights(m):
-    if isinstance(m, torch.torch.nn.Conv2d) or isinstance(m, torch.torch.nn.Linear):
-        torch.nn.init.kaiming_uniform_(m.weight, mode='fan_in', nonlinearity='relu')
-        if m.bias is not None:
-            m.bias.detach().zero_()
-
 DEVICE = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
 model = resNet(10)
 model.apply(init_weights)
 optimizer = torch.optim.Adam(model.parameters(), lr=LEARNING_RATE)
 model = model.to(DEVICE)
-
-def train(model, num_epochs, train_loader,valid_loader, test_loader, optimizer):
-    start_time = time.time()
-    for epoch in range(num_epochs):
-        model.train()
-        for batch_idx, (features, targets) in tqdm(enumerate(train_loader), total= len(train_loader)):
-            features = features.to(DEVICE)
-            targets = targets.to(DEVICE)
-            logits = model(features)
-            loss = torch.nn.functional.cross_entropy(logits, targets)
-            optimizer.zero_grad()
-            loss.backward()
-            optimizer.step()
-        model.eval()
-        with torch.no_grad():
-            train_acc = accuracy(model, train_loader, device=DEVICE)
-            valid_acc = accuracy(model, valid_loader, device=DEVICE)
-            print(f'Epoch: {epoch+1:03d}/{num_epochs:03d} '
-                  f'| Train: {train_acc :.2f}% '
-                  f'| Validation: {valid_acc :.2f}%')
-        elapsed = (time.time() - start_time)/60
-        print(f'Time elapsed: {elapsed:.2f} min')        
-    elapsed = (time.time() - start_time)/60
-    print(f'Total Training Time: {elapsed:.2f} min')
-    test_acc = accuracy(model, test_loader, device=DEVICE)
-    print(f'Test accuracy {test_acc :.2f}%')
+augment = augment.to(DEVICE)
 
 train(model= model,
       num_epochs = NUM_EPOCHS,
       train_loader= train_loader,
       valid_loader = val_loader,
       test_loader = test_loader,
-      optimizer = optimizer)
-
-def get_prediction(x, model):
-    model.to('cpu') # prepares model for predicting
-    probabilities = torch.softmax(model(x), dim=1)
-    predicted_class = torch.argmax(probabilities, dim=1)
-    return predicted_class, probabilities
+      optimizer = optimizer,
+      device = DEVICE,
+      augment = augment)
 
-true_y, pred_y = [], []
-for batch in tqdm(iter(test_loader), total=len(test_loader)):
-    x, y = batch
-    true_y.extend(y)
-    #print(type(x))
-    preds, probs = get_prediction(x, model)
-    pred_y.extend(preds.cpu())
-
-print(classification_report(true_y, pred_y, digits=3))
+metrics = evaluate(model, test_loader, DEVICE, NUM_CLASSES, augment)
+print(metrics.report(digits=3))
 
 features, targets = next(iter(test_loader))    
 nhwc_img = np.transpose(features[3], axes=(1, 2, 0))
 nhw_img = np.squeeze(nhwc_img.numpy(), axis=2)
 plt.imshow(nhw_img, cmap='Greys')
 
-predicted, probability = get_prediction(features[3, None], model)
+predicted, probability = get_prediction(features[3, None], model, augment)
 print('Predicted:', predicted)
 print('Probability:', probability[0][predicted]*100)
 
-import itertools
-
-def plot_confusion_matrix(cm, classes, normalize=False, title='Confusion matrix', cmap=plt.cm.YlGnBu):
-    fig, ax = plt.subplots(figsize=(16,16))
-    if normalize:
-        cm = cm.astype('float') / cm.sum(axis=1)[:, np.newaxis]
-        print("Normalized confusion matrix")
-    else:
-        print('Confusion matrix, without normalization')
-
-    print(cm)
-    plt.imshow(cm, interpolation='nearest', cmap=cmap)
-    plt.title(title)
-    plt.colorbar()
-    tick_marks = np.arange(len(classes))
-    plt.xticks(tick_marks, classes, rotation=0)
-    plt.yticks(tick_marks, classes)
-
-    fmt = '.2f' if normalize else 'd'
-    thresh = cm.max() / 2.
-    for i, j in itertools.product(range(cm.shape[0]), range(cm.shape[1])):
-        plt.text(j, i, format(cm[i, j], fmt), horizontalalignment="center", color="white" if cm[i, j] > thresh else "black")
-
-    plt.tight_layout()
-    plt.ylabel('True label')
-    plt.xlabel('Predicted label')
-
-cm = confusion_matrix(true_y, pred_y)
+cm = metrics.matrix
 labels = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9']
 plot_confusion_matrix(cm,labels)
 
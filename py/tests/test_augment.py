@@ -0,0 +1,23 @@
+import math
+
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from deepmodels.augment import BatchAugment  # noqa: E402
+
+
+def test_resize_keeps_the_border():
+    white = torch.full((2, 1, 28, 28), 255, dtype=torch.uint8)
+    augment = BatchAugment(size=224).eval()
+    assert torch.allclose(augment(white), torch.ones(2, 1, 224, 224))
+
+
+def test_rotation_fills_with_zeros():
+    white = torch.full((2, 1, 28, 28), 255, dtype=torch.uint8)
+    augment = BatchAugment(size=224, degrees=45).train()
+    augment._angles = lambda n, step: torch.full((n,), math.pi / 4)
+    out = augment(white)
+    assert out.shape == (2, 1, 224, 224)
+    assert out[:, :, 0, 0].max() < 0.5
+    assert torch.allclose(out[:, :, 112, 112], torch.ones(2, 1))
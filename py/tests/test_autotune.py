@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from deepmodels import loaders  # noqa: E402
+from deepmodels.loaders import make_loader, time_setting  # noqa: E402
+
+
+@pytest.fixture
+def tuning(tmp_path, monkeypatch):
+    monkeypatch.setattr(loaders, 'TUNING_FILE', str(tmp_path / 'loader_tuning.json'))
+    calls = []
+
+    def autotune(dataset, batch_size, **kwargs):
+        calls.append(batch_size)
+        return {'num_workers': 2, 'prefetch_factor': 4}
+    monkeypatch.setattr(loaders, 'autotune', autotune)
+    return calls
+
+
+@pytest.fixture
+def dataset():
+    return torch.utils.data.TensorDataset(torch.arange(64).float())
+
+
+def test_tuned_once_then_read_back(tuning, dataset):
+    loader = make_loader(dataset, batch_size=8)
+    assert (loader.num_workers, loader.prefetch_factor) == (2, 4)
+    assert make_loader(dataset, batch_size=8).num_workers == 2
+    assert tuning == [8]
+    with open(loaders.TUNING_FILE) as f:
+        assert list(json.load(f).values()) == [{'num_workers': 2, 'prefetch_factor': 4}]
+
+
+def test_batch_size_is_part_of_the_key(tuning, dataset):
+    make_loader(dataset, batch_size=8)
+    make_loader(dataset, batch_size=16)
+    assert tuning == [8, 16]
+
+
+def test_explicit_workers_skip_tuning(tuning, dataset):
+    loader = make_loader(dataset, batch_size=8, num_workers=0)
+    assert loader.num_workers == 0
+    assert tuning == []
+
+
+def test_time_setting_in_the_main_process(dataset):
+    assert time_setting(dataset, 8, {'num_workers': 0, 'prefetch_factor': None}, num_batches=3) >= 0
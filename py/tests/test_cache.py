@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+torch = pytest.importorskip('torch')
+Image = pytest.importorskip('PIL.Image')
+
+from deepmodels.augment import BatchAugment  # noqa: E402
+from deepmodels.cache import cached_dataset, split_dataset, split_indices, split_path  # noqa: E402
+
+
+class TinyDigits:
+    """A torchvision-style dataset of 28x28 grayscale PIL images."""
+
+    def __init__(self, root, train, download=False):
+        self.images = [Image.new('L', (28, 28), value) for value in range(0, 200, 20)]
+
+    def __len__(self):
+        return len(self.images)
+
+    def __getitem__(self, index):
+        return self.images[index], index % 3
+
+
+def test_cache_resizes_once(tmp_path):
+    native = cached_dataset(TinyDigits, str(tmp_path), train=True, raw=True)
+    resized = cached_dataset(TinyDigits, str(tmp_path), train=True, size=56, raw=True)
+    assert native[0][0].shape == (1, 28, 28)
+    assert resized[0][0].shape == (1, 56, 56)
+    assert resized[3][1] == 0
+    # the augmentation finds the batch at its target size and leaves the pixels alone
+    batch = torch.stack([resized[i][0] for i in range(4)])
+    assert torch.allclose(BatchAugment(size=56).eval()(batch), batch.float() / 255)
+
+
+def test_split_is_stored_and_reused(tmp_path):
+    root = str(tmp_path)
+    train, val = split_indices(root, 'digits', [7, 3], seed=1)
+    assert sorted(train.tolist() + val.tolist()) == list(range(10))
+    assert os.path.exists(split_path(root, 'digits', [7, 3], 1))
+    again = split_indices(root, 'digits', [7, 3], seed=1)
+    assert [a.tolist() for a in again] == [train.tolist(), val.tolist()]
+    other = split_indices(root, 'digits', [7, 3], seed=2)
+    assert [a.tolist() for a in other] != [train.tolist(), val.tolist()]
+
+
+def test_split_does_not_depend_on_the_global_rng(tmp_path):
+    torch.manual_seed(0)
+    first = split_indices(str(tmp_path / 'a'), 'digits', [7, 3], seed=1)
+    torch.manual_seed(1)
+    second = split_indices(str(tmp_path / 'b'), 'digits', [7, 3], seed=1)
+    assert [a.tolist() for a in first] == [b.tolist() for b in second]
+
+
+def test_split_dataset(tmp_path):
+    dataset = cached_dataset(TinyDigits, str(tmp_path), train=True, raw=True)
+    train_set, val_set = split_dataset(dataset, [7, 3], 'digits', root=str(tmp_path))
+    assert (len(train_set), len(val_set)) == (7, 3)
+    assert not set(train_set.indices) & set(val_set.indices)
+    with pytest.raises(ValueError):
+        split_dataset(dataset, [6, 3], 'digits', root=str(tmp_path))
+
+
+def test_stale_split_file_is_rejected(tmp_path):
+    split_indices(str(tmp_path), 'digits', [7, 3], seed=0)
+    np.save(split_path(str(tmp_path), 'digits', [7, 3], 0), np.arange(9))
+    with pytest.raises(ValueError):
+        split_indices(str(tmp_path), 'digits', [7, 3], seed=0)
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from deepmodels.checkpoint import CheckpointManager  # noqa: E402
+from deepmodels.engine import train  # noqa: E402
+from deepmodels.loaders import ResumableSampler  # noqa: E402
+
+
+def make_run(seed=0):
+    torch.manual_seed(seed)
+    # dropout makes the result depend on the torch RNG
+    model = torch.nn.Sequential(torch.nn.Linear(8, 16), torch.nn.ReLU(), torch.nn.Dropout(0.5),
+                                torch.nn.Linear(16, 3))
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+    generator = torch.Generator().manual_seed(1)
+    data = torch.utils.data.TensorDataset(torch.randn(40, 8, generator=generator),
+                                          torch.randint(0, 3, (40,), generator=generator))
+    train_loader = torch.utils.data.DataLoader(data, batch_size=4, sampler=ResumableSampler(data, seed=2))
+    valid_loader = torch.utils.data.DataLoader(data, batch_size=8)
+    return model, optimizer, train_loader, valid_loader
+
+
+def run(checkpoint_dir, resume=None, seed=0):
+    model, optimizer, train_loader, valid_loader = make_run(seed)
+    checkpoints = CheckpointManager(checkpoint_dir, keep=100)
+    train(model, 2, train_loader, valid_loader, valid_loader, optimizer, 'cpu',
+          checkpoints=checkpoints, checkpoint_every=3, resume=resume)
+    checkpoints.close()
+    return model.state_dict(), checkpoints
+
+
+@pytest.mark.parametrize('name', ['checkpoint-e0000-b000006.pt', 'checkpoint-e0001-b000000.pt',
+                                  'checkpoint-e0001-b000003.pt'])
+def test_resume_reproduces_the_run(tmp_path, name):
+    expected, checkpoints = run(str(tmp_path / 'full'))
+    resume = checkpoints.load(os.path.join(checkpoints.directory, name))
+    # a different seed: everything the rest of the run depends on has to come from the checkpoint
+    resumed, _ = run(str(tmp_path / 'resumed'), resume=resume, seed=123)
+    for key in expected:
+        assert torch.equal(resumed[key], expected[key]), key
+
+
+def test_keep_must_be_positive(tmp_path):
+    with pytest.raises(ValueError):
+        CheckpointManager(str(tmp_path), keep=0)
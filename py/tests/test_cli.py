@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip('torch')
+
+from deepmodels.cli import build_parser, main, resolve  # noqa: E402
+
+
+def test_head_is_rejected_for_resnet():
+    with pytest.raises(SystemExit) as exc:
+        main(['train', '--model', 'resnet18', '--dataset', 'cifar10', '--head', 'avg'])
+    assert '--head is not supported by resnet18' in str(exc.value)
+
+
+@pytest.mark.parametrize('model', ['vgg16', 'googlenet'])
+def test_head_reaches_the_builder(model):
+    args = resolve(build_parser().parse_args(['train', '--model', model, '--dataset', 'mnist', '--head', 'max']))
+    assert args.model_kwargs['head'] == 'max'
@@ -0,0 +1,26 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from deepmodels.compiled import script_model  # noqa: E402
+from deepmodels.models import VGG  # noqa: E402
+
+
+@pytest.mark.parametrize('first, second', [
+    ({'head': 'avg'}, {'head': 'max'}),
+    ({'bn_before_relu': True}, {'bn_before_relu': False}),
+    ({'probas': False}, {'probas': True}),
+])
+def test_configs_sharing_a_cache_do_not_collide(tmp_path, first, second):
+    example = torch.randn(2, 1, 8, 8)
+    for config in (first, second):
+        torch.manual_seed(0)
+        model = VGG('VGG11', in_ch=1, image_size=8, **dict({'head': 'avg'}, **config)).eval()
+        scripted = script_model(model, example, cache_dir=str(tmp_path))
+        with torch.no_grad():
+            expected, got = model(example), scripted(example)
+        if config.get('probas'):
+            assert isinstance(got, tuple)
+            expected, got = expected[1], got[1]
+        assert torch.allclose(got, expected, atol=1e-5)
+    assert len(list((tmp_path / 'script').iterdir())) == 2
@@ -0,0 +1,48 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from deepmodels import distributed, loaders  # noqa: E402
+from deepmodels.loaders import ResumableSampler, candidate_settings, loader_signature  # noqa: E402
+
+
+def test_sampler_shards_cover_the_epoch():
+    data = list(range(10))
+    shards = [list(ResumableSampler(data, seed=3, num_replicas=3, rank=rank)) for rank in range(3)]
+    assert [len(shard) for shard in shards] == [4, 4, 4]
+    # padded with two indices from the start of the permutation, as DistributedSampler does
+    assert sorted(set(sum(shards, []))) == data
+
+
+def test_sampler_ranks_interleave_one_permutation():
+    data = list(range(12))
+    whole = list(ResumableSampler(data, seed=5, num_replicas=1, rank=0))
+    for rank in range(4):
+        assert list(ResumableSampler(data, seed=5, num_replicas=4, rank=rank)) == whole[rank::4]
+
+
+def test_sampler_resumes_and_changes_per_epoch():
+    data = list(range(20))
+    sampler = ResumableSampler(data, seed=0, num_replicas=2, rank=1)
+    sampler.set_epoch(1)
+    epoch = list(sampler)
+    sampler.set_epoch(1, start=4)
+    assert list(sampler) == epoch[4:]
+    assert len(sampler) == len(epoch) - 4
+    sampler.set_epoch(2)
+    assert list(sampler) != epoch
+
+
+def test_candidates_stop_at_max_workers():
+    assert max(s['num_workers'] for s in candidate_settings(3)) == 3
+    assert {s['num_workers'] for s in candidate_settings(1)} == {0, 1}
+
+
+def test_tuning_depends_on_processes_per_machine(monkeypatch):
+    data = torch.utils.data.TensorDataset(torch.zeros(8, 1))
+    alone = loader_signature(data, 4)
+    monkeypatch.setattr(distributed, 'get_world_size', lambda: 4)
+    monkeypatch.setattr(distributed, 'get_local_world_size', lambda: 4)
+    monkeypatch.setattr(loaders.os, 'cpu_count', lambda: 16)
+    assert loader_signature(data, 4) != alone
+    assert loaders.workers_per_process() == 4
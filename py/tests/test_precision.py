@@ -0,0 +1,23 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from deepmodels.precision import check_precision, grad_scaler  # noqa: E402
+
+
+def test_fp16_on_cpu_needs_a_cpu_grad_scaler(monkeypatch):
+    monkeypatch.delattr(torch.amp, 'GradScaler', raising=False)
+    with pytest.raises(ValueError, match='bf16'):
+        grad_scaler('cpu', 'fp16')
+    check_precision('cpu', 'bf16')
+    assert not grad_scaler('cpu', 'fp32').is_enabled()
+
+
+@pytest.mark.skipif(not hasattr(torch.amp, 'GradScaler'), reason='needs torch.amp.GradScaler')
+def test_fp16_on_cpu_scales_the_loss():
+    assert grad_scaler('cpu', 'fp16').is_enabled()
+
+
+def test_unknown_precision():
+    with pytest.raises(ValueError):
+        check_precision('cpu', 'fp8')
@@ -0,0 +1,44 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('PIL')
+
+from deepmodels.augment import BatchAugment  # noqa: E402
+from deepmodels.engine import predict  # noqa: E402
+from deepmodels.metrics import evaluate  # noqa: E402
+from deepmodels.shards import ShardDataset, ShardWriter, make_shard_loader  # noqa: E402
+
+
+@pytest.fixture
+def model():
+    torch.manual_seed(0)
+    return torch.nn.Sequential(torch.nn.Flatten(), torch.nn.Linear(8 * 8, 3))
+
+
+@pytest.fixture
+def images():
+    generator = torch.Generator().manual_seed(0)
+    return torch.randint(0, 256, (50, 1, 8, 8), dtype=torch.uint8, generator=generator), torch.arange(50) % 3
+
+
+def test_predict_on_a_shard_loader(tmp_path, model, images):
+    features, labels = images
+    with ShardWriter(str(tmp_path), in_channels=1, image_size=8, classes=[], shard_size=20) as writer:
+        for image, label in zip(features, labels.tolist()):
+            writer.write(image, label)
+    loader = make_shard_loader(ShardDataset(str(tmp_path), batch_size=16, shuffle=False, num_replicas=1, rank=0), 0)
+    augment = BatchAugment()
+    predictions, probabilities, targets = predict(model, loader, augment, with_targets=True)
+    assert probabilities.shape == (50, 3)
+    assert torch.equal(targets, labels)
+    expected = torch.softmax(model(features.float() / 255), dim=1)
+    assert torch.allclose(probabilities, expected, atol=1e-5)
+    assert torch.equal(predictions, expected.argmax(1))
+    assert evaluate(model, loader, 'cpu', 3, augment).compute()['total'] == 50
+
+
+def test_predict_on_a_map_style_loader(model, images):
+    loader = torch.utils.data.DataLoader(torch.utils.data.TensorDataset(*images), batch_size=16)
+    predictions, probabilities = predict(model, loader, BatchAugment())
+    assert probabilities.shape == (50, 3)
+    assert torch.equal(predictions, probabilities.argmax(1))
@@ -0,0 +1,35 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from deepmodels.augment import BatchAugment  # noqa: E402
+from deepmodels.models import build_model  # noqa: E402
+from deepmodels.quantize import model_size_mb, quantize, quantize_report, quantized_engine  # noqa: E402
+
+
+@pytest.fixture
+def loader():
+    generator = torch.Generator().manual_seed(0)
+    data = torch.utils.data.TensorDataset(torch.randint(0, 256, (16, 3, 32, 32), dtype=torch.uint8,
+                                                        generator=generator), torch.arange(16) % 10)
+    return torch.utils.data.DataLoader(data, batch_size=4)
+
+
+@pytest.mark.parametrize('name', ['resnet18', 'googlenet'])
+def test_quantize(loader, name):
+    try:
+        quantized_engine()
+    except RuntimeError:
+        pytest.skip('no quantized CPU engine')
+    torch.manual_seed(0)
+    model = build_model(name, image_size=32).eval()
+    augment = BatchAugment(mean=(0.5, 0.5, 0.5), std=(0.5, 0.5, 0.5))
+    quantized = quantize(model, loader, augment, num_batches=2)
+    features = augment.eval()(next(iter(loader))[0])
+    with torch.no_grad():
+        expected, actual = model(features), quantized(features)
+    assert actual.shape == expected.shape == (4, 10)
+    assert torch.isfinite(actual).all()
+    assert model_size_mb(quantized) < model_size_mb(model) / 2
+    rows = quantize_report({'fp32': model, 'int8': quantized}, loader, augment, iters=2)
+    assert [row['model'] for row in rows] == ['fp32', 'int8']
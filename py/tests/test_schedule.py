@@ -0,0 +1,58 @@
+import pytest
+
+from deepmodels.schedule import SCHEDULERS, EarlyStopping
+
+
+def test_early_stopping_counts_validations_without_improvement():
+    stopping = EarlyStopping(patience=2)
+    assert [stopping.step(v) for v in (50., 60., 55., 60.)] == [True, True, False, False]
+    assert stopping.should_stop
+    assert stopping.best == 60.
+
+
+def test_early_stopping_min_delta():
+    stopping = EarlyStopping(patience=1, min_delta=1.)
+    stopping.step(50.)
+    assert not stopping.step(50.5)
+    assert stopping.should_stop
+    stopping = EarlyStopping(patience=1, min_delta=1.)
+    stopping.step(50.)
+    assert stopping.step(51.5)
+    assert not stopping.should_stop
+
+
+def test_early_stopping_resumes_from_its_state():
+    stopping = EarlyStopping(patience=3)
+    for value in (70., 65., 66.):
+        stopping.step(value)
+    resumed = EarlyStopping(patience=3)
+    resumed.load_state_dict(stopping.state_dict())
+    resumed.step(69.)
+    assert resumed.should_stop
+
+
+@pytest.mark.parametrize('name, per_batch', [('plateau', False), ('onecycle', True)])
+def test_schedulers(name, per_batch):
+    torch = pytest.importorskip('torch')
+    from deepmodels.schedule import current_lr, make_scheduler, steps_per_batch
+
+    optimizer = torch.optim.SGD(torch.nn.Linear(2, 2).parameters(), lr=0.1)
+    scheduler = make_scheduler(name, optimizer, 0.1, epochs=2, steps_per_epoch=5, patience=0)
+    assert steps_per_batch(scheduler) is per_batch
+    if per_batch:
+        optimizer.step()
+        scheduler.step()
+        assert current_lr(optimizer) < 0.1
+    else:
+        scheduler.step(50.)
+        scheduler.step(40.)
+        assert current_lr(optimizer) == pytest.approx(0.01)
+
+
+def test_unknown_scheduler():
+    from deepmodels.schedule import make_scheduler
+
+    assert 'none' in SCHEDULERS
+    assert make_scheduler('none', None, 0.1, 1, 1) is None
+    with pytest.raises(ValueError):
+        make_scheduler('cosine', None, 0.1, 1, 1)
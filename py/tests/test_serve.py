@@ -0,0 +1,61 @@
+import io
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+torch = pytest.importorskip('torch')
+Image = pytest.importorskip('PIL.Image')
+
+from deepmodels.serve import DynamicBatcher, PredictionHandler  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    model = torch.nn.Sequential(torch.nn.Flatten(), torch.nn.Linear(8 * 8, 3))
+    batcher = DynamicBatcher(model, None, 'cpu', ['a', 'b', 'c'], max_latency_ms=1.)
+    handler = type('Handler', (PredictionHandler,), {'batcher': batcher, 'in_channels': 1, 'image_size': 8})
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+    batcher.close()
+
+
+def predict(url, query):
+    png = io.BytesIO()
+    Image.new('L', (8, 8), 128).save(png, format='PNG')
+    try:
+        with urllib.request.urlopen(f'{url}/predict{query}', data=png.getvalue()) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as error:
+        return error.code, json.load(error)
+
+
+@pytest.mark.parametrize('query, count', [('', 3), ('?top_k=2', 2), ('?top_k=10', 3)])
+def test_top_k(server, query, count):
+    status, body = predict(server, query)
+    assert status == 200
+    assert len(body['predictions']) == count
+
+
+@pytest.mark.parametrize('top_k', ['0', '-1', '1.5', 'three'])
+def test_invalid_top_k_is_a_bad_request(server, top_k):
+    status, body = predict(server, f'?top_k={top_k}')
+    assert status == 400
+    assert 'top_k' in body['error']
+
+
+@pytest.mark.parametrize('top_k', [0, -1, 1.5, '3'])
+def test_submit_rejects_invalid_top_k(top_k):
+    batcher = DynamicBatcher(torch.nn.Identity(), None, 'cpu', ['a'])
+    try:
+        with pytest.raises(ValueError):
+            batcher.submit(torch.zeros(1), top_k)
+    finally:
+        batcher.close()
@@ -0,0 +1,60 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('PIL')
+
+from deepmodels.shards import ShardDataset, ShardWriter, make_shard_loader  # noqa: E402
+
+
+@pytest.fixture
+def shard_dir(tmp_path):
+    # 250 samples in uneven shards, the label is the sample id
+    with ShardWriter(str(tmp_path), in_channels=1, image_size=8, classes=[], shard_size=60) as writer:
+        for i in range(250):
+            writer.write(torch.full((1, 8, 8), i % 256, dtype=torch.uint8), i)
+    return str(tmp_path)
+
+
+def labels_of(loader):
+    return [label for _, labels in loader for label in labels.tolist()]
+
+
+@pytest.mark.parametrize('num_workers', [0, 1, 3])
+def test_epoch_is_one_pass(shard_dir, num_workers):
+    dataset = ShardDataset(shard_dir, batch_size=16, shuffle_buffer=50, num_replicas=1, rank=0)
+    loader = make_shard_loader(dataset, num_workers)
+    labels = labels_of(loader)
+    assert sorted(labels) == list(range(250))
+    assert len(list(loader)) == len(dataset)
+
+
+@pytest.mark.parametrize('num_workers', [0, 3])
+def test_resume_mid_epoch(shard_dir, num_workers):
+    dataset = ShardDataset(shard_dir, batch_size=16, shuffle_buffer=50, num_replicas=1, rank=0)
+    loader = make_shard_loader(dataset, num_workers)
+    full = labels_of(loader)
+    dataset.set_epoch(0, start=5 * 16)
+    assert labels_of(loader) == full[5 * 16:]
+
+
+def test_ranks_get_equal_batches(shard_dir):
+    datasets = [ShardDataset(shard_dir, batch_size=16, shuffle_buffer=50, num_replicas=2, rank=rank)
+                for rank in range(2)]
+    batches = [list(make_shard_loader(dataset, 2)) for dataset in datasets]
+    assert len(batches[0]) == len(batches[1])
+    labels = {label for rank in batches for _, ls in rank for label in ls.tolist()}
+    assert labels == set(range(250))
+
+
+def test_train_on_64px_shards(tmp_path):
+    from deepmodels.cli import main
+
+    for split, count in (('train', 16), ('val', 8)):
+        with ShardWriter(str(tmp_path / split), in_channels=3, image_size=64, classes=list('0123456789'),
+                         shard_size=8) as writer:
+            for i in range(count):
+                writer.write(torch.randint(0, 256, (3, 64, 64), dtype=torch.uint8), i % 10)
+    history = main(['train', '--model', 'resnet18', '--dataset', 'cifar10', '--device', 'cpu',
+                    '--shards', str(tmp_path / 'train'), '--val-shards', str(tmp_path / 'val'),
+                    '--epochs', '1', '--batch-size', '8'])
+    assert len(history) == 1 and history[0]['valid_acc'] is not None
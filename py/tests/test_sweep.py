@@ -0,0 +1,81 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from deepmodels import sweep
+from deepmodels.sweep import best_by_epoch, core_slots, grid, run_sweep, should_prune
+
+
+def test_grid():
+    configs = grid([1e-2, 1e-3], [32, 64], ['adam'])
+    assert len(configs) == 4
+    assert {'lr': 1e-3, 'batch_size': 64, 'optimizer': 'adam'} in configs
+    sampled = grid([1e-2, 1e-3], [32, 64], ['adam', 'sgd'], num_trials=3, seed=1)
+    assert len(sampled) == 3 and sampled == grid([1e-2, 1e-3], [32, 64], ['adam', 'sgd'], num_trials=3, seed=1)
+
+
+def test_core_slots_are_disjoint():
+    slots = core_slots(3, cores=range(8))
+    assert slots == [[0, 1], [2, 3], [4, 5]]
+    assert core_slots(16, cores=[0, 1]) == [[0], [1]]
+
+
+def test_best_by_epoch_is_a_running_maximum():
+    history = [{'epoch': 1, 'valid_acc': 50.}, {'epoch': 2, 'valid_acc': None},
+               {'epoch': 3, 'valid_acc': 40.}, {'epoch': 4, 'valid_acc': 70.}]
+    assert best_by_epoch(history) == {1: 50., 2: 50., 3: 50., 4: 70.}
+
+
+def test_median_stopping_rule():
+    others = [{1: 60., 2: 70.}, {1: 50., 2: 80.}, {1: 40.}]
+    assert should_prune({1: 45.}, others, prune_after=1, min_trials=3)
+    assert not should_prune({1: 55.}, others, prune_after=1, min_trials=3)
+    # only two others reached epoch 2
+    assert not should_prune({1: 70., 2: 10.}, others, prune_after=1, min_trials=3)
+    assert should_prune({1: 70., 2: 10.}, others, prune_after=1, min_trials=2)
+    assert not should_prune({1: 10.}, others, prune_after=2, min_trials=1)
+    assert not should_prune({}, others)
+
+
+TRIAL = """
+import json
+import os
+import sys
+import time
+
+path, accuracies, pause = sys.argv[1], json.loads(sys.argv[2]), float(sys.argv[3])
+history = []
+for epoch, acc in enumerate(accuracies, 1):
+    history.append({'epoch': epoch, 'valid_acc': acc})
+    with open(path + '.tmp', 'w') as f:
+        json.dump(history, f)
+    os.replace(path + '.tmp', path)
+    time.sleep(pause)
+"""
+
+
+def test_run_sweep_prunes_the_trial_behind_the_median(tmp_path, monkeypatch):
+    # every trial is a small script writing its history like ``train --history-file`` does
+    def launch(trial, model, dataset, epochs, seed, data_root, output_dir, cores, train_args):
+        trial['history_file'] = os.path.join(output_dir, f'trial-{trial["id"]:03d}.history.json')
+        trial['log'] = open(os.path.join(output_dir, f'trial-{trial["id"]:03d}.log'), 'w')
+        pause = '0' if trial['lr'] > 0 else '30'
+        accuracies = [trial['lr'] * 10 + epoch for epoch in range(3)] if trial['lr'] > 0 else [1.]
+        trial['process'] = subprocess.Popen([sys.executable, '-c', TRIAL, trial['history_file'],
+                                             json.dumps(accuracies), pause], stdout=trial['log'])
+        trial.update(cores=cores, start=time.time())
+
+    monkeypatch.setattr(sweep, '_launch', launch)
+    monkeypatch.setattr(sweep, '_prepare_data', lambda *args: None)
+    configs = [{'lr': lr, 'batch_size': 32, 'optimizer': 'adam'} for lr in (5., 6., 7., -1.)]
+    results = run_sweep('vgg16', 'mnist', configs, parallel=1, output_dir=str(tmp_path), min_trials=2,
+                        poll_seconds=0.05)
+    status = {t['lr']: t['status'] for t in results}
+    assert status == {5.: 'completed', 6.: 'completed', 7.: 'completed', -1.: 'pruned'}
+    assert results[0]['lr'] == 7. and results[0]['best_valid_acc'] == 72.
+    with open(tmp_path / 'sweep.json') as f:
+        assert [t['id'] for t in json.load(f)] == [t['id'] for t in results]
@@ -9,22 +9,25 @@ Original file is located at
 
 import torch
 print(torch.__version__)
-from torch import nn
-from torch.utils.data import DataLoader
 from torchvision import transforms
-import time
 import numpy as np
 from torchvision.datasets import MNIST
 from torchvision.transforms import ToTensor
 
-import torch.nn.functional as F
 
 from torchvision import datasets
 import matplotlib.pyplot as plt
 from tqdm.autonotebook import tqdm
-from sklearn.metrics import classification_report, confusion_matrix
 from torchsummary import summary
 
+from deepmodels.augment import BatchAugment
+from deepmodels.cache import cached_dataset, split_dataset
+from deepmodels.engine import get_prediction, init_weights, train
+from deepmodels.loaders import make_loader
+from deepmodels.metrics import evaluate
+from deepmodels.models import VGG
+from deepmodels.plots import plot_confusion_matrix
+
 # Hyperparameters
 RANDOM_SEED = 42
 LEARNING_RATE = 1e-2
@@ -41,41 +44,23 @@ DEVICE = 'cuda:0'
 # print(DEVICE)
 GRAYSCALE = True
 
-transform_train = transforms.Compose([
-    transforms.Resize(224),
-    transforms.RandomRotation(30),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=(0.5,), std=(0.5,))])
-
-transform_test = transforms.Compose([
-    transforms.Resize(224),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=(0.5,), std=(0.5,))])
+# Images are resized to 224x224 once and cached as uint8 (deepmodels/cache.py), the
+# rotation / normalization run batched on DEVICE inside train (deepmodels/augment.py)
+augment = BatchAugment(degrees=30, mean=(0.5,), std=(0.5,), seed=RANDOM_SEED)
 
+train_ds = cached_dataset(datasets.MNIST, root='data', train=True, size=224, raw=True, download=True)
+train_set, val_set = split_dataset(train_ds, [50000, 10000], 'mnist', root='data', seed=RANDOM_SEED)
 
-train_ds = datasets.MNIST(root='data', 
-                               train=True, 
-                               transform=transform_train,
-                               download=True)
-train_set, val_set = torch.utils.data.random_split(train_ds, [50000, 10000])
+test_ds = cached_dataset(datasets.MNIST, root='data', train=False, size=224, raw=True)
 
-test_ds = datasets.MNIST(root='data', 
-                              train=False, 
-                              transform=transform_test)
 
+# worker count / prefetch are benchmarked once per machine (deepmodels/loaders.py)
+train_loader = make_loader(train_set, batch_size=BATCH_SIZE, shuffle=True)
 
-train_loader = DataLoader(dataset=train_set,
-                          batch_size=BATCH_SIZE,
-                      shuffle = True)
 
+val_loader = make_loader(val_set, batch_size=BATCH_SIZE, shuffle=False)
 
-val_loader = DataLoader(dataset=val_set,
-                          batch_size=BATCH_SIZE,
-                      shuffle = False)
-
-test_loader = DataLoader(dataset=test_ds,
-                     batch_size=BATCH_SIZE,
-                     shuffle = False)
+test_loader = make_loader(test_ds, batch_size=BATCH_SIZE, shuffle=False)
 
 # Checking the dataset
 images, labels = next(iter(train_loader))  
@@ -91,155 +76,37 @@ for index in range(25):
     ax[index//5][index%5].imshow(features[index].numpy().squeeze(axis=0), cmap='Greys')
     ax[index//5][index%5].axis('off')
 
-#Model
-cfg = {
-    'VGG11': [64, 'M', 128, 'M', 256, 256, 'M', 512, 512, 'M', 512, 512, 'M'],
-    'VGG13': [64, 64, 'M', 128, 128, 'M', 256, 256, 'M', 512, 512, 'M', 512, 512, 'M'],
-    'VGG16': [64, 64, 'M', 128, 128, 'M', 256, 256, 256, 'M', 512, 512, 512, 'M', 512, 512, 512, 'M'],
-    'VGG19': [64, 64, 'M', 128, 128, 'M', 256, 256, 256, 256, 'M', 512, 512, 512, 512, 'M', 512, 512, 512, 512, 'M'],
-}
-
-
-class VGG(nn.Module):
-    def __init__(self, vgg_name, in_ch):# in_ch determine if its RGB or GrayScale
-        self.in_ch = in_ch
-        super(VGG, self).__init__()
-        self.features = self._make_layers(cfg[vgg_name])
-        self.classifier = nn.Linear(25088, 10)
-
-    def forward(self, x):
-        out = self.features(x)
-        out = out.view(out.size(0), -1)
-        out = self.classifier(out)
-        probas = F.softmax(out, dim=1)
-        return out, probas
-
-    def _make_layers(self, cfg):
-        layers = []
-        in_channels = self.in_ch
-        for x in cfg:
-            if x == 'M':
-                layers += [nn.MaxPool2d(kernel_size=2, stride=2)]
-            else:
-                layers += [nn.Conv2d(in_channels, x, kernel_size=3, padding=1),
-                           nn.BatchNorm2d(x),
-                           nn.ReLU(inplace=True)]
-                in_channels = x
-        layers += [nn.AvgPool2d(kernel_size=1, stride=1)]
-        return nn.Sequential(*layers)
-    
 torch.manual_seed(RANDOM_SEED)
 
-def accuracy(model, data_loader, device):
-    with torch.no_grad():
-        correct_predictions, counter = 0, 0
-        for _, (img, label) in enumerate(data_loader):
-            img = img.to(device)
-            label = label.float().to(device)
-            logits = model(img)
-            _, predicted_label = torch.max(logits[0], 1)
-            counter += label.size(0)
-            correct_predictions += (predicted_label == label).sum()
-    return correct_predictions.float()/counter * 100
-
-def init_weights(m):
-    if isinstance(m, torch.torch.nn.Conv2d) or isinstance(m, torch.torch.nn.Linear):
-        torch.nn.init.kaiming_uniform_(m.weight, mode='fan_in', nonlinearity='relu')
-        if m.bias is not None:
-            m.bias.detach().zero_()
-
 DEVICE = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
-model = VGG("VGG16", 1)
+model = VGG("VGG16", 1, NUM_CLASSES, image_size=224, probas=True)
 model.apply(init_weights)
 optimizer = torch.optim.Adam(model.parameters(), lr=LEARNING_RATE)
 model = model.to(DEVICE)
-
-def train(model, num_epochs, train_loader,valid_loader, test_loader, optimizer):
-    start_time = time.time()
-    for epoch in range(num_epochs):
-        model.train()
-        for batch_idx, (features, targets) in tqdm(enumerate(train_loader), total= len(train_loader)):
-            features = features.to(DEVICE)
-            targets = targets.to(DEVICE)
-            logits = model(features)
-            loss = torch.nn.functional.cross_entropy(logits[0], targets)
-            optimizer.zero_grad()
-            loss.backward()
-            optimizer.step()
-        model.eval()
-        with torch.no_grad():
-            train_acc = accuracy(model, train_loader, device=DEVICE)
-            valid_acc = accuracy(model, valid_loader, device=DEVICE)
-            print(f'Epoch: {epoch+1:03d}/{num_epochs:03d} '
-                  f'| Train: {train_acc :.2f}% '
-                  f'| Validation: {valid_acc :.2f}%')
-        elapsed = (time.time() - start_time)/60
-        print(f'Time elapsed: {elapsed:.2f} min')        
-    elapsed = (time.time() - start_time)/60
-    print(f'Total Training Time: {elapsed:.2f} min')
-    test_acc = accuracy(model, test_loader, device=DEVICE)
-    print(f'Test accuracy {test_acc :.2f}%')
+augment = augment.to(DEVICE)
 
 train(model= model,
       num_epochs = NUM_EPOCHS,
       train_loader= train_loader,
       valid_loader = val_loader,
       test_loader = test_loader,
-      optimizer = optimizer)
-
-def get_prediction(x, model):
-    model.to('cpu') # prepares model for predicting
-    probabilities = torch.softmax(model(x)[0], dim=1)
-    predicted_class = torch.argmax(probabilities, dim=1)
-    return predicted_class, probabilities
-
-true_y, pred_y = [], []
-for batch in tqdm(iter(test_loader), total=len(test_loader)):
-    x, y = batch
-    true_y.extend(y)
-    #print(type(x))
-    preds, probs = get_prediction(x, model)
-    pred_y.extend(preds.cpu())
+      optimizer = optimizer,
+      device = DEVICE,
+      augment = augment)
 
-print(classification_report(true_y, pred_y, digits=3))
+metrics = evaluate(model, test_loader, DEVICE, NUM_CLASSES, augment)
+print(metrics.report(digits=3))
 
 features, targets = next(iter(test_loader))    
 nhwc_img = np.transpose(features[3], axes=(1, 2, 0))
 nhw_img = np.squeeze(nhwc_img.numpy(), axis=2)
 plt.imshow(nhw_img, cmap='Greys')
 
-predicted, probability = get_prediction(features[3, None], model)
+predicted, probability = get_prediction(features[3, None], model, augment)
 print('Predicted:', predicted)
 print('Probability:', probability[0][predicted]*100)
 
-import itertools
-
-def plot_confusion_matrix(cm, classes, normalize=False, title='Confusion matrix', cmap=plt.cm.YlGnBu):
-    fig, ax = plt.subplots(figsize=(16,16))
-    if normalize:
-        cm = cm.astype('float') / cm.sum(axis=1)[:, np.newaxis]
-        print("Normalized confusion matrix")
-    else:
-        print('Confusion matrix, without normalization')
-
-    print(cm)
-    plt.imshow(cm, interpolation='nearest', cmap=cmap)
-    plt.title(title)
-    plt.colorbar()
-    tick_marks = np.arange(len(classes))
-    plt.xticks(tick_marks, classes, rotation=0)
-    plt.yticks(tick_marks, classes)
-
-    fmt = '.2f' if normalize else 'd'
-    thresh = cm.max() / 2.
-    for i, j in itertools.product(range(cm.shape[0]), range(cm.shape[1])):
-        plt.text(j, i, format(cm[i, j], fmt), horizontalalignment="center", color="white" if cm[i, j] > thresh else "black")
-
-    plt.tight_layout()
-    plt.ylabel('True label')
-    plt.xlabel('Predicted label')
-
-cm = confusion_matrix(true_y, pred_y)
+cm = metrics.matrix
 labels = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9']
 plot_confusion_matrix(cm,labels)
 